@@ -3,21 +3,31 @@ Commvault Aging & Pruning Tracker
 Track aging and pruning status via API without needing log files
 """
 
-import requests
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple
 
+from capacity_history import DAY, capacity_series
+from commvault_client import CommvaultClient, load_api_settings
+from db_connections import get_connection_manager
+from fan_out import fan_out
+
 class AgingPruningTracker:
     """Track aging and pruning operations via Commvault API"""
 
-    def __init__(self, base_url: str, token: str):
+    def __init__(self, base_url: str, token: str, client: CommvaultClient = None, db_path: str = None):
         self.base_url = base_url
         self.token = token
-        self.headers = {
-            'Authtoken': f'QSDK {token}',
-            'Accept': 'application/json'
-        }
+        # Reuse the caller's pooled client when given one
+        self.client = client or CommvaultClient.from_config(base_url=base_url, token=token)
+        # Database holding capacity history for the trending data (optional)
+        self.db_path = db_path
+        # Datasets fetched during the current get_aging_status run (each one downloaded once)
+        self._run_cache = {}
+        self._cache_lock = threading.Lock()
 
     def get_aging_status(self, days_back: int = 7) -> Dict:
         """
@@ -38,6 +48,17 @@ class AgingPruningTracker:
             'summary': {}
         }
 
+        # Fresh datasets for every run; jobs and the policy list download side by side
+        self._run_cache = {}
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            preloads = {
+                'job history': executor.submit(self._get_job_summaries, days_back),
+                'storage policies': executor.submit(self._get_storage_policies),
+            }
+        for name, future in preloads.items():
+            if future.exception() is not None:
+                print(f"Error pre-loading {name}: {future.exception()}")
+
         # 1. Get job history to find auxiliary copies (aging triggers)
         print("Fetching job history...")
         jobs = self._get_recent_jobs(days_back)
@@ -71,7 +92,8 @@ class AgingPruningTracker:
 
         # 3. Get storage pool data to check retention
         print("Checking retention policies...")
-        result['retention_violations'] = self._check_retention_violations()
+        violations = self._check_retention_violations(days_back)
+        result['retention_violations'] = violations[:10]  # Limit to 10 for display
 
         # 4. Generate summary
         result['summary'] = {
@@ -80,35 +102,57 @@ class AgingPruningTracker:
             'total_pruning_jobs': len(result['pruning_jobs']),
             'successful_pruning': len([j for j in result['pruning_jobs'] if 'complete' in j.get('status', '').lower()]),
             'total_ddbs': len(result['ddb_stats']),
-            'retention_issues': len(result['retention_violations'])
+            'retention_issues': len(violations)
         }
 
         return result
 
+    def _cached(self, key, loader):
+        """Return dataset `key` for this run, loading it on first use (concurrent callers share one load)"""
+        with self._cache_lock:
+            entry = self._run_cache.get(key)
+            if entry is None:
+                entry = self._run_cache[key] = {'lock': threading.Lock(), 'loaded': False, 'value': None}
+
+        with entry['lock']:
+            if not entry['loaded']:
+                entry['value'] = loader()
+                entry['loaded'] = True
+        return entry['value']
+
+    def _get_job_summaries(self, days_back: int) -> List[Dict]:
+        """All job summaries from the last N days, downloaded once per run"""
+        def load():
+            try:
+                response = self.client.get(f'/Job?clientId=0&completedJobLookupTime={days_back * 86400}', timeout=60)
+
+                if response.status_code == 200:
+                    jobs_list = response.json().get('jobs', [])
+                    return [job.get('jobSummary', {}) for job in jobs_list]
+                else:
+                    print(f"Failed to get jobs: {response.status_code}")
+                    return []
+            except Exception as e:
+                print(f"Error getting jobs (skipping): {e}")
+                # Don't fail completely if jobs can't be retrieved
+                return []
+
+        return self._cached(('jobs', days_back), load)
+
+    def _get_storage_policies(self) -> List[Dict]:
+        """Storage policy list, downloaded once per run"""
+        def load():
+            response = self.client.get('/StoragePolicy')
+            if response.status_code != 200:
+                print(f"Failed to get storage policies: {response.status_code}")
+                return []
+            return response.json().get('policies', [])
+
+        return self._cached('storage_policies', load)
+
     def _get_recent_jobs(self, days_back: int) -> List[Dict]:
         """Get jobs from last N days"""
-        try:
-            # Try simpler endpoint first - just get recent jobs without date filter
-            response = requests.get(
-                f'{self.base_url}/Job?clientId=0',
-                headers=self.headers,
-                timeout=60,  # Increase timeout
-                verify=False
-            )
-
-            if response.status_code == 200:
-                jobs_data = response.json()
-                jobs_list = jobs_data.get('jobs', [])
-
-                # Extract job summaries - limit to last 100 jobs for performance
-                return [job.get('jobSummary', {}) for job in jobs_list[:100]]
-            else:
-                print(f"Failed to get jobs: {response.status_code}")
-                return []
-        except Exception as e:
-            print(f"Error getting jobs (skipping): {e}")
-            # Don't fail completely if jobs can't be retrieved
-            return []
+        return self._get_job_summaries(days_back)
 
     def _get_ddb_statistics(self) -> List[Dict]:
         """Get DDB store statistics"""
@@ -116,108 +160,112 @@ class AgingPruningTracker:
 
         try:
             # First, get list of storage policies to find DDB stores
-            response = requests.get(
-                f'{self.base_url}/StoragePolicy',
-                headers=self.headers,
-                timeout=30,
-                verify=False
-            )
-
-            if response.status_code == 200:
-                policies = response.json()
-
-                # For each policy with dedup, get DDB stats
-                for policy in policies.get('policies', [])[:20]:  # Limit to first 20
-                    policy_id = policy.get('storagePolicyId')
-
-                    # Get policy details
-                    detail_response = requests.get(
-                        f'{self.base_url}/StoragePolicy/{policy_id}',
-                        headers=self.headers,
-                        timeout=30,
-                        verify=False
-                    )
-
-                    if detail_response.status_code == 200:
-                        policy_detail = detail_response.json()
-
-                        # Check if deduplication is enabled
-                        for copy in policy_detail.get('copy', []):
-                            dedupe_flags = copy.get('dedupeFlags', {})
-                            if dedupe_flags.get('enableDeduplication'):
-                                # This copy uses deduplication
-                                copy_name = copy.get('StoragePolicyCopy', {}).get('copyName', 'Unknown')
-
-                                ddb_stats.append({
-                                    'policy_name': policy_detail.get('storagePolicy', {}).get('storagePolicyName', ''),
-                                    'copy_name': copy_name,
-                                    'has_dedup': True,
-                                    'retention_days': copy.get('retentionRules', {}).get('retainBackupDataForDays', 0)
-                                })
+            policies = self._get_storage_policies()
+            settings = load_api_settings()
+
+            def fetch_detail(policy):
+                return self.client.get(f'/StoragePolicy/{policy.get("storagePolicyId")}')
+
+            # Policy details for every policy are fetched in parallel
+            for policy, detail_response, error in fan_out(policies, fetch_detail,
+                                                          max_workers=settings['fan_out_workers']):
+                if error or detail_response.status_code != 200:
+                    continue
+
+                policy_detail = detail_response.json()
+
+                # Check if deduplication is enabled
+                for copy in policy_detail.get('copy', []):
+                    dedupe_flags = copy.get('dedupeFlags', {})
+                    if dedupe_flags.get('enableDeduplication'):
+                        # This copy uses deduplication
+                        copy_name = copy.get('StoragePolicyCopy', {}).get('copyName', 'Unknown')
+
+                        ddb_stats.append({
+                            'policy_name': policy_detail.get('storagePolicy', {}).get('storagePolicyName', ''),
+                            'copy_name': copy_name,
+                            'has_dedup': True,
+                            'retention_days': copy.get('retentionRules', {}).get('retainBackupDataForDays', 0)
+                        })
 
+            # Fan-out yields in completion order; keep the report stable
+            ddb_stats.sort(key=lambda d: (d['policy_name'], d['copy_name']))
             return ddb_stats
         except Exception as e:
             print(f"Error getting DDB stats: {e}")
             return []
 
-    def _check_retention_violations(self) -> List[Dict]:
+    def _check_retention_violations(self, days_back: int = 7) -> List[Dict]:
         """Check for data that should be aged but hasn't been"""
         violations = []
 
         try:
-            # Get recent backup jobs
-            response = requests.get(
-                f'{self.base_url}/Job?clientId=0',
-                headers=self.headers,
-                timeout=60,
-                verify=False
-            )
-
-            if response.status_code == 200:
-                jobs_data = response.json()
-                jobs_list = jobs_data.get('jobs', [])
-
-                # Look for backup jobs that completed but no aux copy followed
-                for job in jobs_list[:50]:
-                    job_summary = job.get('jobSummary', {})
-                    job_type = job_summary.get('jobType', '').lower()
-
-                    # Check if it's a backup job
-                    if 'backup' in job_type and 'auxiliary' not in job_type:
-                        job_id = job_summary.get('jobId')
-                        completed_time = job_summary.get('jobEndTime', '')
-                        client_name = job_summary.get('subclient', {}).get('clientName', '')
-
-                        # Simple heuristic: if backup completed but we haven't seen aux copy
-                        # This is simplified - real implementation would track relationships
-                        violations.append({
-                            'job_id': job_id,
-                            'client': client_name,
-                            'completed': completed_time,
-                            'reason': 'Backup completed, aux copy status unknown'
-                        })
+            # Same job download as _get_recent_jobs (cached for this run)
+            for job_summary in self._get_job_summaries(days_back):
+                job_type = job_summary.get('jobType', '').lower()
+
+                # Check if it's a backup job
+                if 'backup' in job_type and 'auxiliary' not in job_type:
+                    job_id = job_summary.get('jobId')
+                    completed_time = job_summary.get('jobEndTime', '')
+                    client_name = job_summary.get('subclient', {}).get('clientName', '')
+
+                    # Simple heuristic: if backup completed but we haven't seen aux copy
+                    # This is simplified - real implementation would track relationships
+                    violations.append({
+                        'job_id': job_id,
+                        'client': client_name,
+                        'completed': completed_time,
+                        'reason': 'Backup completed, aux copy status unknown'
+                    })
 
         except Exception as e:
             print(f"Error checking retention violations: {e}")
 
-        return violations[:10]  # Limit to 10 for display
+        return violations
 
     def get_aging_trending_data(self, days_back: int = 30) -> Dict:
         """
-        Get trending data for aging effectiveness over time
+        Get capacity trending data over time
 
-        Returns data suitable for charting DDB size, retention compliance, etc.
+        Returns data suitable for charting: one entry per day in 'dates', and the same number
+        in every other list, with the daily average used/free capacity summed over all storage
+        pools, libraries and MediaAgents (from the capacity_rollups table; None for days a kind
+        has no samples).
         """
         trending = {
             'dates': [],
-            'ddb_sizes': [],
-            'backup_counts': [],
-            'aux_copy_counts': [],
-            'pruning_counts': []
+            'pool_capacity': [],
+            'pool_used': [],
+            'pool_free': [],
+            'library_used': [],
+            'library_free': [],
+            'mediaagent_used': [],
+            'mediaagent_free': []
         }
 
-        # For now, return structure - would need historical data collection
-        # This would be populated by storing daily snapshots in database
+        # Capacity comes from the daily rollups of the samples every pool / library / MediaAgent
+        # refresh appends (DDB sizes and job counts have no history table to trend from)
+        if not self.db_path:
+            return trending
+
+        since_epoch = int(time.time()) - days_back * 86400
+        with get_connection_manager(self.db_path).reader() as db:
+            series = {kind: {point['date']: point for point in capacity_series(db, kind, since_epoch, DAY)}
+                      for kind in ('storage_pool', 'library', 'mediaagent')}
+
+        trending['dates'] = sorted(set().union(*series.values()))
+        for date in trending['dates']:
+            pool = series['storage_pool'].get(date)
+            library = series['library'].get(date)
+            mediaagent = series['mediaagent'].get(date)
+            trending['pool_capacity'].append(pool['totalSize'] if pool else None)
+            trending['pool_used'].append(round(pool['avgUsed']) if pool else None)
+            trending['pool_free'].append(round(pool['avgFree']) if pool else None)
+            trending['library_used'].append(round(library['avgUsed']) if library else None)
+            trending['library_free'].append(round(library['avgFree']) if library else None)
+            trending['mediaagent_used'].append(round(mediaagent['avgUsed']) if mediaagent else None)
+            trending['mediaagent_free'].append(round(mediaagent['avgFree']) if mediaagent else None)
 
         return trending
 
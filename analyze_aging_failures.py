@@ -6,6 +6,7 @@ import sqlite3
 import sys
 from collections import defaultdict
 from datetime import datetime, timedelta
+from capacity import CAPACITY_BAND_SQL
 
 # Set UTF-8 encoding for output
 if sys.platform == 'win32':
@@ -192,47 +193,34 @@ print("=" * 100)
 print()
 
 if 'storage_pools' in tables:
-    cur.execute("""
+    cur.execute(f"""
         SELECT
             storagePoolId,
             storagePoolName,
             totalCapacity,
             freeSpace,
-            CASE
-                WHEN totalCapacity > 0 THEN ROUND((freeSpace * 100.0 / totalCapacity), 2)
-                ELSE 0
-            END as percentFree
+            ROUND(pctFree, 2) as percentFree,
+            {CAPACITY_BAND_SQL} as band
         FROM storage_pools
-        WHERE totalCapacity > 0
-        ORDER BY percentFree ASC
+        WHERE pctFree IS NOT NULL
+        ORDER BY pctFree ASC
     """)
     pools = cur.fetchall()
 
     print(f"Storage Pools: {len(pools)}")
     print()
 
+    band_labels = {'critical': "🔴 CRITICAL", 'warning': "🟠 WARNING", 'low': "🟡 LOW", 'ok': "🟢 OK"}
+
     if pools:
         print("Storage Pool Space Status:")
         print(f"{'Pool Name':<40} {'Total (GB)':<15} {'Free (GB)':<15} {'% Free':<10} {'Status'}")
         print("-" * 100)
         for pool in pools:
-            try:
-                total_cap = int(pool['totalCapacity']) if pool['totalCapacity'] else 0
-                free_sp = int(pool['freeSpace']) if pool['freeSpace'] else 0
-                total_gb = total_cap / (1024**3)
-                free_gb = free_sp / (1024**3)
-                pct = float(pool['percentFree']) if pool['percentFree'] else 0
-            except (ValueError, TypeError):
-                continue
-
-            if pct < 10:
-                status = "🔴 CRITICAL"
-            elif pct < 20:
-                status = "🟠 WARNING"
-            elif pct < 30:
-                status = "🟡 LOW"
-            else:
-                status = "🟢 OK"
+            total_gb = pool['totalCapacity'] / (1024**3)
+            free_gb = pool['freeSpace'] / (1024**3)
+            pct = pool['percentFree']
+            status = band_labels[pool['band']]
 
             print(f"{pool['storagePoolName'][:40]:<40} {total_gb:>13.2f}  {free_gb:>13.2f}  {pct:>8.2f}%  {status}")
         print()
@@ -17,40 +17,28 @@ print("=" * 100)
 print(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 print()
 
-# Get critical pools (<10% free)
+# Get critical pools (<10% free, stored at ingest)
 cur.execute("""
     SELECT storagePoolId, storagePoolName, storagePoolType, mediaAgentName,
-           totalCapacity, freeSpace, dedupeEnabled
+           totalCapacity, freeSpace, pctFree, pctUsed, dedupeEnabled
     FROM storage_pools
-    ORDER BY storagePoolName
+    WHERE pctFree < 10
+    ORDER BY pctFree
 """)
 
-all_pools = cur.fetchall()
 critical_pools = []
-
-for pool in all_pools:
-    try:
-        total = int(pool['totalCapacity']) if pool['totalCapacity'] else 0
-        free = int(pool['freeSpace']) if pool['freeSpace'] else 0
-
-        if total > 0:
-            pct_free = (free * 100.0) / total
-            if pct_free < 10:
-                critical_pools.append({
-                    'name': pool['storagePoolName'],
-                    'id': pool['storagePoolId'],
-                    'type': pool['storagePoolType'],
-                    'ma': pool['mediaAgentName'],
-                    'total_kb': total,
-                    'free_kb': free,
-                    'pct_free': pct_free,
-                    'pct_used': 100 - pct_free,
-                    'dedup': pool['dedupeEnabled']
-                })
-    except:
-        continue
-
-critical_pools.sort(key=lambda x: x['pct_free'])
+for pool in cur.fetchall():
+    critical_pools.append({
+        'name': pool['storagePoolName'],
+        'id': pool['storagePoolId'],
+        'type': pool['storagePoolType'],
+        'ma': pool['mediaAgentName'],
+        'total_kb': pool['totalCapacity'],
+        'free_kb': pool['freeSpace'],
+        'pct_free': pool['pctFree'],
+        'pct_used': pool['pctUsed'],
+        'dedup': pool['dedupeEnabled']
+    })
 
 print(f"CRITICAL POOLS IDENTIFIED: {len(critical_pools)}")
 print("=" * 100)
@@ -261,7 +249,7 @@ output.append("=" * 100)
 output.append("")
 
 # Total pools
-cur.execute("SELECT COUNT(*) as total FROM storage_pools WHERE totalCapacity IS NOT NULL AND totalCapacity != ''")
+cur.execute("SELECT COUNT(*) as total FROM storage_pools WHERE totalCapacity IS NOT NULL")
 total_pools = cur.fetchone()['total']
 
 print(f"Total Storage Pools: {total_pools}")
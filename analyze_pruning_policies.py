@@ -5,6 +5,7 @@ Analyzes why aged data is not being pruned and space is not being reclaimed
 import sqlite3
 import sys
 from collections import defaultdict
+from capacity import CAPACITY_BAND_SQL
 
 # Set UTF-8 encoding for output
 if sys.platform == 'win32':
@@ -260,34 +261,19 @@ print("SECTION 5: STORAGE POOL SPACE (Proof of Pruning Failure)")
 print("=" * 100)
 print()
 
-cur.execute("""
+cur.execute(f"""
     SELECT
         storagePoolName,
-        totalCapacity,
-        freeSpace
+        pctFree,
+        {CAPACITY_BAND_SQL} AS band
     FROM storage_pools
 """)
 all_pools = cur.fetchall()
 
-# Calculate percentages
-critical_pools = []
-warning_pools = []
-low_pools = []
-
-for pool in all_pools:
-    try:
-        total = int(pool['totalCapacity']) if pool['totalCapacity'] else 0
-        free = int(pool['freeSpace']) if pool['freeSpace'] else 0
-        if total > 0:
-            pct = (free * 100.0) / total
-            if pct < 10:
-                critical_pools.append((pool['storagePoolName'], pct))
-            elif pct < 20:
-                warning_pools.append((pool['storagePoolName'], pct))
-            elif pct < 30:
-                low_pools.append((pool['storagePoolName'], pct))
-    except (ValueError, TypeError):
-        continue
+# Group by the health band of each pool's stored percent free
+critical_pools = [(pool['storagePoolName'], pool['pctFree']) for pool in all_pools if pool['band'] == 'critical']
+warning_pools = [(pool['storagePoolName'], pool['pctFree']) for pool in all_pools if pool['band'] == 'warning']
+low_pools = [(pool['storagePoolName'], pool['pctFree']) for pool in all_pools if pool['band'] == 'low']
 
 print(f"Storage Pool Health:")
 print(f"  - Total Pools: {len(all_pools)}")
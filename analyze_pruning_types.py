@@ -90,6 +90,7 @@ cur.execute("""
         mediaAgentName,
         totalCapacity,
         freeSpace,
+        pctFree,
         dedupeEnabled
     FROM storage_pools
     ORDER BY storagePoolName
@@ -166,15 +167,8 @@ if dedup_pools:
     # Calculate space stats
     critical_dedup = []
     for pool in dedup_pools:
-        try:
-            total = int(pool['totalCapacity']) if pool['totalCapacity'] else 0
-            free = int(pool['freeSpace']) if pool['freeSpace'] else 0
-            if total > 0:
-                pct = (free * 100.0) / total
-                if pct < 20:
-                    critical_dedup.append((pool['storagePoolName'], pct))
-        except (ValueError, TypeError):
-            continue
+        if pool['pctFree'] is not None and pool['pctFree'] < 20:
+            critical_dedup.append((pool['storagePoolName'], pool['pctFree']))
 
     if critical_dedup:
         print(f"   🔴 ALERT: {len(critical_dedup)} dedup pools are critically low (<20% free)")
@@ -265,34 +259,30 @@ micropruning_failing = []
 macropruning_candidates = []
 
 for pool in storage_pools:
-    try:
-        total = int(pool['totalCapacity']) if pool['totalCapacity'] else 0
-        free = int(pool['freeSpace']) if pool['freeSpace'] else 0
-
-        if total > 0:
-            pct_free = (free * 100.0) / total
-            dedupe_val = str(pool['dedupeEnabled']).lower() if pool['dedupeEnabled'] else ''
-            is_dedup = dedupe_val in ['1', 'true', 'yes']
-
-            if pct_free < 20:
-                # Critically low = pruning failing
-                micropruning_failing.append({
-                    'name': pool['storagePoolName'],
-                    'pct_free': pct_free,
-                    'is_dedup': is_dedup,
-                    'type': pool['storagePoolType']
-                })
-            elif pct_free > 30:
-                # Healthy space = pruning working
-                micropruning_healthy.append({
-                    'name': pool['storagePoolName'],
-                    'pct_free': pct_free,
-                    'is_dedup': is_dedup,
-                    'type': pool['storagePoolType']
-                })
-    except (ValueError, TypeError):
+    pct_free = pool['pctFree']
+    if pct_free is None:
         continue
 
+    dedupe_val = str(pool['dedupeEnabled']).lower() if pool['dedupeEnabled'] else ''
+    is_dedup = dedupe_val in ['1', 'true', 'yes']
+
+    if pct_free < 20:
+        # Critically low = pruning failing
+        micropruning_failing.append({
+            'name': pool['storagePoolName'],
+            'pct_free': pct_free,
+            'is_dedup': is_dedup,
+            'type': pool['storagePoolType']
+        })
+    elif pct_free > 30:
+        # Healthy space = pruning working
+        micropruning_healthy.append({
+            'name': pool['storagePoolName'],
+            'pct_free': pct_free,
+            'is_dedup': is_dedup,
+            'type': pool['storagePoolType']
+        })
+
 print(f"Pruning Health Status:")
 print(f"  ✅ Healthy Pools (>30% free): {len(micropruning_healthy)}")
 print(f"  🔴 Failing Pools (<20% free): {len(micropruning_failing)}")
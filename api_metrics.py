@@ -0,0 +1,244 @@
+"""
+API Call Metrics
+Durable per-call record of CommServe endpoint latency, payload size and record count, with percentile summaries
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Metrics older than this are deleted when buffered calls are written, at most once per PRUNE_INTERVAL_SECONDS
+DEFAULT_RETENTION_DAYS = 90
+PRUNE_INTERVAL_SECONDS = 86400
+
+# Calls kept in memory between flushes; the oldest are dropped beyond this
+MAX_BUFFERED_CALLS = 10000
+
+PERCENTILES = (50, 95, 99)
+
+
+def new_run_id(source):
+    """Id grouping the calls of one refresh, e.g. fetch-20240501T101500-1a2b3c4d"""
+    return f"{source}-{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def metric_row(run_id, method, path, status_code, duration_ms, size=None, record_count=None, call_epoch=None):
+    """
+    One api_call_metrics row
+
+    Args:
+        run_id: Refresh the call belongs to (see new_run_id)
+        method: HTTP method
+        path: Request path; the endpoint is the path without its query string
+        status_code: HTTP status (None for connection errors and timeouts)
+        duration_ms: Time until the response arrived
+        size: Response body size in bytes
+        record_count: Records saved from the response
+        call_epoch: When the call was made (default: now)
+    """
+    call_epoch = call_epoch if call_epoch is not None else datetime.now().timestamp()
+    return (run_id, method, path.split('?')[0], path, status_code, duration_ms, size, record_count,
+            datetime.fromtimestamp(call_epoch).isoformat(), int(call_epoch))
+
+
+def record_api_calls(db, rows):
+    """Insert metric_row tuples (the caller commits)"""
+    if rows:
+        db.executemany(
+            """INSERT INTO api_call_metrics
+            (runId, method, endpoint, path, statusCode, durationMs, bytes, recordCount, callTime, callEpoch)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+
+
+class CallRecorder:
+    """
+    Process-wide buffer of CommServe calls waiting to be written to api_call_metrics
+
+    CommvaultClient adds a row for every request it sends, including timeouts and connection
+    errors (with a NULL status), so calls made outside the fetch engine are recorded too.
+    Rows are written by flush(): at the end of each fetch run on its writer connection, by
+    callers that finish a batch of calls, and at interpreter exit. A run's flush only takes its
+    own rows (and calls made outside any run), so rows of a run still in progress keep waiting
+    for their record counts. The first flush of each
+    day also applies DEFAULT_RETENTION_DAYS, on the same write.
+    """
+
+    def __init__(self, db_path=None, max_buffered=MAX_BUFFERED_CALLS):
+        self.db_path = db_path
+        self.max_buffered = max_buffered
+        self._rows = []
+        self._last_prune = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rows)
+
+    def add(self, row):
+        """Buffer a metric_row tuple"""
+        with self._lock:
+            self._rows.append(list(row))
+            if len(self._rows) > self.max_buffered:
+                del self._rows[:len(self._rows) - self.max_buffered]
+
+    def set_record_count(self, run_id, path, record_count):
+        """Attach the records saved from a response to the latest buffered call for run_id/path"""
+        with self._lock:
+            for row in reversed(self._rows):
+                if row[0] == run_id and row[3] == path:
+                    row[7] = record_count
+                    return
+
+    def drain(self, run_id=None):
+        """Remove and return the buffered rows of run_id and of calls outside any run (every row without run_id)"""
+        with self._lock:
+            if run_id is None:
+                rows, self._rows = self._rows, []
+            else:
+                rows = [row for row in self._rows if row[0] in (run_id, None)]
+                self._rows = [row for row in self._rows if row[0] not in (run_id, None)]
+        return [tuple(row) for row in rows]
+
+    def flush(self, db, run_id=None):
+        """Write the rows drain(run_id) returns on db (the caller commits); returns the number written"""
+        rows = self.drain(run_id)
+        record_api_calls(db, rows)
+        now = time.time()
+        with self._lock:
+            prune = now - self._last_prune >= PRUNE_INTERVAL_SECONDS
+            if prune:
+                self._last_prune = now
+        if prune:
+            prune_api_metrics(db)
+        return len(rows)
+
+    def flush_to_database(self, db_path=None, run_id=None):
+        """
+        flush() through the process's single writer (for callers without a connection)
+
+        Args:
+            db_path: Database file (default: db_path given to the recorder, else [database] db_path in config.ini)
+            run_id: Only this run's rows (default: every buffered row)
+        """
+        from db_connections import get_connection_manager, load_db_settings
+
+        db_path = db_path or self.db_path or load_db_settings()['db_path']
+        if not os.path.exists(db_path):
+            return 0
+        try:
+            with get_connection_manager(db_path).writer() as db:
+                written = self.flush(db, run_id)
+                db.commit()
+        except sqlite3.Error as e:
+            print(f"Could not record API call metrics in {db_path}: {e}")
+            return 0
+        return written
+
+
+call_recorder = CallRecorder()
+
+
+@atexit.register
+def _flush_calls_at_exit():
+    if len(call_recorder):
+        call_recorder.flush_to_database()
+
+
+def prune_api_metrics(db, retention_days=DEFAULT_RETENTION_DAYS):
+    """Delete metrics older than retention_days; returns the number of rows removed"""
+    cutoff = int(datetime.now().timestamp()) - retention_days * 86400
+    return db.execute("DELETE FROM api_call_metrics WHERE callEpoch < ?", (cutoff,)).rowcount
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list (None if empty)"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-pct * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def _summarise(endpoint, durations, statuses, sizes, records):
+    durations.sort()
+    summary = {
+        'endpoint': endpoint,
+        'calls': len(statuses),
+        'errors': sum(1 for status in statuses if status is None or status >= 400),
+        'avg_bytes': int(sum(sizes) / len(sizes)) if sizes else None,
+        'records': sum(records),
+    }
+    for pct in PERCENTILES:
+        summary[f'p{pct}'] = percentile(durations, pct)
+    return summary
+
+
+def endpoint_latency_summary(db, since_epoch=None, bucket_seconds=None):
+    """
+    p50/p95/p99 latency per endpoint, optionally per time bucket
+
+    Args:
+        db: Open sqlite3 connection
+        since_epoch: Only calls made at or after this time
+        bucket_seconds: Split each endpoint's calls into buckets this long (e.g. 86400 for daily)
+
+    Returns:
+        List of dicts (endpoint, bucket, calls, errors, p50, p95, p99, avg_bytes, records), by
+        endpoint then bucket. bucket is the ISO start time of the bucket, or None without buckets.
+    """
+    bucket_expr = f"(callEpoch / {int(bucket_seconds)}) * {int(bucket_seconds)}" if bucket_seconds else "NULL"
+    rows = db.execute(
+        f"""SELECT endpoint, {bucket_expr} AS bucket, statusCode, durationMs, bytes, recordCount
+        FROM api_call_metrics
+        WHERE callEpoch >= ?
+        ORDER BY endpoint, bucket""",
+        (since_epoch or 0,)
+    )
+
+    summaries = []
+    key = None
+    durations, statuses, sizes, records = [], [], [], []
+    for endpoint, bucket, status_code, duration_ms, size, record_count in rows:
+        if (endpoint, bucket) != key:
+            if key is not None:
+                summaries.append(_summarise(key[0], durations, statuses, sizes, records))
+                summaries[-1]['bucket'] = datetime.fromtimestamp(key[1]).isoformat() if key[1] is not None else None
+            key = (endpoint, bucket)
+            durations, statuses, sizes, records = [], [], [], []
+        statuses.append(status_code)
+        if duration_ms is not None:
+            durations.append(duration_ms)
+        if size is not None:
+            sizes.append(size)
+        if record_count:
+            records.append(record_count)
+
+    if key is not None:
+        summaries.append(_summarise(key[0], durations, statuses, sizes, records))
+        summaries[-1]['bucket'] = datetime.fromtimestamp(key[1]).isoformat() if key[1] is not None else None
+
+    return summaries
+
+
+def run_summary(db, limit=20):
+    """What the most recent refreshes cost: calls, time, bytes and records per run id"""
+    rows = db.execute(
+        """SELECT runId, MIN(callTime), COUNT(*), SUM(durationMs), SUM(bytes), SUM(recordCount),
+               SUM(CASE WHEN statusCode IS NULL OR statusCode >= 400 THEN 1 ELSE 0 END)
+        FROM api_call_metrics
+        WHERE runId IS NOT NULL
+        GROUP BY runId
+        ORDER BY MAX(id) DESC
+        LIMIT ?""",
+        (limit,)
+    ).fetchall()
+    return [
+        {'run_id': row[0], 'started': row[1], 'calls': row[2], 'duration_ms': row[3] or 0,
+         'bytes': row[4] or 0, 'records': row[5] or 0, 'errors': row[6]}
+        for row in rows
+    ]
@@ -6,12 +6,26 @@ Flask-based web app to connect to Commvault REST API and store data in SQLite
 from flask import Flask, render_template, request, g, flash, redirect, url_for, session, Response
 import sqlite3
 import requests
-import base64
 import json
 import configparser
 import os
 import time
 from datetime import datetime
+from commvault_client import CommvaultClient
+from fetch_engine import FetchTask, PagedFetchTask, run_fetch_tasks, DEFAULT_MAX_WORKERS, DEFAULT_PAGE_SIZE
+from sync_state import DeltaSync, seconds_since_sync, sync_from_epoch
+from db_writer import upsert_rows, write_transaction, DEFAULT_BATCH_SIZE
+from endpoint_probe import (load_probe_results, probe_running, start_background_probe, DEFAULT_PROBE_DEADLINE,
+                            DEFAULT_PROBE_TTL)
+from ingest_scheduler import IngestScheduler, load_schedule
+from payload_archive import open_archive
+from host_limiter import all_host_limits
+from db_connections import connect, get_connection_manager
+from db_migrations import apply_migrations
+from endpoint_variants import find_list
+from capacity import CAPACITY_BAND_SQL, capacity_percentages, capacity_value
+from capacity_history import snapshot_task
+from api_metrics import call_recorder, endpoint_latency_summary, new_run_id, run_summary
 
 app = Flask(__name__)
 app.secret_key = 'commvault_secret_key_change_in_production'  # Change this in production
@@ -76,324 +90,80 @@ def load_config():
             'base_url': config.get('commvault', 'base_url', fallback=''),
             'username': config.get('commvault', 'username', fallback=''),
             'password': config.get('commvault', 'password', fallback=''),
-            'db_path': config.get('database', 'db_path', fallback='Database/commvault.db')
+            'db_path': config.get('database', 'db_path', fallback='Database/commvault.db'),
+            'max_workers': config.getint('api', 'max_workers', fallback=DEFAULT_MAX_WORKERS),
+            'job_page_size': config.getint('api', 'job_page_size', fallback=DEFAULT_PAGE_SIZE),
+            'batch_size': config.getint('database', 'batch_size', fallback=DEFAULT_BATCH_SIZE)
         }
-    return {'base_url': '', 'username': '', 'password': '', 'db_path': 'Database/commvault.db'}
+    return {'base_url': '', 'username': '', 'password': '', 'db_path': 'Database/commvault.db',
+            'max_workers': DEFAULT_MAX_WORKERS, 'job_page_size': DEFAULT_PAGE_SIZE,
+            'batch_size': DEFAULT_BATCH_SIZE}
 
 def get_db():
-    """Get database connection"""
+    """Get a read-only database connection from the pool (WAL: never blocked by an ingest)"""
     if 'db' not in g:
-        # Ensure Database directory exists
-        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-        g.db = sqlite3.connect(DB_PATH)
-        g.db.row_factory = sqlite3.Row
+        g.db = get_connection_manager(DB_PATH).acquire_reader()
     return g.db
 
+def get_write_db():
+    """Get the process's single writer connection, held until the request ends"""
+    if 'write_db' not in g:
+        g.write_db = get_connection_manager(DB_PATH).acquire_writer()
+    return g.write_db
+
 @app.teardown_appcontext
 def close_db(error):
-    """Close database connection"""
+    """Return database connections to the connection manager"""
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        get_connection_manager(DB_PATH).release_reader(db)
+    write_db = g.pop('write_db', None)
+    if write_db is not None:
+        get_connection_manager(DB_PATH).release_writer(write_db)
 
 def init_db():
-    """Initialize database schema"""
-    db = sqlite3.connect(DB_PATH)
-    cursor = db.cursor()
-
-    # Create table for Clients
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS clients (
-            clientId       INTEGER PRIMARY KEY,
-            clientName     TEXT,
-            hostName       TEXT,
-            clientGUID     TEXT,
-            lastFetchTime  TEXT
-        )
-    """)
-
-    # Create table for Jobs
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS jobs (
-            jobId          INTEGER PRIMARY KEY,
-            clientId       INTEGER,
-            clientName     TEXT,
-            jobType        TEXT,
-            status         TEXT,
-            startTime      TEXT,
-            endTime        TEXT,
-            backupSetName  TEXT,
-            lastFetchTime  TEXT
-        )
-    """)
-
-    # Create table for Plans (Policies)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS plans (
-            planId         INTEGER PRIMARY KEY,
-            planName       TEXT,
-            planType       TEXT,
-            lastFetchTime  TEXT
-        )
-    """)
-
-    # Create table for Storage Policies
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS storage_policies (
-            storagePolicyId   INTEGER PRIMARY KEY,
-            storagePolicyName TEXT,
-            lastFetchTime     TEXT
-        )
-    """)
-
-    # Create table for MediaAgents (Infrastructure)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS mediaagents (
-            mediaAgentId      INTEGER PRIMARY KEY,
-            mediaAgentName    TEXT,
-            hostName          TEXT,
-            osType            TEXT,
-            status            TEXT,
-            availableSpace    TEXT,
-            totalSpace        TEXT,
-            lastFetchTime     TEXT
-        )
-    """)
-
-    # Create table for Libraries (Tape/Disk Libraries)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS libraries (
-            libraryId         INTEGER PRIMARY KEY,
-            libraryName       TEXT,
-            libraryType       TEXT,
-            mediaAgentName    TEXT,
-            status            TEXT,
-            lastFetchTime     TEXT
-        )
-    """)
-
-    # Create table for Storage Pools
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS storage_pools (
-            storagePoolId     INTEGER PRIMARY KEY,
-            storagePoolName   TEXT,
-            storagePoolType   TEXT,
-            mediaAgentName    TEXT,
-            totalCapacity     TEXT,
-            freeSpace         TEXT,
-            dedupeEnabled     TEXT,
-            lastFetchTime     TEXT
-        )
-    """)
-
-    # Create table for Hypervisors/VM Infrastructure
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS hypervisors (
-            instanceId        INTEGER PRIMARY KEY,
-            instanceName      TEXT,
-            hypervisorType    TEXT,
-            hostName          TEXT,
-            vendor            TEXT,
-            status            TEXT,
-            lastFetchTime     TEXT
-        )
-    """)
-
-    # Create table for Disk Storage Arrays
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS storage_arrays (
-            arrayId           INTEGER PRIMARY KEY,
-            arrayName         TEXT,
-            arrayType         TEXT,
-            vendor            TEXT,
-            model             TEXT,
-            totalCapacity     TEXT,
-            usedCapacity      TEXT,
-            lastFetchTime     TEXT
-        )
-    """)
-
-    # Create table for Plans (Modern Commvault backup configuration)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS plans (
-            planId            INTEGER PRIMARY KEY,
-            planName          TEXT,
-            description       TEXT,
-            type              INTEGER,
-            subtype           INTEGER,
-            numCopies         INTEGER,
-            numAssocEntities  INTEGER,
-            rpoInMinutes      INTEGER,
-            storageTarget     TEXT,
-            storagePolicyId   INTEGER,
-            isElastic         INTEGER,
-            statusFlag        INTEGER,
-            lastFetchTime     TEXT
-        )
-    """)
-
-    # Create table for Retention Rules (Aging Policy data)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS retention_rules (
-            ruleId                          INTEGER PRIMARY KEY AUTOINCREMENT,
-            entityType                      TEXT NOT NULL,
-            entityId                        INTEGER NOT NULL,
-            entityName                      TEXT,
-            parentId                        INTEGER,
-            parentName                      TEXT,
-            retainBackupDataForDays         INTEGER,
-            retainBackupDataForCycles       INTEGER,
-            retainArchiverDataForDays       INTEGER,
-            enableDataAging                 INTEGER,
-            jobBasedRetention               INTEGER,
-            firstExtendedRetentionDays      INTEGER,
-            firstExtendedRetentionCycles    INTEGER,
-            secondExtendedRetentionDays     INTEGER,
-            secondExtendedRetentionCycles   INTEGER,
-            lastFetchTime                   TEXT,
-            UNIQUE(entityType, entityId)
-        )
-    """)
-
-    # Create table for Events (Alerts and Critical Events)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS events (
-            eventId           INTEGER PRIMARY KEY,
-            eventCode         TEXT,
-            severity          TEXT,
-            eventType         TEXT,
-            message           TEXT,
-            timeSource        TEXT,
-            subsystem         TEXT,
-            clientName        TEXT,
-            jobId             INTEGER,
-            lastFetchTime     TEXT
-        )
-    """)
+    """Bring the database schema up to date (see db_migrations.py); writes nothing once it is current"""
+    # Switches the file to WAL journaling on first run
+    db = connect(DB_PATH)
 
-    # Create table for Alerts
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS alerts (
-            alertId           INTEGER PRIMARY KEY,
-            alertName         TEXT,
-            alertType         TEXT,
-            severity          TEXT,
-            status            TEXT,
-            alertMessage      TEXT,
-            triggerTime       TEXT,
-            lastFetchTime     TEXT
-        )
-    """)
-
-    # Create table for CommCell Info (Health Check)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS commcell_info (
-            id                INTEGER PRIMARY KEY,
-            commcellName      TEXT,
-            commserveVersion  TEXT,
-            timeZone          TEXT,
-            commserveHost     TEXT,
-            status            TEXT,
-            lastCheckTime     TEXT
-        )
-    """)
+    # Calls buffered outside a fetch run are written to this database at exit
+    call_recorder.db_path = DB_PATH
 
-    # Create table for Selected MediaAgents (for environment filtering)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS selected_mediaagents (
-            mediaAgentId      INTEGER PRIMARY KEY,
-            mediaAgentName    TEXT NOT NULL,
-            selectedDate      TEXT,
-            notes             TEXT,
-            FOREIGN KEY (mediaAgentId) REFERENCES mediaagents(mediaAgentId)
-        )
-    """)
-
-    # Enhance jobs table with performance metrics (if not exists, SQLite will ignore)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS jobs_enhanced (
-            jobId                INTEGER PRIMARY KEY,
-            clientId             INTEGER,
-            clientName           TEXT,
-            jobType              TEXT,
-            status               TEXT,
-            startTime            TEXT,
-            endTime              TEXT,
-            backupSetName        TEXT,
-            sizeOfApplication    TEXT,
-            sizeOfMediaOnDisk    TEXT,
-            percentSavings       REAL,
-            throughputMBps       REAL,
-            jobElapsedTime       TEXT,
-            filesCount           INTEGER,
-            lastFetchTime        TEXT
-        )
-    """)
+    # Numbered migrations; a single query when the schema is already current
+    for version, name, duration_ms in apply_migrations(db):
+        print(f"Applied schema migration {version}: {name} ({duration_ms:.0f} ms)")
 
-    db.commit()
     db.close()
 
-def authenticate_commvault(base_url, username, password):
+def authenticate_commvault(base_url, username, password, client=None):
     """
     Authenticate with Commvault API and return auth token
 
+    Tokens are cached process-wide per (base_url, username), so repeated page loads
+    reuse the last login instead of posting to /Login each time.
+
     Args:
         base_url: Commvault API base URL
         username: Username for authentication (can include @ for email format)
         password: Password (can be plaintext or Base64-encoded)
+        client: Optional CommvaultClient to authenticate (it will re-login on HTTP 401)
 
     Returns:
         Auth token string or None if authentication fails
     """
     try:
-        # Check if password is already Base64 encoded
-        # If not, encode it
-        try:
-            # Try to decode to check if it's valid base64
-            decoded = base64.b64decode(password).decode('utf-8')
-            # Check if decoded value is reasonable (not binary gibberish)
-            if len(decoded) > 0 and all(c.isprintable() or c.isspace() for c in decoded):
-                encoded_password = password
-            else:
-                # Looks like binary data, encode the original
-                encoded_password = base64.b64encode(password.encode('utf-8')).decode('utf-8')
-        except:
-            # Not valid base64, encode it
-            encoded_password = base64.b64encode(password.encode('utf-8')).decode('utf-8')
-
-        login_payload = {
-            "username": username,
-            "password": encoded_password
-        }
-
-        headers = {
-            "Accept": "application/json",
-            "Content-Type": "application/json"
-        }
-
-        # Make login request
-        start_time = time.time()
-        response = requests.post(
-            f"{base_url}/Login",
-            json=login_payload,
-            headers=headers,
-            timeout=30,
-            verify=False  # Disable SSL verification for self-signed certs
-        )
-        duration = int((time.time() - start_time) * 1000)  # Convert to milliseconds
-
-        # Log the POST request
-        log_api_request('POST', '/Login', response.status_code, duration=duration)
-
-        if response.status_code == 200:
-            token_data = response.json()
-            token = token_data.get('token', '')
-
-            # Strip "QSDK " prefix if present
-            if token.startswith("QSDK "):
-                token = token[5:]
-
-            print(f"Authentication successful for user: {username}")
+        # Password is Base64-encoded by the client if it is not already
+        client = client or CommvaultClient.from_config(base_url=base_url)
+        token = client.authenticate(username, password)
+        response = client.login_response
+
+        # Log the POST request (only made when the token cache had nothing usable)
+        if response is not None:
+            log_api_request('POST', '/Login', response.status_code, duration=client.login_duration)
+
+        if token:
+            if response is not None:
+                print(f"Authentication successful for user: {username}")
             return token
         else:
             print(f"Login failed with status {response.status_code}: {response.text[:200]}")
@@ -431,96 +201,133 @@ def authenticate_commvault(base_url, username, password):
         log_api_activity('error', f'{error_type} for {username}: {error_msg[:100]}')
         return None
 
+# Column order of the row tuples each saver builds for upsert_rows
+CLIENT_COLUMNS = ['clientId', 'clientName', 'hostName', 'clientGUID', 'lastFetchTime']
+JOB_COLUMNS = ['jobId', 'clientId', 'clientName', 'jobType', 'status', 'startTime', 'endTime',
+               'backupSetName', 'lastFetchTime']
+ENHANCED_JOB_COLUMNS = JOB_COLUMNS[:-1] + ['sizeOfApplication', 'sizeOfMediaOnDisk', 'percentSavings',
+                                           'throughputMBps', 'jobElapsedTime', 'filesCount', 'lastFetchTime']
+STORAGE_POLICY_COLUMNS = ['storagePolicyId', 'storagePolicyName', 'lastFetchTime']
+MEDIAAGENT_COLUMNS = ['mediaAgentId', 'mediaAgentName', 'hostName', 'osType', 'status',
+                      'availableSpace', 'totalSpace', 'pctFree', 'pctUsed', 'lastFetchTime']
+LIBRARY_COLUMNS = ['libraryId', 'libraryName', 'libraryType', 'mediaAgentName', 'status', 'lastFetchTime']
+STORAGE_POOL_COLUMNS = ['storagePoolId', 'storagePoolName', 'storagePoolType', 'mediaAgentName',
+                        'totalCapacity', 'freeSpace', 'pctFree', 'pctUsed', 'dedupeEnabled', 'lastFetchTime']
+HYPERVISOR_COLUMNS = ['instanceId', 'instanceName', 'hypervisorType', 'hostName', 'vendor', 'status',
+                      'lastFetchTime']
+STORAGE_ARRAY_COLUMNS = ['arrayId', 'arrayName', 'arrayType', 'vendor', 'model', 'totalCapacity',
+                         'usedCapacity', 'lastFetchTime']
+PLAN_COLUMNS = ['planId', 'planName', 'description', 'type', 'subtype', 'numCopies', 'numAssocEntities',
+                'rpoInMinutes', 'storageTarget', 'storagePolicyId', 'isElastic', 'statusFlag', 'lastFetchTime']
+RETENTION_RULE_COLUMNS = ['entityType', 'entityId', 'entityName', 'parentId', 'parentName',
+                          'retainBackupDataForDays', 'retainBackupDataForCycles', 'retainArchiverDataForDays',
+                          'enableDataAging', 'jobBasedRetention',
+                          'firstExtendedRetentionDays', 'firstExtendedRetentionCycles',
+                          'secondExtendedRetentionDays', 'secondExtendedRetentionCycles', 'lastFetchTime']
+EVENT_COLUMNS = ['eventId', 'eventCode', 'severity', 'eventType', 'message', 'timeSource', 'subsystem',
+                 'clientName', 'jobId', 'lastFetchTime']
+ALERT_COLUMNS = ['alertId', 'alertName', 'alertType', 'severity', 'status', 'alertMessage', 'triggerTime',
+                 'lastFetchTime']
+COMMCELL_INFO_COLUMNS = ['id', 'commcellName', 'commserveVersion', 'timeZone', 'commserveHost', 'status',
+                         'lastCheckTime']
+
+# Rows per executemany batch in the savers ([database] batch_size)
+WRITE_BATCH_SIZE = load_config()['batch_size']
+
+# Raw payload archive ([archive] enabled = true); None when disabled
+PAYLOAD_ARCHIVE = open_archive()
+
 def save_clients_to_db(db, clients_json):
     """Save clients data to database"""
-    cur = db.cursor()
     fetch_time = datetime.now().isoformat()
 
     client_properties = clients_json.get("clientProperties", [])
+    rows = []
     for client_entry in client_properties:
         client_info = client_entry.get("client", {})
-        client_id = client_info.get("clientId")
-        name = client_info.get("clientName", "")
-        host = client_info.get("hostName", "")
-        guid = client_info.get("GUID", "")
+        # FIXED: /Client nests the client's ids under clientEntity
+        client_entity = client_info.get("clientEntity", client_info)
+        client_id = client_entity.get("clientId")
+        name = client_entity.get("clientName", "")
+        host = client_entity.get("hostName", "")
+        guid = client_entity.get("clientGUID", client_info.get("GUID", ""))
 
         if client_id:
-            cur.execute(
-                "REPLACE INTO clients (clientId, clientName, hostName, clientGUID, lastFetchTime) VALUES (?, ?, ?, ?, ?)",
-                (client_id, name, host, guid, fetch_time)
-            )
+            rows.append((client_id, name, host, guid, fetch_time))
 
+    upsert_rows(db, 'clients', CLIENT_COLUMNS, ['clientId'], rows, WRITE_BATCH_SIZE)
     return len(client_properties)
 
+# Job states that never change again (Completed, Completed w/ errors, Failed, Failed to Start, Killed, ...)
+TERMINAL_JOB_STATUSES = ('completed', 'failed', 'killed', 'committed')
+
+def is_terminal_job_status(status):
+    """True if a job in this status can never change again"""
+    return (status or '').strip().lower().startswith(TERMINAL_JOB_STATUSES)
+
+def terminal_job_ids(db, table, job_ids):
+    """Ids among job_ids already stored in table with a terminal status (no need to write or re-fetch them)"""
+    job_ids = list(job_ids)
+    settled = set()
+    for start in range(0, len(job_ids), 500):
+        chunk = job_ids[start:start + 500]
+        rows = db.execute(
+            f"SELECT jobId, status FROM {table} WHERE jobId IN ({', '.join('?' for _ in chunk)})", chunk
+        ).fetchall()
+        settled.update(job_id for job_id, status in rows if is_terminal_job_status(status))
+    return settled
+
+def job_row(job_summary, fetch_time):
+    """jobs row tuple for one jobSummary"""
+    return (
+        job_summary.get("jobId"),
+        job_summary.get("subclient", {}).get("clientId", 0),
+        job_summary.get("subclient", {}).get("clientName", ""),
+        job_summary.get("jobType", ""),
+        job_summary.get("status", ""),
+        job_summary.get("jobStartTime", ""),
+        job_summary.get("jobEndTime", ""),
+        job_summary.get("backupSet", {}).get("backupSetName", ""),
+        fetch_time
+    )
+
 def save_jobs_to_db(db, jobs_json):
     """Save jobs data to database"""
-    cur = db.cursor()
     fetch_time = datetime.now().isoformat()
 
     jobs_list = jobs_json.get("jobs", [])
+    rows = []
     for job_entry in jobs_list:
         job_summary = job_entry.get("jobSummary", {})
-        job_id = job_summary.get("jobId")
+        if job_summary.get("jobId"):
+            rows.append(job_row(job_summary, fetch_time))
 
-        if job_id:
-            client_id = job_summary.get("subclient", {}).get("clientId", 0)
-            client_name = job_summary.get("subclient", {}).get("clientName", "")
-            job_type = job_summary.get("jobType", "")
-            status = job_summary.get("status", "")
-            start_time = job_summary.get("jobStartTime", "")
-            end_time = job_summary.get("jobEndTime", "")
-            backupset_name = job_summary.get("backupSet", {}).get("backupSetName", "")
-
-            cur.execute(
-                """REPLACE INTO jobs
-                (jobId, clientId, clientName, jobType, status, startTime, endTime, backupSetName, lastFetchTime)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (job_id, client_id, client_name, job_type, status, start_time, end_time, backupset_name, fetch_time)
-            )
+    # Jobs already stored in a terminal state never change; only new and active jobs are written
+    settled = terminal_job_ids(db, 'jobs', [row[0] for row in rows])
+    rows = [row for row in rows if row[0] not in settled]
 
+    upsert_rows(db, 'jobs', JOB_COLUMNS, ['jobId'], rows, WRITE_BATCH_SIZE)
     return len(jobs_list)
 
-def save_plans_to_db(db, plans_json):
-    """Save plans data to database"""
-    cur = db.cursor()
-    fetch_time = datetime.now().isoformat()
-
-    plans_list = plans_json.get("plans", [])
-    for plan_entry in plans_list:
-        plan_id = plan_entry.get("plan", {}).get("planId")
-        plan_name = plan_entry.get("plan", {}).get("planName", "")
-        plan_type = plan_entry.get("planType", "")
-
-        if plan_id:
-            cur.execute(
-                "REPLACE INTO plans (planId, planName, planType, lastFetchTime) VALUES (?, ?, ?, ?)",
-                (plan_id, plan_name, plan_type, fetch_time)
-            )
-
-    return len(plans_list)
-
 def save_storage_to_db(db, storage_json):
     """Save storage policies data to database"""
-    cur = db.cursor()
     fetch_time = datetime.now().isoformat()
 
     policies_list = storage_json.get("policies", [])
+    rows = []
     for policy_entry in policies_list:
         storage_policy = policy_entry.get("storagePolicy", {})
         policy_id = storage_policy.get("storagePolicyId")
         policy_name = storage_policy.get("storagePolicyName", "")
 
         if policy_id:
-            cur.execute(
-                "REPLACE INTO storage_policies (storagePolicyId, storagePolicyName, lastFetchTime) VALUES (?, ?, ?)",
-                (policy_id, policy_name, fetch_time)
-            )
+            rows.append((policy_id, policy_name, fetch_time))
 
+    upsert_rows(db, 'storage_policies', STORAGE_POLICY_COLUMNS, ['storagePolicyId'], rows, WRITE_BATCH_SIZE)
     return len(policies_list)
 
 def save_mediaagents_to_db(db, mediaagents_json):
     """Save MediaAgents data to database"""
-    cur = db.cursor()
     fetch_time = datetime.now().isoformat()
 
     # FIXED: API returns response array with entityInfo structure
@@ -532,6 +339,7 @@ def save_mediaagents_to_db(db, mediaagents_json):
         if not ma_list:
             ma_list = mediaagents_json.get("mediaAgents", [])
 
+    rows = []
     for ma_entry in ma_list:
         # Check if using new entityInfo structure
         if "entityInfo" in ma_entry:
@@ -541,8 +349,8 @@ def save_mediaagents_to_db(db, mediaagents_json):
             host = entity_info.get("hostName", "")
             os_type = ma_entry.get("osType", "")
             status = ma_entry.get("status", "Online")
-            available_space = ma_entry.get("availableSpace", "N/A")
-            total_space = ma_entry.get("totalSpace", "N/A")
+            available_space = ma_entry.get("availableSpace")
+            total_space = ma_entry.get("totalSpace")
         else:
             # Old structure fallback
             ma_info = ma_entry.get("mediaAgent", ma_entry)
@@ -551,22 +359,21 @@ def save_mediaagents_to_db(db, mediaagents_json):
             host = ma_info.get("hostName", "")
             os_type = ma_info.get("osType", "")
             status = ma_info.get("status", "Online")
-            available_space = ma_info.get("availableSpace", "N/A")
-            total_space = ma_info.get("totalSpace", "N/A")
+            available_space = ma_info.get("availableSpace")
+            total_space = ma_info.get("totalSpace")
 
         if ma_id:
-            cur.execute(
-                """REPLACE INTO mediaagents
-                (mediaAgentId, mediaAgentName, hostName, osType, status, availableSpace, totalSpace, lastFetchTime)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                (ma_id, name, host, os_type, status, str(available_space), str(total_space), fetch_time)
-            )
+            available_space = capacity_value(available_space)
+            total_space = capacity_value(total_space)
+            pct_free, pct_used = capacity_percentages(total_space, available_space)
+            rows.append((ma_id, name, host, os_type, status, available_space, total_space, pct_free, pct_used,
+                         fetch_time))
 
+    upsert_rows(db, 'mediaagents', MEDIAAGENT_COLUMNS, ['mediaAgentId'], rows, WRITE_BATCH_SIZE)
     return len(ma_list)
 
 def save_libraries_to_db(db, libraries_json):
     """Save Libraries data to database"""
-    cur = db.cursor()
     fetch_time = datetime.now().isoformat()
 
     # FIXED: API returns response array with entityInfo structure
@@ -578,6 +385,7 @@ def save_libraries_to_db(db, libraries_json):
         if not lib_list:
             lib_list = libraries_json.get("libraries", [])
 
+    rows = []
     for lib_entry in lib_list:
         # Check if using new entityInfo structure
         if "entityInfo" in lib_entry:
@@ -597,18 +405,13 @@ def save_libraries_to_db(db, libraries_json):
             status = lib_info.get("status", "Online")
 
         if lib_id:
-            cur.execute(
-                """REPLACE INTO libraries
-                (libraryId, libraryName, libraryType, mediaAgentName, status, lastFetchTime)
-                VALUES (?, ?, ?, ?, ?, ?)""",
-                (lib_id, name, lib_type, ma_name, status, fetch_time)
-            )
+            rows.append((lib_id, name, lib_type, ma_name, status, fetch_time))
 
+    upsert_rows(db, 'libraries', LIBRARY_COLUMNS, ['libraryId'], rows, WRITE_BATCH_SIZE)
     return len(lib_list)
 
 def save_storage_pools_to_db(db, pools_json):
     """Save Storage Pools data to database"""
-    cur = db.cursor()
     fetch_time = datetime.now().isoformat()
 
     # FIXED: API returns storagePoolList (not storagePools)
@@ -620,6 +423,7 @@ def save_storage_pools_to_db(db, pools_json):
         if not pools_list:
             pools_list = pools_json.get("storagePoolsList", [])
 
+    rows = []
     for pool_entry in pools_list:
         # FIXED: Pool ID and name are in storagePoolEntity, not storagePool
         pool_entity = pool_entry.get("storagePoolEntity", {})
@@ -635,9 +439,10 @@ def save_storage_pools_to_db(db, pools_json):
         # MediaAgent name - may not always be present
         ma_name = pool_entry.get("mediaAgentName", "")
 
-        # Capacity info is at pool_entry level
-        total_cap = pool_entry.get("totalCapacity", "N/A")
-        free_space = pool_entry.get("totalFreeSpace", "N/A")
+        # Capacity info is at pool_entry level (NULL when missing or -1)
+        total_cap = capacity_value(pool_entry.get("totalCapacity"))
+        free_space = capacity_value(pool_entry.get("totalFreeSpace"))
+        pct_free, pct_used = capacity_percentages(total_cap, free_space)
 
         # Check for deduplication in dedupeFlags if present
         dedupe_flags = pool_entry.get("dedupeFlags", {})
@@ -647,24 +452,21 @@ def save_storage_pools_to_db(db, pools_json):
             dedupe = pool_entry.get("dedupeEnabled", "No")
 
         if pool_id:
-            cur.execute(
-                """REPLACE INTO storage_pools
-                (storagePoolId, storagePoolName, storagePoolType, mediaAgentName, totalCapacity, freeSpace, dedupeEnabled, lastFetchTime)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                (pool_id, name, pool_type, ma_name, str(total_cap), str(free_space), str(dedupe), fetch_time)
-            )
+            rows.append((pool_id, name, pool_type, ma_name, total_cap, free_space, pct_free, pct_used, str(dedupe),
+                         fetch_time))
 
+    upsert_rows(db, 'storage_pools', STORAGE_POOL_COLUMNS, ['storagePoolId'], rows, WRITE_BATCH_SIZE)
     return len(pools_list)
 
 def save_hypervisors_to_db(db, hypervisors_json):
     """Save Hypervisors/VM Infrastructure data to database"""
-    cur = db.cursor()
     fetch_time = datetime.now().isoformat()
 
     hv_list = hypervisors_json.get("VSInstanceProperties", [])
     if not hv_list:
         hv_list = hypervisors_json.get("instances", [])
 
+    rows = []
     for hv_entry in hv_list:
         hv_info = hv_entry.get("instance", hv_entry)
         instance_id = hv_info.get("instanceId")
@@ -675,24 +477,20 @@ def save_hypervisors_to_db(db, hypervisors_json):
         status = hv_info.get("status", "Active")
 
         if instance_id:
-            cur.execute(
-                """REPLACE INTO hypervisors
-                (instanceId, instanceName, hypervisorType, hostName, vendor, status, lastFetchTime)
-                VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                (instance_id, name, hv_type, host, vendor, status, fetch_time)
-            )
+            rows.append((instance_id, name, hv_type, host, vendor, status, fetch_time))
 
+    upsert_rows(db, 'hypervisors', HYPERVISOR_COLUMNS, ['instanceId'], rows, WRITE_BATCH_SIZE)
     return len(hv_list)
 
 def save_storage_arrays_to_db(db, arrays_json):
     """Save Storage Arrays data to database"""
-    cur = db.cursor()
     fetch_time = datetime.now().isoformat()
 
     arrays_list = arrays_json.get("storageArrays", [])
     if not arrays_list:
         arrays_list = arrays_json.get("arrays", [])
 
+    rows = []
     for array_entry in arrays_list:
         array_info = array_entry.get("array", array_entry)
         array_id = array_info.get("arrayId", array_info.get("id"))
@@ -704,24 +502,19 @@ def save_storage_arrays_to_db(db, arrays_json):
         used_cap = array_info.get("usedCapacity", "N/A")
 
         if array_id:
-            cur.execute(
-                """REPLACE INTO storage_arrays
-                (arrayId, arrayName, arrayType, vendor, model, totalCapacity, usedCapacity, lastFetchTime)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                (array_id, name, array_type, vendor, model, str(total_cap), str(used_cap), fetch_time)
-            )
+            rows.append((array_id, name, array_type, vendor, model, str(total_cap), str(used_cap), fetch_time))
 
+    upsert_rows(db, 'storage_arrays', STORAGE_ARRAY_COLUMNS, ['arrayId'], rows, WRITE_BATCH_SIZE)
     return len(arrays_list)
 
 def save_plans_to_db(db, plans_json):
     """Save Plans data to database with retention rules extraction"""
-    cur = db.cursor()
     fetch_time = datetime.now().isoformat()
 
     plans_list = plans_json.get("plans", [])
 
-    plan_count = 0
-    retention_count = 0
+    plan_rows = []
+    retention_rows = []
 
     for plan_entry in plans_list:
         # Extract plan basic info
@@ -748,20 +541,12 @@ def save_plans_to_db(db, plans_json):
         storage_policy_id = storage_policy_info.get("storagePolicyId", None)
 
         if plan_id:
-            # Save plan basic info
-            cur.execute("""
-                REPLACE INTO plans (
-                    planId, planName, description, type, subtype,
-                    numCopies, numAssocEntities, rpoInMinutes,
-                    storageTarget, storagePolicyId, isElastic,
-                    statusFlag, lastFetchTime
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+            # Plan basic info
+            plan_rows.append((
                 plan_id, plan_name, description, plan_type, subtype,
                 num_copies, num_entities, rpo_minutes, storage_target,
                 storage_policy_id, is_elastic, status_flag, fetch_time
             ))
-            plan_count += 1
 
             # Extract retention rules from each copy
             copies = storage.get("copy", [])
@@ -779,17 +564,7 @@ def save_plans_to_db(db, plans_json):
                     first_extended = extended_retention.get("firstExtendedRetentionRule", {})
                     second_extended = extended_retention.get("secondExtendedRetentionRule", {})
 
-                    # Save retention rule
-                    cur.execute("""
-                        REPLACE INTO retention_rules (
-                            entityType, entityId, entityName, parentId, parentName,
-                            retainBackupDataForDays, retainBackupDataForCycles,
-                            retainArchiverDataForDays, enableDataAging, jobBasedRetention,
-                            firstExtendedRetentionDays, firstExtendedRetentionCycles,
-                            secondExtendedRetentionDays, secondExtendedRetentionCycles,
-                            lastFetchTime
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
+                    retention_rows.append((
                         'plan_copy', copy_id, copy_name, plan_id, plan_name,
                         retention_rules.get('retainBackupDataForDays', -1),
                         retention_rules.get('retainBackupDataForCycles', -1),
@@ -802,19 +577,23 @@ def save_plans_to_db(db, plans_json):
                         second_extended.get('retainBackupDataForCycles', None),
                         fetch_time
                     ))
-                    retention_count += 1
 
-    return plan_count
+    # Plans and their retention rules land in one transaction
+    with write_transaction(db):
+        upsert_rows(db, 'plans', PLAN_COLUMNS, ['planId'], plan_rows, WRITE_BATCH_SIZE)
+        # Upsert on (entityType, entityId) keeps each rule's ruleId stable across refreshes
+        upsert_rows(db, 'retention_rules', RETENTION_RULE_COLUMNS, ['entityType', 'entityId'],
+                    retention_rows, WRITE_BATCH_SIZE)
+
+    return len(plan_rows)
 
 def save_events_to_db(db, events_json):
     """Save Events data to database"""
-    cur = db.cursor()
     fetch_time = datetime.now().isoformat()
 
-    events_list = events_json.get("commCellEvents", [])
-    if not events_list:
-        events_list = events_json.get("events", [])
+    events_list = find_list(events_json, 'events')[1]
 
+    rows = []
     for event_entry in events_list:
         event_id = event_entry.get("eventId", event_entry.get("id"))
         event_code = event_entry.get("eventCode", event_entry.get("eventCodeString", ""))
@@ -827,24 +606,19 @@ def save_events_to_db(db, events_json):
         job_id = event_entry.get("jobId", 0)
 
         if event_id:
-            cur.execute(
-                """REPLACE INTO events
-                (eventId, eventCode, severity, eventType, message, timeSource, subsystem, clientName, jobId, lastFetchTime)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (event_id, event_code, severity, event_type, message, time_source, subsystem, client_name, job_id, fetch_time)
-            )
+            rows.append((event_id, event_code, severity, event_type, message, time_source, subsystem,
+                         client_name, job_id, fetch_time))
 
+    upsert_rows(db, 'events', EVENT_COLUMNS, ['eventId'], rows, WRITE_BATCH_SIZE)
     return len(events_list)
 
 def save_alerts_to_db(db, alerts_json):
     """Save Alerts data to database"""
-    cur = db.cursor()
     fetch_time = datetime.now().isoformat()
 
-    alerts_list = alerts_json.get("alertList", [])
-    if not alerts_list:
-        alerts_list = alerts_json.get("alerts", [])
+    alerts_list = find_list(alerts_json, 'alerts')[1]
 
+    rows = []
     for alert_entry in alerts_list:
         alert_info = alert_entry.get("alert", alert_entry)
         alert_id = alert_info.get("alertId", alert_info.get("id"))
@@ -856,18 +630,13 @@ def save_alerts_to_db(db, alerts_json):
         trigger_time = alert_info.get("triggerTime", alert_info.get("timeStamp", ""))
 
         if alert_id:
-            cur.execute(
-                """REPLACE INTO alerts
-                (alertId, alertName, alertType, severity, status, alertMessage, triggerTime, lastFetchTime)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                (alert_id, name, alert_type, severity, status, message, trigger_time, fetch_time)
-            )
+            rows.append((alert_id, name, alert_type, severity, status, message, trigger_time, fetch_time))
 
+    upsert_rows(db, 'alerts', ALERT_COLUMNS, ['alertId'], rows, WRITE_BATCH_SIZE)
     return len(alerts_list)
 
 def save_commcell_info_to_db(db, commcell_json):
     """Save CommCell info to database"""
-    cur = db.cursor()
     check_time = datetime.now().isoformat()
 
     commcell_name = commcell_json.get("commCellName", commcell_json.get("name", ""))
@@ -877,34 +646,22 @@ def save_commcell_info_to_db(db, commcell_json):
     status = "Online"  # If we can fetch this, CommServe is online
 
     # Always update the single row (id=1)
-    cur.execute(
-        """REPLACE INTO commcell_info
-        (id, commcellName, commserveVersion, timeZone, commserveHost, status, lastCheckTime)
-        VALUES (?, ?, ?, ?, ?, ?, ?)""",
-        (1, commcell_name, version, timezone, host, status, check_time)
-    )
+    upsert_rows(db, 'commcell_info', COMMCELL_INFO_COLUMNS, ['id'],
+                [(1, commcell_name, version, timezone, host, status, check_time)], WRITE_BATCH_SIZE)
 
     return 1
 
 def save_enhanced_jobs_to_db(db, jobs_json):
     """Save enhanced job data with performance metrics"""
-    cur = db.cursor()
     fetch_time = datetime.now().isoformat()
 
     jobs_list = jobs_json.get("jobs", [])
+    rows = []
     for job_entry in jobs_list:
         job_summary = job_entry.get("jobSummary", {})
         job_id = job_summary.get("jobId")
 
         if job_id:
-            client_id = job_summary.get("subclient", {}).get("clientId", 0)
-            client_name = job_summary.get("subclient", {}).get("clientName", "")
-            job_type = job_summary.get("jobType", "")
-            status = job_summary.get("status", "")
-            start_time = job_summary.get("jobStartTime", "")
-            end_time = job_summary.get("jobEndTime", "")
-            backupset_name = job_summary.get("backupSet", {}).get("backupSetName", "")
-
             # Performance metrics
             size_app = job_summary.get("sizeOfApplication", 0)
             size_disk = job_summary.get("sizeOfMediaOnDisk", 0)
@@ -922,17 +679,85 @@ def save_enhanced_jobs_to_db(db, jobs_json):
 
             files_count = job_summary.get("totalNumOfFiles", job_summary.get("filesCount", 0))
 
-            cur.execute(
-                """REPLACE INTO jobs_enhanced
-                (jobId, clientId, clientName, jobType, status, startTime, endTime, backupSetName,
-                 sizeOfApplication, sizeOfMediaOnDisk, percentSavings, throughputMBps, jobElapsedTime, filesCount, lastFetchTime)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (job_id, client_id, client_name, job_type, status, start_time, end_time, backupset_name,
-                 str(size_app), str(size_disk), percent_savings, throughput, str(elapsed_time), files_count, fetch_time)
-            )
+            rows.append(job_row(job_summary, fetch_time)[:-1] + (
+                str(size_app), str(size_disk), percent_savings, throughput, str(elapsed_time), files_count, fetch_time
+            ))
+
+    settled = terminal_job_ids(db, 'jobs_enhanced', [row[0] for row in rows])
+    rows = [row for row in rows if row[0] not in settled]
 
+    upsert_rows(db, 'jobs_enhanced', ENHANCED_JOB_COLUMNS, ['jobId'], rows, WRITE_BATCH_SIZE)
     return len(jobs_list)
 
+def save_jobs_and_enhanced_to_db(db, jobs_json):
+    """Save jobs with performance metrics, and also to the regular jobs table"""
+    with write_transaction(db):
+        count = save_enhanced_jobs_to_db(db, jobs_json)
+        save_jobs_to_db(db, jobs_json)
+    return count
+
+# Jobs are pulled in pages of this size and streamed into the database page by page
+JOB_PAGE_SIZE = load_config()['job_page_size']
+
+def job_id_of(job_entry):
+    return job_entry.get("jobSummary", {}).get("jobId")
+
+def event_id_of(event_entry):
+    return event_entry.get("eventId", event_entry.get("id"))
+
+# Delta pulls: only ask for records newer than the endpoint's sync_state high-water mark
+JOBS_DELTA = DeltaSync("jobs", job_id_of,
+                       lambda state: f"/Job?completedJobLookupTime={seconds_since_sync(state)}")
+JOBS_ENHANCED_DELTA = DeltaSync("jobs", job_id_of,
+                                lambda state: "/Job" if not state else
+                                f"/Job?completedJobLookupTime={seconds_since_sync(state)}")
+
+def event_paths(state):
+    """Event endpoints to try, from the last sync time when there is one"""
+    from_time = sync_from_epoch(state)
+    suffix = f"&fromTime={from_time}" if from_time else ""
+    return [f"/CommServ/Event?level=Critical{suffix}", f"/Event?level=Critical{suffix}"]
+
+# Events never change once raised, so anything at or below the mark is skipped
+EVENTS_DELTA = DeltaSync("commCellEvents", event_id_of, event_paths, skip_seen=True)
+
+# Endpoints behind each data type on the /fetch form. Tasks with `tables` skip the save when the
+# response is byte-for-byte the same as the last one saved, and only touch lastFetchTime.
+FETCH_TASKS = {
+    "clients": FetchTask("clients", "/Client", save_clients_to_db, label="clients", tables=["clients"]),
+    # FIXED: Add time filter to prevent timeout (86400 = last 24 hours on the first sync,
+    # then the time since the last successful sync)
+    "jobs": PagedFetchTask("jobs", "/Job?completedJobLookupTime=86400", save_jobs_to_db, "jobs",
+                           label="jobs", page_size=JOB_PAGE_SIZE, delta=JOBS_DELTA),
+    "plans": FetchTask("plans", "/Plan", save_plans_to_db, label="plans with retention rules",
+                       tables=["plans", "retention_rules"]),
+    "storage": FetchTask("storage", "/V2/StoragePolicy", save_storage_to_db, label="storage policies",
+                         tables=["storage_policies"]),
+    "mediaagents": FetchTask("mediaagents", "/MediaAgent", save_mediaagents_to_db, label="MediaAgents",
+                             tables=["mediaagents"], snapshot=snapshot_task('mediaagent')),
+    "libraries": FetchTask("libraries", "/Library", save_libraries_to_db, label="libraries", tables=["libraries"]),
+    # FIXED: Use /StoragePool instead of /V4/StoragePool (V4 not available)
+    # Each refresh also appends pool / MediaAgent capacity to capacity_samples (see capacity_history.py)
+    "storage_pools": FetchTask("storage_pools", "/StoragePool", save_storage_pools_to_db, label="storage pools",
+                               tables=["storage_pools"], snapshot=snapshot_task('storage_pool')),
+    "hypervisors": FetchTask("hypervisors", "/Instance", save_hypervisors_to_db, label="hypervisors",
+                             tables=["hypervisors"]),
+    "storage_arrays": FetchTask("storage_arrays", "/V4/Storage/Array", save_storage_arrays_to_db,
+                                label="storage arrays", tables=["storage_arrays"]),
+    # FIXED: Try /CommServ/Event endpoint, falling back to old /Event endpoint
+    # (whichever answered last time on this CommServe version is tried first)
+    "events": FetchTask("events", ["/CommServ/Event?level=Critical", "/Event?level=Critical"],
+                        save_events_to_db, label="events", delta=EVENTS_DELTA, capability="events"),
+    "alerts": FetchTask("alerts", "/Alert", save_alerts_to_db, label="alerts", tables=["alerts"]),
+    "commcell_info": FetchTask("commcell_info", "/Commcell", save_commcell_info_to_db, label="CommCell info records"),
+    "jobs_enhanced": PagedFetchTask("jobs_enhanced", "/Job", save_jobs_and_enhanced_to_db, "jobs",
+                                    label="jobs with metrics", page_size=JOB_PAGE_SIZE,
+                                    delta=JOBS_ENHANCED_DELTA),
+    # Only running, pending and waiting jobs - the ones that can still change (polled by the scheduler)
+    "active_jobs": FetchTask("active_jobs", "/Job?jobCategory=Active", save_jobs_and_enhanced_to_db,
+                             label="active jobs"),
+}
+
 @app.route("/", methods=["GET"])
 def index():
     """Display configuration and data selection page"""
@@ -961,213 +786,40 @@ def fetch_data():
     log_api_activity('info', f'Starting data fetch for {len(data_types)} data types')
     log_api_activity('info', f'Target: {base_url.split("//")[1].split("/")[0] if "//" in base_url else base_url.split("/")[0]}')
 
-    # Authenticate with Commvault API
+    # Authenticate with Commvault API; all endpoint pulls share the client's pooled session
     log_api_activity('info', 'Authenticating with Commvault API...')
-    token = authenticate_commvault(base_url, username, password)
+    # Every call of this fetch (the /Login included) is recorded under one run id
+    client = CommvaultClient.from_config(base_url=base_url, run_id=new_run_id('fetch'))
+    token = authenticate_commvault(base_url, username, password, client=client)
 
     if not token:
+        call_recorder.flush_to_database(DB_PATH, client.run_id)
         flash("Authentication failed. Please check your credentials.", "error")
         log_api_activity('error', 'Authentication failed - invalid credentials')
         return redirect(url_for('index'))
 
     log_api_activity('success', f'Authenticated as: {username}')
 
-    # Prepare headers for API requests
-    headers = {
-        "Accept": "application/json",
-        "Authtoken": token
-    }
-
-    db = get_db()
-    results = {}
-    counts = {}
-    errors = {}
-
-    # Fetch selected data types
-    for dtype in data_types:
-        try:
-            if dtype == "clients":
-                log_api_activity('info', 'Fetching Clients data...')
-                start_time = time.time()
-                response = requests.get(f"{base_url}/Client", headers=headers, timeout=30)
-                duration = int((time.time() - start_time) * 1000)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["clients"] = data
-                    counts["clients"] = save_clients_to_db(db, data)
-                    log_api_request('GET', '/Client', response.status_code, count=counts["clients"], duration=duration)
-                    log_api_activity('success', f'Retrieved {counts["clients"]} clients')
-                else:
-                    log_api_request('GET', '/Client', response.status_code, duration=duration)
-                    errors["clients"] = f"Failed with status {response.status_code}"
-                    log_api_activity('error', f'Clients fetch failed: HTTP {response.status_code}')
-
-            elif dtype == "jobs":
-                # FIXED: Add time filter to prevent timeout (86400 = last 24 hours)
-                log_api_activity('info', 'Fetching Jobs (last 24h)...')
-                response = requests.get(f"{base_url}/Job?completedJobLookupTime=86400", headers=headers, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["jobs"] = data
-                    counts["jobs"] = save_jobs_to_db(db, data)
-                    log_api_activity('success', f'Retrieved {counts["jobs"]} jobs')
-                else:
-                    errors["jobs"] = f"Failed with status {response.status_code}"
-                    log_api_activity('error', f'Jobs fetch failed: HTTP {response.status_code}')
-
-            elif dtype == "plans":
-                response = requests.get(f"{base_url}/Plan", headers=headers, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["plans"] = data
-                    counts["plans"] = save_plans_to_db(db, data)
-                else:
-                    errors["plans"] = f"Failed with status {response.status_code}"
-
-            elif dtype == "storage":
-                response = requests.get(f"{base_url}/V2/StoragePolicy", headers=headers, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["storage"] = data
-                    counts["storage"] = save_storage_to_db(db, data)
-                else:
-                    errors["storage"] = f"Failed with status {response.status_code}"
-
-            elif dtype == "plans":
-                log_api_activity('info', 'Fetching Plans (with retention rules)...')
-                start_time = time.time()
-                response = requests.get(f"{base_url}/Plan", headers=headers, timeout=30)
-                duration = int((time.time() - start_time) * 1000)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["plans"] = data
-                    counts["plans"] = save_plans_to_db(db, data)
-                    log_api_request('GET', '/Plan', response.status_code, count=counts["plans"], duration=duration)
-                    log_api_activity('success', f'Retrieved {counts["plans"]} plans with retention rules')
-                else:
-                    log_api_request('GET', '/Plan', response.status_code, duration=duration)
-                    errors["plans"] = f"Failed with status {response.status_code}"
-                    log_api_activity('error', f'Plans fetch failed: HTTP {response.status_code}')
-
-            elif dtype == "mediaagents":
-                log_api_activity('info', 'Fetching MediaAgents...')
-                start_time = time.time()
-                response = requests.get(f"{base_url}/MediaAgent", headers=headers, timeout=30)
-                duration = int((time.time() - start_time) * 1000)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["mediaagents"] = data
-                    counts["mediaagents"] = save_mediaagents_to_db(db, data)
-                    log_api_request('GET', '/MediaAgent', response.status_code, count=counts["mediaagents"], duration=duration)
-                    log_api_activity('success', f'Retrieved {counts["mediaagents"]} MediaAgents')
-                else:
-                    log_api_request('GET', '/MediaAgent', response.status_code, duration=duration)
-                    errors["mediaagents"] = f"Failed with status {response.status_code}"
-                    log_api_activity('error', f'MediaAgents fetch failed: HTTP {response.status_code}')
-
-            elif dtype == "libraries":
-                response = requests.get(f"{base_url}/Library", headers=headers, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["libraries"] = data
-                    counts["libraries"] = save_libraries_to_db(db, data)
-                else:
-                    errors["libraries"] = f"Failed with status {response.status_code}"
-
-            elif dtype == "storage_pools":
-                # FIXED: Use /StoragePool instead of /V4/StoragePool (V4 not available)
-                log_api_activity('info', 'Fetching Storage Pools...')
-                start_time = time.time()
-                response = requests.get(f"{base_url}/StoragePool", headers=headers, timeout=30)
-                duration = int((time.time() - start_time) * 1000)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["storage_pools"] = data
-                    counts["storage_pools"] = save_storage_pools_to_db(db, data)
-                    log_api_request('GET', '/StoragePool', response.status_code, count=counts["storage_pools"], duration=duration)
-                    log_api_activity('success', f'Retrieved {counts["storage_pools"]} storage pools')
-                else:
-                    log_api_request('GET', '/StoragePool', response.status_code, duration=duration)
-                    errors["storage_pools"] = f"Failed with status {response.status_code}"
-                    log_api_activity('error', f'Storage Pools fetch failed: HTTP {response.status_code}')
-
-            elif dtype == "hypervisors":
-                response = requests.get(f"{base_url}/Instance", headers=headers, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["hypervisors"] = data
-                    counts["hypervisors"] = save_hypervisors_to_db(db, data)
-                else:
-                    errors["hypervisors"] = f"Failed with status {response.status_code}"
-
-            elif dtype == "storage_arrays":
-                # Try V4 endpoint for storage arrays
-                response = requests.get(f"{base_url}/V4/Storage/Array", headers=headers, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["storage_arrays"] = data
-                    counts["storage_arrays"] = save_storage_arrays_to_db(db, data)
-                else:
-                    errors["storage_arrays"] = f"Failed with status {response.status_code}"
-
-            elif dtype == "events":
-                # FIXED: Try /CommServ/Event endpoint (needs testing)
-                # Fetch recent critical events (last 7 days by default)
-                response = requests.get(f"{base_url}/CommServ/Event?level=Critical", headers=headers, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["events"] = data
-                    counts["events"] = save_events_to_db(db, data)
-                else:
-                    # Fallback to old endpoint if new one fails
-                    response = requests.get(f"{base_url}/Event?level=Critical", headers=headers, timeout=30)
-                    if response.status_code == 200:
-                        data = response.json()
-                        results["events"] = data
-                        counts["events"] = save_events_to_db(db, data)
-                    else:
-                        errors["events"] = f"Failed with status {response.status_code}"
-
-            elif dtype == "alerts":
-                response = requests.get(f"{base_url}/Alert", headers=headers, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["alerts"] = data
-                    counts["alerts"] = save_alerts_to_db(db, data)
-                else:
-                    errors["alerts"] = f"Failed with status {response.status_code}"
-
-            elif dtype == "commcell_info":
-                # Fetch CommCell info for health check
-                response = requests.get(f"{base_url}/Commcell", headers=headers, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["commcell_info"] = data
-                    counts["commcell_info"] = save_commcell_info_to_db(db, data)
-                else:
-                    errors["commcell_info"] = f"Failed with status {response.status_code}"
-
-            elif dtype == "jobs_enhanced":
-                # Fetch jobs with enhanced metrics
-                response = requests.get(f"{base_url}/Job", headers=headers, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    results["jobs_enhanced"] = data
-                    counts["jobs_enhanced"] = save_enhanced_jobs_to_db(db, data)
-                    # Also save to regular jobs table
-                    save_jobs_to_db(db, data)
-                else:
-                    errors["jobs_enhanced"] = f"Failed with status {response.status_code}"
-
-        except requests.exceptions.Timeout:
-            errors[dtype] = "Request timed out"
-        except requests.exceptions.RequestException as e:
-            errors[dtype] = f"Request error: {str(e)}"
-        except Exception as e:
-            errors[dtype] = f"Error: {str(e)}"
+    config = load_config()
+    tasks = [FETCH_TASKS[dtype] for dtype in data_types if dtype in FETCH_TASKS]
+
+    log_api_activity('info', f'Fetching {len(tasks)} endpoints concurrently (max {config["max_workers"]} workers)...')
+
+    # Endpoints are pulled in parallel; saves happen here on the request thread, taking the
+    # single writer per payload so other writes get their turn during network time
+    results, counts, errors = run_fetch_tasks(
+        client, tasks, get_connection_manager(DB_PATH),
+        max_workers=config['max_workers'],
+        on_request=lambda method, path, status, count, duration: log_api_request(
+            method, path, status, count=count, duration=duration),
+        archive=PAYLOAD_ARCHIVE
+    )
 
-    # Commit database changes
-    db.commit()
+    for task in tasks:
+        if task.name in counts:
+            log_api_activity('success', f'Retrieved {counts[task.name]} {task.label}')
+        elif task.name in errors:
+            log_api_activity('error', f'Fetch failed for {task.label}: {errors[task.name]}')
 
     # Show success message
     if counts:
@@ -1219,13 +871,13 @@ def view_data(data_type):
         columns = ["Storage Policy ID", "Storage Policy Name", "Last Fetch"]
     elif data_type == "mediaagents":
         cur.execute("SELECT * FROM mediaagents ORDER BY mediaAgentName")
-        columns = ["MediaAgent ID", "MediaAgent Name", "Hostname", "OS Type", "Status", "Available Space", "Total Space", "Last Fetch"]
+        columns = ["MediaAgent ID", "MediaAgent Name", "Hostname", "OS Type", "Status", "Available Space", "Total Space", "% Free", "% Used", "Last Fetch"]
     elif data_type == "libraries":
         cur.execute("SELECT * FROM libraries ORDER BY libraryName")
         columns = ["Library ID", "Library Name", "Library Type", "MediaAgent", "Status", "Last Fetch"]
     elif data_type == "storage_pools":
         cur.execute("SELECT * FROM storage_pools ORDER BY storagePoolName")
-        columns = ["Pool ID", "Pool Name", "Pool Type", "MediaAgent", "Total Capacity", "Free Space", "Dedupe", "Last Fetch"]
+        columns = ["Pool ID", "Pool Name", "Pool Type", "MediaAgent", "Total Capacity", "Free Space", "% Free", "% Used", "Dedupe", "Last Fetch"]
     elif data_type == "hypervisors":
         cur.execute("SELECT * FROM hypervisors ORDER BY instanceName")
         columns = ["Instance ID", "Instance Name", "Hypervisor Type", "Hostname", "Vendor", "Status", "Last Fetch"]
@@ -1379,7 +1031,7 @@ def view_mediaagents():
 @app.route("/mediaagents/select/<int:ma_id>", methods=['POST'])
 def select_mediaagent(ma_id):
     """Select a MediaAgent for monitoring"""
-    db = get_db()
+    db = get_write_db()
     cur = db.cursor()
 
     # Get MediaAgent name
@@ -1403,7 +1055,7 @@ def select_mediaagent(ma_id):
 @app.route("/mediaagents/deselect/<int:ma_id>", methods=['POST'])
 def deselect_mediaagent(ma_id):
     """Deselect a MediaAgent from monitoring"""
-    db = get_db()
+    db = get_write_db()
     cur = db.cursor()
 
     # Get MediaAgent name before deleting
@@ -1423,7 +1075,7 @@ def deselect_mediaagent(ma_id):
 @app.route("/mediaagents/update-note/<int:ma_id>", methods=['POST'])
 def update_mediaagent_note(ma_id):
     """Update notes for a selected MediaAgent"""
-    db = get_db()
+    db = get_write_db()
     cur = db.cursor()
 
     note = request.form.get('note', '')
@@ -1483,6 +1135,8 @@ def infrastructure_dashboard():
     cur.execute("SELECT COUNT(*) as count FROM jobs")
     stats['jobs_count'] = cur.fetchone()[0]
 
+    # Substring, case-insensitive matches (e.g. "Completed w/ one or more errors"): a scan of the
+    # ix_jobs_status covering index rather than of the table, since a leading % cannot seek
     cur.execute("SELECT COUNT(*) as count FROM jobs WHERE status LIKE '%Completed%'")
     stats['jobs_completed'] = cur.fetchone()[0]
 
@@ -1670,8 +1324,10 @@ def storage_pool_health_dashboard():
     db = get_db()
     cur = db.cursor()
 
-    # Get all storage pools with capacity information
-    cur.execute("""
+    # Pools with their health band; percent free/used are stored at ingest, so the
+    # classification happens here rather than by parsing capacity strings per row.
+    # Sizes are in KB, so dividing by 1024^3 gives TB.
+    cur.execute(f"""
         SELECT
             storagePoolId,
             storagePoolName,
@@ -1680,9 +1336,15 @@ def storage_pool_health_dashboard():
             totalCapacity,
             freeSpace,
             dedupeEnabled,
-            lastFetchTime
+            lastFetchTime,
+            ROUND(totalCapacity / 1073741824.0, 5) AS totalCapacity_tb,
+            ROUND(freeSpace / 1073741824.0, 5) AS freeSpace_tb,
+            ROUND((totalCapacity - freeSpace) / 1073741824.0, 5) AS usedSpace_tb,
+            ROUND(pctFree, 2) AS pct_free,
+            ROUND(pctUsed, 2) AS pct_used,
+            {CAPACITY_BAND_SQL} AS band
         FROM storage_pools
-        ORDER BY storagePoolName
+        ORDER BY pctUsed DESC, storagePoolName
     """)
 
     storage_pools = [dict(row) for row in cur.fetchall()]
@@ -1702,16 +1364,8 @@ def storage_pool_health_dashboard():
         'avg_utilization': 0
     }
 
-    # Lists for categorized pools
-    critical_pools = []
-    warning_pools = []
-    low_pools = []
-    ok_pools = []
-
-    # Process each pool
-    total_capacity_bytes = 0
-    total_free_bytes = 0
-    pools_with_data = 0
+    # Lists for categorized pools (already ordered most full first)
+    pools_by_band = {'critical': [], 'warning': [], 'low': [], 'ok': [], 'no_data': []}
 
     for pool in storage_pools:
         # Check dedup status
@@ -1724,60 +1378,21 @@ def storage_pool_health_dashboard():
         else:
             stats['non_dedup_pools'] += 1
 
-        # Calculate capacity metrics
-        try:
-            total_cap = int(pool['totalCapacity']) if pool['totalCapacity'] else 0
-            free_sp = int(pool['freeSpace']) if pool['freeSpace'] else 0
-
-            if total_cap > 0:
-                pools_with_data += 1
-                total_capacity_bytes += total_cap
-                total_free_bytes += free_sp
-
-                # Calculate percentage free
-                pct_free = (free_sp * 100.0) / total_cap
-                pct_used = 100 - pct_free
-
-                # Convert to TB for display (values are in KB, so divide by 1024^3)
-                total_tb = total_cap / (1024**3)
-                free_tb = free_sp / (1024**3)
-                used_tb = total_tb - free_tb
-
-                pool['totalCapacity_tb'] = round(total_tb, 5)
-                pool['freeSpace_tb'] = round(free_tb, 5)
-                pool['usedSpace_tb'] = round(used_tb, 5)
-                pool['pct_free'] = round(pct_free, 2)
-                pool['pct_used'] = round(pct_used, 2)
-
-                # Categorize by health
-                if pct_free < 10:
-                    stats['critical'] += 1
-                    critical_pools.append(pool)
-                elif pct_free < 20:
-                    stats['warning'] += 1
-                    warning_pools.append(pool)
-                elif pct_free < 30:
-                    stats['low'] += 1
-                    low_pools.append(pool)
-                else:
-                    stats['ok'] += 1
-                    ok_pools.append(pool)
-            else:
-                stats['no_data'] += 1
-                pool['pct_free'] = None
-                pool['pct_used'] = None
-
-        except (ValueError, TypeError, ZeroDivisionError):
-            stats['no_data'] += 1
-            pool['pct_free'] = None
-            pool['pct_used'] = None
-
-    # Calculate overall statistics (values are in KB, so divide by 1024^3 for TB)
-    if total_capacity_bytes > 0:
-        stats['total_capacity_tb'] = round(total_capacity_bytes / (1024**3), 5)
-        stats['total_free_tb'] = round(total_free_bytes / (1024**3), 5)
-        stats['total_used_tb'] = round((total_capacity_bytes - total_free_bytes) / (1024**3), 5)
-        stats['avg_utilization'] = round(((total_capacity_bytes - total_free_bytes) * 100.0) / total_capacity_bytes, 2)
+        stats[pool['band']] += 1
+        pools_by_band[pool['band']].append(pool)
+
+    # Overall capacity of the pools with data
+    cur.execute("""
+        SELECT SUM(totalCapacity), SUM(freeSpace)
+        FROM storage_pools
+        WHERE pctFree IS NOT NULL
+    """)
+    total_capacity_kb, total_free_kb = cur.fetchone()
+    if total_capacity_kb:
+        stats['total_capacity_tb'] = round(total_capacity_kb / (1024**3), 5)
+        stats['total_free_tb'] = round(total_free_kb / (1024**3), 5)
+        stats['total_used_tb'] = round((total_capacity_kb - total_free_kb) / (1024**3), 5)
+        stats['avg_utilization'] = round(((total_capacity_kb - total_free_kb) * 100.0) / total_capacity_kb, 2)
 
     # Calculate percentages for visualization
     if stats['total_pools'] > 0:
@@ -1791,18 +1406,14 @@ def storage_pool_health_dashboard():
         stats['low_pct'] = 0
         stats['ok_pct'] = 0
 
-    # Sort pools by % used (most full first)
-    all_pools_with_data = critical_pools + warning_pools + low_pools + ok_pools
-    all_pools_with_data.sort(key=lambda x: x['pct_used'] if x['pct_used'] is not None else 0, reverse=True)
+    # Pools with data, most full first (critical pools are then lowest % free first)
+    all_pools_with_data = [pool for pool in storage_pools if pool['band'] != 'no_data']
     top_full_pools = all_pools_with_data[:10]
 
-    # Sort critical pools by % free (lowest first)
-    critical_pools.sort(key=lambda x: x['pct_free'] if x['pct_free'] is not None else 100)
-
     return render_template("storage_pool_dashboard.html",
                          stats=stats,
-                         critical_pools=critical_pools,
-                         warning_pools=warning_pools,
+                         critical_pools=pools_by_band['critical'],
+                         warning_pools=pools_by_band['warning'],
                          top_full_pools=top_full_pools,
                          all_pools=all_pools_with_data)
 
@@ -1996,30 +1607,21 @@ def events_alerts_dashboard():
 
     # Get critical storage pools for alert recommendations
     cur.execute("""
-        SELECT storagePoolId, storagePoolName, totalCapacity, freeSpace
+        SELECT storagePoolId, storagePoolName, totalCapacity, freeSpace, pctFree
         FROM storage_pools
+        WHERE pctFree < 10
         ORDER BY storagePoolName
     """)
-    all_pools = cur.fetchall()
 
     critical_pools = []
-    for pool in all_pools:
-        try:
-            total = int(pool['totalCapacity']) if pool['totalCapacity'] else 0
-            free = int(pool['freeSpace']) if pool['freeSpace'] else 0
-
-            if total > 0:
-                pct_free = (free * 100.0) / total
-                if pct_free < 10:
-                    critical_pools.append({
-                        'name': pool['storagePoolName'],
-                        'id': pool['storagePoolId'],
-                        'pct_free': round(pct_free, 2),
-                        'total_gb': round(total / (1024**3), 4),
-                        'free_gb': round(free / (1024**3), 4)
-                    })
-        except:
-            continue
+    for pool in cur.fetchall():
+        critical_pools.append({
+            'name': pool['storagePoolName'],
+            'id': pool['storagePoolId'],
+            'pct_free': round(pool['pctFree'], 2),
+            'total_gb': round(pool['totalCapacity'] / (1024**3), 4),
+            'free_gb': round(pool['freeSpace'] / (1024**3), 4)
+        })
 
     # Recommended alert configurations
     recommended_alerts = [
@@ -2170,29 +1772,25 @@ def storage_estate_dashboard():
             'isDedupe': row[12]
         })
 
-    # Get storage pools
+    # Get storage pools (unknown sizes show as 0)
     cur.execute("""
         SELECT storagePoolId, storagePoolName, storagePoolType, mediaAgentName,
-               totalCapacity, freeSpace, dedupeEnabled
+               COALESCE(totalCapacity, 0), COALESCE(freeSpace, 0), COALESCE(pctUsed, 0), dedupeEnabled
         FROM storage_pools
         ORDER BY storagePoolName
     """)
 
     pools = []
     for row in cur.fetchall():
-        total_cap = int(row[4]) if row[4] and row[4] != 'None' else 0
-        free_sp = int(row[5]) if row[5] and row[5] != 'None' else 0
-        used_pct = ((total_cap - free_sp) / total_cap * 100) if total_cap else 0
-
         pools.append({
             'storagePoolId': row[0],
             'storagePoolName': row[1],
             'storagePoolType': row[2],
             'mediaAgentName': row[3],
-            'totalCapacity': total_cap,
-            'freeSpace': free_sp,
-            'usedPercent': used_pct,
-            'dedupeEnabled': row[6]
+            'totalCapacity': row[4],
+            'freeSpace': row[5],
+            'usedPercent': row[6],
+            'dedupeEnabled': row[7]
         })
 
     # Get pool-to-library mappings
@@ -2244,7 +1842,9 @@ def storage_estate_dashboard():
     overall_used_pct = (total_used_bytes / total_capacity_bytes * 100) if total_capacity_bytes else 0
 
     total_pools = len(pools)
-    critical_pools = sum(1 for pool in pools if pool['usedPercent'] > 80)
+    # More than 80% used (pctUsed is 100 - pctFree; the filter uses the pctFree index)
+    cur.execute("SELECT COUNT(*) FROM storage_pools WHERE pctFree < 20")
+    critical_pools = cur.fetchone()[0]
 
     # Group libraries by type
     libraries_by_type = {}
@@ -2534,20 +2134,22 @@ def collect_logs_stream():
 
             # Store collection history in database if logs were collected
             if len(collected) > 0:
-                import sqlite3
                 try:
-                    db = sqlite3.connect(config.get('database', 'path', fallback='Database/commvault.db'))
-                    cur = db.cursor()
+                    db_path = config.get('database', 'path', fallback='Database/commvault.db')
+                    with get_connection_manager(db_path).writer() as db:
+                        cur = db.cursor()
 
-                    timestamp = datetime.now().isoformat()
-                    for log_info in collected:
+                        # FIXED: one log_collection_history row per run (read by the logs dashboard)
                         cur.execute("""
-                            INSERT INTO collectionHistory (timestamp, fileName, fileSize, collectionMethod)
-                            VALUES (?, ?, ?, 'UNC')
-                        """, (timestamp, log_info['file'], log_info['size']))
-
-                    db.commit()
-                    db.close()
+                            INSERT INTO log_collection_history
+                                (mediaAgentName, collectionTime, logsCollected, totalSize, status, errorCount, errorDetails)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                        """, (media_agent, datetime.now().isoformat(), len(collected),
+                              sum(log_info['size'] for log_info in collected),
+                              'Success' if not errors else 'Partial', len(errors),
+                              '; '.join(f"{error['file']}: {error['error']}" for error in errors) or None))
+
+                        db.commit()
                 except Exception as e:
                     yield f"data: {json.dumps({'status': 'warning', 'message': f'Warning: Failed to store collection history: {str(e)}'})}\n\n"
 
@@ -2610,17 +2212,21 @@ def aging_report():
             flash('Please configure Commvault credentials in config.ini', 'error')
             return redirect(url_for('index'))
 
-        # Authenticate
-        token = authenticate_commvault(base_url, username, password)
+        # Authenticate (cached token is reused across page loads)
+        client = CommvaultClient.from_config(base_url=base_url, run_id=new_run_id('aging'))
+        try:
+            token = authenticate_commvault(base_url, username, password, client=client)
 
-        if not token:
-            flash('Authentication failed', 'error')
-            return redirect(url_for('index'))
+            if not token:
+                flash('Authentication failed', 'error')
+                return redirect(url_for('index'))
 
-        # Get aging status
-        tracker = AgingPruningTracker(base_url, token)
-        status = tracker.get_aging_status(days_back=7)
-        trending = tracker.get_aging_trending_data(days_back=30)
+            # Get aging status
+            tracker = AgingPruningTracker(base_url, token, client=client, db_path=DB_PATH)
+            status = tracker.get_aging_status(days_back=7)
+            trending = tracker.get_aging_trending_data(days_back=30)
+        finally:
+            call_recorder.flush_to_database(DB_PATH, client.run_id)
 
         return render_template('aging_report.html',
                              status=status,
@@ -2652,16 +2258,21 @@ def aging_check_stream():
 
             yield f"data: {json.dumps({'status': 'progress', 'message': 'Authenticating...', 'percent': 10})}\n\n"
 
-            token = authenticate_commvault(base_url, username, password)
+            client = CommvaultClient.from_config(base_url=base_url, run_id=new_run_id('aging'))
+            token = authenticate_commvault(base_url, username, password, client=client)
 
             if not token:
+                call_recorder.flush_to_database(DB_PATH, client.run_id)
                 yield f"data: {json.dumps({'status': 'error', 'message': 'Authentication failed'})}\n\n"
                 return
 
             yield f"data: {json.dumps({'status': 'progress', 'message': 'Fetching retention policies...', 'percent': 30})}\n\n"
 
-            tracker = AgingPruningTracker(base_url, token)
-            status = tracker.get_aging_status(days_back=7)
+            tracker = AgingPruningTracker(base_url, token, client=client)
+            try:
+                status = tracker.get_aging_status(days_back=7)
+            finally:
+                call_recorder.flush_to_database(DB_PATH, client.run_id)
 
             yield f"data: {json.dumps({'status': 'progress', 'message': 'Analyzing job history...', 'percent': 60})}\n\n"
 
@@ -2685,7 +2296,7 @@ def aging_check_stream():
 
 @app.route("/api/config")
 def api_config():
-    """API Configuration and Endpoint Status Page"""
+    """API Configuration and Endpoint Status Page (rendered from the last cached probe)"""
     try:
         # Load configuration
         config = configparser.ConfigParser()
@@ -2697,143 +2308,33 @@ def api_config():
         media_agent = config.get('commvault', 'media_agent', fallback='Not configured')
         verify_ssl = config.get('api', 'verify_ssl', fallback='false').lower() == 'true'
         timeout = config.get('api', 'timeout', fallback='300')
+        probe_ttl = config.getint('api', 'probe_ttl', fallback=DEFAULT_PROBE_TTL)
 
         # Mask password for display
         password_masked = password[:10] + '...' if len(password) > 10 else '***'
 
-        # Test authentication
-        auth_status = {
-            'success': False,
-            'error': None,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
+        db = get_db()
+        last_run, endpoints = load_probe_results(db)
 
-        token = None
-        try:
-            response = requests.post(
-                f'{base_url}/Login',
-                json={'username': username, 'password': password},
-                headers={'Accept': 'application/json', 'Content-Type': 'application/json'},
-                timeout=30,
-                verify=verify_ssl
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-                if 'token' in data and data['token']:
-                    token = data['token']
-                    if token.startswith('QSDK '):
-                        token = token[5:]
-                    auth_status['success'] = True
-                else:
-                    auth_status['error'] = 'No token received'
-                    if 'errList' in data:
-                        auth_status['error'] = data['errList'][0].get('errLogMessage', 'Unknown error')
-            else:
-                auth_status['error'] = f'HTTP {response.status_code}'
-        except Exception as e:
-            auth_status['error'] = str(e)[:100]
-
-        # Define endpoints to test
-        endpoint_list = [
-            '/Client',
-            '/StoragePolicy',
-            '/MediaAgent',
-            '/StoragePool',
-            '/Job',
-            '/Subclient',
-            '/Agent',
-            '/BackupSet',
-            '/Instance',
-            '/Schedule',
-            '/Library',
-            '/CommCell',
-            '/AlertRule',
-            '/V2/Client',
-            '/V2/StoragePolicy',
-            '/V2/MediaAgent',
-            '/V2/StoragePool',
-            '/V4/ServerInfo',
-            '/DDB',
-            '/Retention',
-        ]
-
-        # Test each endpoint
-        endpoints = []
-        for endpoint_path in endpoint_list:
-            endpoint_info = {
-                'path': endpoint_path,
-                'status': None,
-                'message': '',
-                'has_data': False,
-                'count': 0,
-                'sample_data': None
-            }
+        # Latency percentiles per endpoint over the chosen window, and p95 per day for the last week
+        metrics_hours = request.args.get('hours', 24, type=int)
+        now_epoch = int(time.time())
+        endpoint_latency = endpoint_latency_summary(db, since_epoch=now_epoch - metrics_hours * 3600)
+        latency_trend = {}
+        for row in endpoint_latency_summary(db, since_epoch=now_epoch - 7 * 86400, bucket_seconds=86400):
+            latency_trend.setdefault(row['endpoint'], {})[row['bucket'][:10]] = row['p95']
+        trend_days = sorted({day for days in latency_trend.values() for day in days})
 
-            if not token:
-                endpoint_info['status'] = 'N/A'
-                endpoint_info['message'] = 'No authentication token'
-                endpoints.append(endpoint_info)
-                continue
+        # Never block the page on the CommServe: stale or missing results are re-probed in the background
+        if not last_run or time.time() - last_run['startEpoch'] > probe_ttl:
+            start_background_probe(DB_PATH, deadline=config.getint('api', 'probe_deadline',
+                                                                   fallback=DEFAULT_PROBE_DEADLINE))
 
-            try:
-                headers = {'Authtoken': f'QSDK {token}', 'Accept': 'application/json'}
-                r = requests.get(
-                    f'{base_url}{endpoint_path}',
-                    headers=headers,
-                    timeout=10,
-                    verify=verify_ssl
-                )
-
-                endpoint_info['status'] = r.status_code
-
-                if r.status_code == 200:
-                    try:
-                        data = r.json()
-
-                        # Check if data is available
-                        if isinstance(data, list):
-                            endpoint_info['has_data'] = len(data) > 0
-                            endpoint_info['count'] = len(data)
-                            endpoint_info['message'] = f'List with {len(data)} items'
-                            if len(data) > 0:
-                                endpoint_info['sample_data'] = json.dumps(data[0], indent=2)[:500]
-                        elif isinstance(data, dict):
-                            # Check common data keys
-                            data_keys = ['clients', 'policies', 'mediaAgents', 'jobs', 'storagePools']
-                            for key in data_keys:
-                                if key in data:
-                                    count = len(data[key]) if isinstance(data[key], list) else 1
-                                    endpoint_info['has_data'] = count > 0
-                                    endpoint_info['count'] = count
-                                    endpoint_info['message'] = f'Dict with {count} {key}'
-                                    if count > 0:
-                                        sample = data[key][0] if isinstance(data[key], list) else data[key]
-                                        endpoint_info['sample_data'] = json.dumps(sample, indent=2)[:500]
-                                    break
-
-                            if not endpoint_info['has_data']:
-                                endpoint_info['message'] = f'Dict with keys: {", ".join(list(data.keys())[:5])}'
-                                endpoint_info['sample_data'] = json.dumps(data, indent=2)[:500]
-                        else:
-                            endpoint_info['message'] = f'Response type: {type(data).__name__}'
-                    except:
-                        endpoint_info['message'] = f'Non-JSON response ({len(r.text)} bytes)'
-                elif r.status_code == 401:
-                    endpoint_info['message'] = 'Unauthorized - Check permissions'
-                elif r.status_code == 404:
-                    endpoint_info['message'] = 'Endpoint not found'
-                else:
-                    endpoint_info['message'] = r.text[:100]
-
-            except requests.exceptions.Timeout:
-                endpoint_info['status'] = 'Timeout'
-                endpoint_info['message'] = 'Request timed out (10s)'
-            except Exception as e:
-                endpoint_info['status'] = 'Error'
-                endpoint_info['message'] = str(e)[:100]
-
-            endpoints.append(endpoint_info)
+        auth_status = {
+            'success': bool(last_run and last_run['authSuccess']),
+            'error': last_run['authError'] if last_run else 'Not probed yet',
+            'timestamp': last_run['startTime'][:19].replace('T', ' ') if last_run else ''
+        }
 
         # Calculate summary statistics
         success_count = sum(1 for e in endpoints if e['status'] == 200)
@@ -2862,16 +2363,41 @@ def api_config():
             auth_status=auth_status,
             endpoints=endpoints,
             summary=summary,
-            test_timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            probe_run=last_run,
+            probe_running=probe_running(),
+            host_limits=all_host_limits(),
+            metrics_hours=metrics_hours,
+            endpoint_latency=endpoint_latency,
+            latency_trend=latency_trend,
+            trend_days=trend_days,
+            recent_runs=run_summary(db, limit=10),
+            test_timestamp=auth_status['timestamp'] or 'Never'
         )
 
     except Exception as e:
         return f"Error loading API configuration: {str(e)}", 500
 
 
+@app.route("/api/config/probe", methods=["POST"])
+def api_config_probe():
+    """Start a background re-probe of all endpoints"""
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+
+    # No-op if a probe is already running; the page shows its progress either way
+    start_background_probe(DB_PATH, deadline=config.getint('api', 'probe_deadline', fallback=DEFAULT_PROBE_DEADLINE))
+    return redirect(url_for('api_config'))
+
+
 if __name__ == "__main__":
     # Initialize database on first run
     init_db()
 
+    # Background refreshes ([scheduler] enabled = true); only in the reloader's child process
+    schedule = load_schedule()
+    if schedule['enabled'] and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        IngestScheduler(FETCH_TASKS, DB_PATH, intervals=schedule['intervals'],
+                        max_parallel=schedule['max_parallel'], archive=PAYLOAD_ARCHIVE).start()
+
     # Run Flask development server
     app.run(debug=True, host='0.0.0.0', port=5000)
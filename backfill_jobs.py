@@ -0,0 +1,178 @@
+"""
+Historical Job Backfill
+Seeds jobs / jobs_enhanced history by fetching a date range in parallel time windows, resuming from checkpoints
+
+Usage:
+    python backfill_jobs.py --days 90
+    python backfill_jobs.py --days 180 --window-hours 12 --workers 4
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from api_metrics import new_run_id
+from commvault_client import connect_from_config
+from db_connections import get_connection_manager
+from fetch_engine import PagedFetchTask, run_fetch_tasks
+
+DEFAULT_DAYS = 90
+DEFAULT_WINDOW_HOURS = 24
+DEFAULT_WORKERS = 4
+
+
+def plan_windows(days, window_hours, now=None):
+    """
+    Split the last `days` into windows of `window_hours`
+
+    Window edges are aligned to multiples of the window size, so re-running the same
+    backfill later produces the same windows and picks up its checkpoints. The newest
+    window ends after now; run_backfill leaves it open so the next run fetches it again.
+
+    Returns:
+        List of (start_epoch, end_epoch), newest first
+    """
+    now = int(now if now is not None else time.time())
+    size = int(window_hours * 3600)
+    end = (now // size + 1) * size
+    start = end - int(days * 86400)
+    return [(edge - size, edge) for edge in range(end, start, -size)]
+
+
+def completed_windows(db):
+    """Windows already checkpointed as complete"""
+    return {(row[0], row[1]) for row in
+            db.execute("SELECT windowStart, windowEnd FROM backfill_windows WHERE status = 'complete'")}
+
+
+def checkpoint(db, window, status, record_count=None, error=None):
+    """Record the outcome of one window"""
+    db.execute("""
+        INSERT INTO backfill_windows (windowStart, windowEnd, status, recordCount, attempts, lastAttemptTime, errorMessage)
+        VALUES (?, ?, ?, ?, 1, ?, ?)
+        ON CONFLICT(windowStart, windowEnd) DO UPDATE SET
+            status = excluded.status,
+            recordCount = excluded.recordCount,
+            attempts = backfill_windows.attempts + 1,
+            lastAttemptTime = excluded.lastAttemptTime,
+            errorMessage = excluded.errorMessage
+    """, (window[0], window[1], status, record_count, datetime.now().isoformat(), error))
+    db.commit()
+
+
+def window_task(window, saver, page_size):
+    """Paged /Job task for one time window"""
+    start, end = window
+
+    def save_window(db, payload):
+        # CommServes that ignore fromTime/toTime return everything; keep only this window's jobs
+        payload['jobs'] = [
+            job for job in payload.get('jobs', [])
+            if not job.get('jobSummary', {}).get('jobStartTime')
+            or start <= int(job['jobSummary']['jobStartTime']) < end
+        ]
+        return saver(db, payload)
+
+    task = PagedFetchTask(f"backfill {start}-{end}", f"/Job?fromTime={start}&toTime={end}",
+                          save_window, "jobs", page_size=page_size)
+    task.track_sync = False
+    return task
+
+
+def run_backfill(client, connections, saver, days=DEFAULT_DAYS, window_hours=DEFAULT_WINDOW_HOURS,
+                 workers=DEFAULT_WORKERS, page_size=1000, archive=None):
+    """
+    Fetch every window not yet checkpointed, `workers` windows at a time
+
+    Windows are handed to the fetch engine in batches of `workers`, and each batch is
+    checkpointed as soon as it finishes, so an interrupted run loses at most one batch.
+    A window with a failed page is checkpointed 'failed', and the window still open when
+    the run started is checkpointed 'open'; both are fetched again by the next run.
+    Writes go through the ConnectionManager's single writer, taken per save.
+
+    Returns:
+        Tuple of (windows completed, windows failed, records fetched)
+    """
+    started = int(time.time())
+    with connections.reader() as db:
+        done = completed_windows(db)
+    windows = plan_windows(days, window_hours, started)
+    pending = [window for window in windows if window not in done]
+
+    print(f"Windows: {len(windows)} total, {len(done)} already complete, {len(pending)} to fetch")
+
+    completed = failed = records = 0
+    # All windows of this run share one id in api_call_metrics
+    run_id = new_run_id('backfill')
+    for batch_start in range(0, len(pending), workers):
+        batch = pending[batch_start:batch_start + workers]
+        tasks = [window_task(window, saver, page_size) for window in batch]
+
+        _, counts, errors = run_fetch_tasks(client, tasks, connections, max_workers=workers, archive=archive,
+                                         run_id=run_id)
+
+        for task, window in zip(tasks, batch):
+            name = task.name
+            label = f"{datetime.fromtimestamp(window[0]):%Y-%m-%d %H:%M} - {datetime.fromtimestamp(window[1]):%Y-%m-%d %H:%M}"
+            with connections.writer() as db:
+                if name in errors:
+                    failed += 1
+                    checkpoint(db, window, 'failed', error=errors[name])
+                    print(f"  ✗ {label}: {errors[name]}")
+                elif window[1] > started:
+                    # Jobs can still start in this window: saved, but not marked complete
+                    completed += 1
+                    records += counts.get(name, 0)
+                    checkpoint(db, window, 'open', record_count=counts.get(name, 0))
+                    print(f"  ~ {label}: {counts.get(name, 0)} jobs so far (still open, fetched again next run)")
+                else:
+                    completed += 1
+                    records += counts.get(name, 0)
+                    checkpoint(db, window, 'complete', record_count=counts.get(name, 0))
+                    print(f"  ✓ {label}: {counts.get(name, 0)} jobs")
+
+    return completed, failed, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill historical Commvault jobs into jobs / jobs_enhanced")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='How many days back to backfill')
+    parser.add_argument('--window-hours', type=float, default=DEFAULT_WINDOW_HOURS, help='Size of each time window')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Windows fetched at the same time')
+    args = parser.parse_args()
+
+    # Reuse the web app's savers (batched upserts into jobs and jobs_enhanced)
+    from app import DB_PATH, JOB_PAGE_SIZE, PAYLOAD_ARCHIVE, init_db, save_jobs_and_enhanced_to_db
+
+    print("=" * 100)
+    print("HISTORICAL JOB BACKFILL")
+    print("=" * 100)
+    print(f"Range: last {args.days} days in {args.window_hours:g}h windows, {args.workers} at a time")
+    print()
+
+    client = connect_from_config()
+    if client is None:
+        raise SystemExit("Authentication failed - check [commvault] settings in config.ini")
+
+    init_db()
+    connections = get_connection_manager(DB_PATH)
+    start_time = time.time()
+    try:
+        completed, failed, records = run_backfill(client, connections, save_jobs_and_enhanced_to_db, days=args.days,
+                                                  window_hours=args.window_hours, workers=args.workers,
+                                                  page_size=JOB_PAGE_SIZE, archive=PAYLOAD_ARCHIVE)
+    except KeyboardInterrupt:
+        print("\nInterrupted - completed windows are checkpointed; re-run the same command to resume")
+        return
+    finally:
+        connections.close()
+
+    print()
+    print(f"Backfill finished in {time.time() - start_time:.1f}s: {completed} windows complete, "
+          f"{failed} failed, {records} jobs fetched")
+    if failed:
+        print("Re-run the same command to retry the failed windows")
+
+
+if __name__ == "__main__":
+    main()
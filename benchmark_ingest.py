@@ -0,0 +1,368 @@
+"""
+Ingest Benchmarks
+Measures rows/sec, peak RSS and wall time of the savers and the full fetch→parse→save path, with stored baselines
+
+Usage:
+    python benchmark_ingest.py run --sizes small medium --output Benchmarks/baseline.json
+    python benchmark_ingest.py run --archive Archive --output Benchmarks/recorded.json
+    python benchmark_ingest.py compare Benchmarks/baseline.json Benchmarks/current.json --threshold 0.15
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from db_connections import connect
+from mock_commserve import MockEstate, start_mock_server
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BENCHMARK_DIR = 'Benchmarks'
+
+# Synthetic estate sizes
+ESTATE_SIZES = {
+    'small': {'clients': 1000, 'jobs': 10000, 'plans': 50, 'storage_policies': 50, 'storage_pools': 20,
+              'libraries': 20, 'mediaagents': 10, 'events': 1000, 'alerts': 20},
+    'medium': {'clients': 10000, 'jobs': 100000, 'plans': 200, 'storage_policies': 200, 'storage_pools': 80,
+               'libraries': 100, 'mediaagents': 250, 'events': 10000, 'alerts': 100},
+    'large': {'clients': 50000, 'jobs': 500000, 'plans': 500, 'storage_policies': 500, 'storage_pools': 200,
+              'libraries': 300, 'mediaagents': 500, 'events': 50000, 'alerts': 200},
+}
+DEFAULT_SIZES = ['small', 'medium']
+
+# FETCH_TASKS entries benchmarked in isolation, and the synthetic payload each one saves
+SAVER_TASKS = ['clients', 'jobs', 'jobs_enhanced', 'plans', 'storage', 'mediaagents', 'libraries',
+               'storage_pools', 'events', 'alerts', 'commcell_info']
+
+# Tasks pulled by the full fetch benchmark
+FETCH_BENCHMARK_TASKS = ['clients', 'jobs_enhanced', 'plans', 'storage', 'mediaagents', 'libraries',
+                         'storage_pools', 'events', 'alerts', 'commcell_info']
+
+# A case is flagged when it gets this much slower (or uses this much more memory) than the baseline
+DEFAULT_THRESHOLD = 0.15
+
+# Timings this short are mostly noise, so cases under it in both runs are not compared on speed
+MIN_COMPARE_SECONDS = 0.02
+
+DEFAULT_REPEAT = 3
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it cannot be read"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+    except ImportError:
+        pass
+
+    if os.name == 'nt':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return round(counters.PeakWorkingSetSize / (1024 * 1024), 1)
+    return None
+
+
+def synthetic_payloads(task_name, estate, page_size):
+    """Payloads a task's saver receives for the estate (jobs come in pages, like the fetch engine sends them)"""
+    if task_name in ('jobs', 'jobs_enhanced'):
+        for offset in range(0, estate.sizes['jobs'], page_size):
+            yield estate.jobs_page({'limit': page_size, 'offset': offset})
+        return
+
+    builders = {
+        'clients': estate.clients,
+        'plans': estate.plans,
+        'storage': estate.storage_policies,
+        'mediaagents': estate.mediaagents,
+        'libraries': estate.libraries,
+        'storage_pools': estate.storage_pools,
+        'events': lambda: estate.events({}),
+        'alerts': estate.alerts,
+        'commcell_info': estate.commcell,
+    }
+    yield builders[task_name]()
+
+
+def recorded_payloads(task_name, archive_dir):
+    """Archived payloads for a task, in fetch order"""
+    from payload_archive import PayloadArchive
+
+    archive = PayloadArchive(archive_dir)
+    for entry in archive.entries([task_name]):
+        yield archive.load(entry['hash'])
+
+
+def _fresh_db(app, directory, name):
+    app.DB_PATH = os.path.join(directory, f"{name}.db")
+    if os.path.exists(app.DB_PATH):
+        os.remove(app.DB_PATH)
+    app.init_db()
+    return connect(app.DB_PATH)
+
+
+def _save_all(saver, db, payloads):
+    """Run the saver over every payload; returns (rows, seconds spent inside the saver)"""
+    rows = 0
+    elapsed = 0.0
+    for payload in payloads:
+        start_time = time.perf_counter()
+        rows += saver(db, payload) or 0
+        db.commit()
+        elapsed += time.perf_counter() - start_time
+    return rows, elapsed
+
+
+def run_saver_case(case):
+    """One saver benchmark: best of `repeat` runs on a fresh database (pre-filled for update runs)"""
+    import app
+
+    task = app.FETCH_TASKS[case['task']]
+    workdir = tempfile.mkdtemp(prefix='cv_bench_')
+
+    def payloads():
+        if case.get('archive'):
+            return recorded_payloads(case['task'], case['archive'])
+        estate = MockEstate(case['sizes'], template_dir=REPO_DIR)
+        return synthetic_payloads(case['task'], estate, app.JOB_PAGE_SIZE)
+
+    best = None
+    rows = 0
+    for attempt in range(case['repeat']):
+        db = _fresh_db(app, workdir, f"{case['task']}_{attempt}")
+        try:
+            if case['mode'] == 'update':
+                # Same records already stored: measures the upsert (and skip) path
+                _save_all(task.saver, db, payloads())
+            rows, elapsed = _save_all(task.saver, db, payloads())
+        finally:
+            db.close()
+        best = elapsed if best is None else min(best, elapsed)
+
+    return {'rows': rows, 'wall_s': round(best, 4)}
+
+
+def run_fetch_case(case):
+    """Full /fetch path against the mock CommServe: HTTP, JSON parsing and saves"""
+    import app
+    from commvault_client import CommvaultClient, request_coalescer
+    from fetch_engine import run_fetch_tasks
+    from host_limiter import get_host_limiter
+
+    # Measure the ingester, not the politeness settings meant for a production CommServe
+    request_coalescer.window = 0
+    get_host_limiter(case['url'], rate_per_second=0, min_concurrency=16, max_concurrency=16)
+
+    workdir = tempfile.mkdtemp(prefix='cv_bench_')
+    tasks = [app.FETCH_TASKS[name] for name in FETCH_BENCHMARK_TASKS]
+    config = app.load_config()
+
+    best = None
+    rows = 0
+    errors = {}
+    for attempt in range(case['repeat']):
+        db = _fresh_db(app, workdir, f"fetch_{attempt}")
+        try:
+            client = CommvaultClient(case['url'])
+            client.authenticate('benchmark', 'benchmark')
+            start_time = time.perf_counter()
+            _, counts, errors = run_fetch_tasks(client, tasks, db, max_workers=config['max_workers'])
+            elapsed = time.perf_counter() - start_time
+        finally:
+            db.close()
+        rows = sum(counts.values())
+        best = elapsed if best is None else min(best, elapsed)
+
+    result = {'rows': rows, 'wall_s': round(best, 4)}
+    if errors:
+        result['errors'] = errors
+    return result
+
+
+def _case_worker(case, results):
+    try:
+        result = run_fetch_case(case) if case['kind'] == 'fetch' else run_saver_case(case)
+    except Exception as e:
+        result = {'error': f"{type(e).__name__}: {str(e)}"}
+    result['peak_rss_mb'] = peak_rss_mb()
+    results.put(result)
+
+
+def run_case(case):
+    """Run a case in a fresh interpreter so its peak RSS is its own"""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_case_worker, args=(case, results))
+    process.start()
+    result = results.get()
+    process.join()
+
+    if result.get('wall_s') and result.get('rows'):
+        result['rows_per_s'] = round(result['rows'] / result['wall_s'], 1)
+    return result
+
+
+def plan_cases(sizes, archive=None, savers=True, fetch=True, repeat=DEFAULT_REPEAT):
+    """Benchmark cases as {case name: case}"""
+    cases = {}
+    labels = ['recorded'] if archive else sizes
+    for label in labels:
+        estate_sizes = ESTATE_SIZES.get(label, {})
+        if savers:
+            for task_name in SAVER_TASKS:
+                for mode in ('insert', 'update'):
+                    cases[f"save/{task_name}/{mode}/{label}"] = {
+                        'kind': 'saver', 'task': task_name, 'mode': mode, 'sizes': estate_sizes,
+                        'archive': archive, 'repeat': repeat
+                    }
+        if fetch and not archive:
+            cases[f"fetch/all/{label}"] = {'kind': 'fetch', 'size': label, 'sizes': estate_sizes, 'repeat': repeat}
+    return cases
+
+
+def run_benchmarks(cases):
+    """Run every case, printing as it goes; returns {case name: result}"""
+    results = {}
+    servers = {}
+    try:
+        for name, case in cases.items():
+            if case['kind'] == 'fetch':
+                # The mock runs in this process, so its memory does not count against the case
+                server, url = start_mock_server(MockEstate(case['sizes'], template_dir=REPO_DIR))
+                servers[name] = server
+                case = dict(case, url=url)
+
+            result = run_case(case)
+            results[name] = result
+            if 'error' in result:
+                print(f"  ✗ {name:<45} {result['error']}")
+            else:
+                print(f"  ✓ {name:<45} {result['rows']:>9} rows {result['wall_s']:>9.3f}s "
+                      f"{result.get('rows_per_s', 0):>11.0f} rows/s  peak {result['peak_rss_mb']} MB")
+                for task_name, error in result.get('errors', {}).items():
+                    print(f"      {task_name}: {error}")
+
+            if name in servers:
+                servers.pop(name).shutdown()
+    finally:
+        for server in servers.values():
+            server.shutdown()
+    return results
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two benchmark result files
+
+    Returns:
+        List of (case name, metric, baseline value, current value, change) for regressions
+    """
+    regressions = []
+    for name, base in baseline['results'].items():
+        result = current['results'].get(name)
+        if not result or 'error' in base or 'error' in result:
+            continue
+        for metric, higher_is_worse in (('wall_s', True), ('rows_per_s', False), ('peak_rss_mb', True)):
+            before, after = base.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            if metric != 'peak_rss_mb' and max(base['wall_s'], result['wall_s']) < MIN_COMPARE_SECONDS:
+                continue
+            change = (after - before) / before
+            if (change > threshold) if higher_is_worse else (change < -threshold):
+                regressions.append((name, metric, before, after, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Commvault ingest and compare against baselines")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks')
+    run_parser.add_argument('--sizes', nargs='*', default=DEFAULT_SIZES, choices=list(ESTATE_SIZES))
+    run_parser.add_argument('--archive', help='Benchmark savers on recorded payloads from this archive instead')
+    run_parser.add_argument('--savers-only', action='store_true', help='Skip the full fetch benchmark')
+    run_parser.add_argument('--fetch-only', action='store_true', help='Skip the per-saver benchmarks')
+    run_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Runs per case (best is kept)')
+    run_parser.add_argument('--output', help='Results file (default: Benchmarks/<timestamp>.json)')
+    run_parser.add_argument('--baseline', help='Baseline to compare with after the run')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    compare_parser = subparsers.add_parser('compare', help='Compare a results file with a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        cases = plan_cases(args.sizes, archive=args.archive, savers=not args.fetch_only,
+                           fetch=not args.savers_only, repeat=args.repeat)
+
+        print("=" * 100)
+        print("INGEST BENCHMARKS")
+        print("=" * 100)
+        print(f"{len(cases)} cases, best of {args.repeat} runs each")
+        print()
+
+        current = {
+            'created': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'sizes': {label: ESTATE_SIZES[label] for label in args.sizes} if not args.archive else 'recorded',
+            'results': run_benchmarks(cases)
+        }
+
+        output = args.output or os.path.join(BENCHMARK_DIR, f"{datetime.now():%Y%m%d_%H%M%S}.json")
+        if os.path.dirname(output):
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+        print()
+        print(f"Results saved to {output}")
+
+        if not args.baseline:
+            return
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+
+    regressions = compare(baseline, current, args.threshold)
+    print()
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} against the baseline")
+        return
+
+    print(f"REGRESSIONS beyond {args.threshold:.0%}:")
+    for name, metric, before, after, change in regressions:
+        print(f"  {name:<45} {metric:<12} {before:>12} -> {after:<12} ({change:+.0%})")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
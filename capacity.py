@@ -0,0 +1,42 @@
+"""
+Capacity Columns
+Integer capacity values and ingest-time percent free/used for storage_pools and mediaagents
+"""
+
+# Health bands by percent free (upper bound exclusive); anything above the last is 'ok'
+CAPACITY_BANDS = [(10, 'critical'), (20, 'warning'), (30, 'low')]
+
+CAPACITY_BAND_SQL = (
+    "CASE WHEN pctFree IS NULL THEN 'no_data' "
+    + " ".join(f"WHEN pctFree < {limit} THEN '{band}'" for limit, band in CAPACITY_BANDS)
+    + " ELSE 'ok' END"
+)
+
+
+def capacity_value(value):
+    """
+    Integer size from an API value
+
+    Returns:
+        int, or None for missing, non-numeric and negative values
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        size = int(float(value))
+    except (TypeError, ValueError):
+        return None
+    return size if size >= 0 else None
+
+
+def capacity_percentages(total, free):
+    """
+    Percent free and used for a total and free size (already passed through capacity_value)
+
+    Returns:
+        Tuple of (pctFree, pctUsed), both None unless total > 0 and free is known
+    """
+    if not total or free is None:
+        return None, None
+    pct_free = round(free * 100.0 / total, 4)
+    return pct_free, round(100.0 - pct_free, 4)
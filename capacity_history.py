@@ -0,0 +1,150 @@
+"""
+Capacity History
+Storage pool, library and MediaAgent capacity samples per refresh, with hourly and daily min/avg/max rollups
+"""
+
+import time
+from datetime import datetime, timezone
+
+# Compact integer codes for the entity types sampled, and where each one's current capacity lives.
+# Sizes keep the unit of their source table (pools and MediaAgents as the CommServe reports them,
+# libraries in bytes); entities without a known total are not sampled.
+ENTITY_KINDS = {
+    'storage_pool': 1,
+    'library': 2,
+    'mediaagent': 3,
+}
+
+SNAPSHOT_SOURCES = {
+    'storage_pool': "SELECT storagePoolId, totalCapacity, freeSpace FROM storage_pools "
+                    "WHERE totalCapacity > 0 AND freeSpace IS NOT NULL",
+    'library': "SELECT libraryId, capacity, freeSpace FROM storage_libraries "
+               "WHERE capacity > 0 AND freeSpace IS NOT NULL",
+    'mediaagent': "SELECT mediaAgentId, totalSpace, availableSpace FROM mediaagents "
+                  "WHERE totalSpace > 0 AND availableSpace IS NOT NULL",
+}
+
+# Bucket widths in seconds (days are UTC days)
+HOUR = 3600
+DAY = 86400
+
+# Days kept per resolution (0 = raw samples). Each rollup is rebuilt from the resolution below
+# it, so every resolution keeps at least one bucket of the next one up.
+RETENTION_DAYS = {
+    0: 7,
+    HOUR: 90,
+    DAY: 1095,
+}
+
+def roll_up(db, since_epoch):
+    """
+    Rebuild the hourly rollups from raw samples, then the daily ones from the hourly,
+    for every bucket from the one containing since_epoch onwards
+    """
+    hour_start = since_epoch - since_epoch % HOUR
+    db.execute(f"""
+        INSERT OR REPLACE INTO capacity_rollups
+            (resolution, bucketEpoch, entityKind, entityId, samples, totalSize,
+             minFree, avgFree, maxFree, minUsed, avgUsed, maxUsed)
+        SELECT {HOUR}, epoch - epoch % {HOUR}, entityKind, entityId, COUNT(*), MAX(totalSize),
+               MIN(freeSize), AVG(freeSize), MAX(freeSize),
+               MIN(totalSize - freeSize), AVG(totalSize - freeSize), MAX(totalSize - freeSize)
+        FROM capacity_samples
+        WHERE epoch >= ?
+        GROUP BY epoch - epoch % {HOUR}, entityKind, entityId
+    """, (hour_start,))
+
+    # Daily averages weight each hour by its sample count
+    day_start = since_epoch - since_epoch % DAY
+    db.execute(f"""
+        INSERT OR REPLACE INTO capacity_rollups
+            (resolution, bucketEpoch, entityKind, entityId, samples, totalSize,
+             minFree, avgFree, maxFree, minUsed, avgUsed, maxUsed)
+        SELECT {DAY}, bucketEpoch - bucketEpoch % {DAY}, entityKind, entityId, SUM(samples), MAX(totalSize),
+               MIN(minFree), SUM(avgFree * samples) / SUM(samples), MAX(maxFree),
+               MIN(minUsed), SUM(avgUsed * samples) / SUM(samples), MAX(maxUsed)
+        FROM capacity_rollups
+        WHERE resolution = {HOUR} AND bucketEpoch >= ?
+        GROUP BY bucketEpoch - bucketEpoch % {DAY}, entityKind, entityId
+    """, (day_start,))
+
+
+def prune_capacity_history(db, now_epoch=None):
+    """Apply RETENTION_DAYS; returns the number of rows removed"""
+    now_epoch = now_epoch or int(time.time())
+    removed = db.execute("DELETE FROM capacity_samples WHERE epoch < ?",
+                         (now_epoch - RETENTION_DAYS[0] * DAY,)).rowcount
+    for resolution in (HOUR, DAY):
+        removed += db.execute("DELETE FROM capacity_rollups WHERE resolution = ? AND bucketEpoch < ?",
+                              (resolution, now_epoch - RETENTION_DAYS[resolution] * DAY)).rowcount
+    return removed
+
+
+def record_capacity_snapshot(db, kinds, epoch=None):
+    """
+    Append the current capacity of every entity of the given kinds, then update rollups and retention
+
+    Samples are read from the tables the refresh just wrote, so a refresh whose response was
+    unchanged (and skipped by the savers) still records a sample.
+
+    Args:
+        db: Writable database connection (the caller commits)
+        kinds: Keys of ENTITY_KINDS
+        epoch: Sample time (default: now)
+
+    Returns:
+        Number of samples recorded
+    """
+    epoch = int(epoch or time.time())
+    recorded = 0
+    for kind in kinds:
+        recorded += db.execute(
+            f"INSERT OR REPLACE INTO capacity_samples (epoch, entityKind, entityId, totalSize, freeSize) "
+            f"SELECT ?, ?, * FROM ({SNAPSHOT_SOURCES[kind]})",
+            (epoch, ENTITY_KINDS[kind])
+        ).rowcount
+
+    roll_up(db, epoch)
+    prune_capacity_history(db, epoch)
+    return recorded
+
+
+def snapshot_task(*kinds):
+    """FetchTask snapshot hook that samples the given kinds after each refresh"""
+    def snapshot(db, epoch):
+        record_capacity_snapshot(db, kinds, epoch)
+    return snapshot
+
+
+def capacity_series(db, kind, since_epoch, resolution=DAY, entity_id=None):
+    """
+    Rollup buckets for one entity, or totals across every entity of a kind
+
+    Returns:
+        List of dictionaries (bucket, date, entities, totalSize, avgUsed, avgFree, plus
+        min/max used and free for a single entity) in time order
+    """
+    if entity_id is not None:
+        cursor = db.execute("""
+            SELECT bucketEpoch, 1, totalSize, avgUsed, avgFree, minUsed, maxUsed, minFree, maxFree
+            FROM capacity_rollups
+            WHERE resolution = ? AND bucketEpoch >= ? AND entityKind = ? AND entityId = ?
+            ORDER BY bucketEpoch
+        """, (resolution, since_epoch, ENTITY_KINDS[kind], entity_id))
+    else:
+        cursor = db.execute("""
+            SELECT bucketEpoch, COUNT(*), SUM(totalSize), SUM(avgUsed), SUM(avgFree)
+            FROM capacity_rollups
+            WHERE resolution = ? AND bucketEpoch >= ? AND entityKind = ?
+            GROUP BY bucketEpoch
+            ORDER BY bucketEpoch
+        """, (resolution, since_epoch, ENTITY_KINDS[kind]))
+
+    columns = ['bucket', 'entities', 'totalSize', 'avgUsed', 'avgFree', 'minUsed', 'maxUsed', 'minFree', 'maxFree']
+    series = []
+    for row in cursor.fetchall():
+        point = dict(zip(columns, row))
+        moment = datetime.fromtimestamp(point['bucket'], timezone.utc)
+        point['date'] = moment.strftime('%Y-%m-%d %H:%M' if resolution < DAY else '%Y-%m-%d')
+        series.append(point)
+    return series
@@ -2,31 +2,18 @@
 REST API Endpoint Discovery Script
 Tests common Commvault REST API endpoints to discover available resources
 """
-import requests
-import configparser
-import base64
-import urllib3
 import json
 
-# Disable SSL warnings
-urllib3.disable_warnings()
+from commvault_client import CommvaultClient, load_api_settings
 
 def check_endpoints():
     """Check available REST API endpoints"""
 
     # Load config
-    config = configparser.ConfigParser()
-    config.read('config.ini')
-    base_url = config.get('commvault', 'webservice_url')
-    username = config.get('commvault', 'username')
-    password = config.get('commvault', 'password')
-
-    # Encode password
-    try:
-        decoded = base64.b64decode(password).decode('utf-8')
-        encoded_password = password
-    except:
-        encoded_password = base64.b64encode(password.encode('utf-8')).decode('utf-8')
+    settings = load_api_settings()
+    base_url = settings['base_url']
+    username = settings['username']
+    password = settings['password']
 
     # Authenticate
     print('=' * 80)
@@ -36,31 +23,19 @@ def check_endpoints():
     print(f'Username: {username}')
     print()
 
-    response = requests.post(
-        f'{base_url}/Login',
-        json={'username': username, 'password': encoded_password},
-        headers={'Accept': 'application/json', 'Content-Type': 'application/json'},
-        timeout=30,
-        verify=False
-    )
+    # Password is Base64-encoded by the client; all probes share its pooled session
+    client = CommvaultClient.from_config()
+    token, response = client.login(username, password)
 
-    if response.status_code != 200:
+    if not token:
         print(f'Authentication failed: {response.status_code}')
         print(response.text[:500])
         return
 
-    token = response.json().get('token', '')
-    if token.startswith('QSDK '):
-        token = token[5:]
     print(f'Authentication successful!')
     print(f'Token: {token[:30]}...')
     print()
 
-    headers = {
-        'Authtoken': token,
-        'Accept': 'application/json'
-    }
-
     # Test common endpoints
     endpoints = [
         '/Job',
@@ -95,7 +70,7 @@ def check_endpoints():
 
     for endpoint in endpoints:
         try:
-            r = requests.get(f'{base_url}{endpoint}', headers=headers, timeout=10, verify=False)
+            r = client.get(endpoint, timeout=10)
 
             if r.status_code == 200:
                 status = 'SUCCESS'
@@ -4,31 +4,19 @@ Alternative to pulling log files - uses API endpoints for Events and Jobs
 """
 
 import requests
-import base64
 import json
-import configparser
 import sqlite3
 from datetime import datetime, timedelta
 
-# Load configuration
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-BASE_URL = config.get('commvault', 'base_url')
-USERNAME = config.get('commvault', 'username')
-PASSWORD = config.get('commvault', 'password')
+from commvault_client import connect_from_config, load_api_settings
 
-# Create authorization header
-auth_string = f"{USERNAME}:{PASSWORD}"
-auth_bytes = auth_string.encode('ascii')
-base64_bytes = base64.b64encode(auth_bytes)
-base64_auth = base64_bytes.decode('ascii')
+# Load configuration
+BASE_URL = load_api_settings()['base_url']
 
-headers = {
-    'Authorization': f'Basic {base64_auth}',
-    'Accept': 'application/json',
-    'Content-Type': 'application/json'
-}
+# Log in once; every request below reuses the client's pooled session and token
+client = connect_from_config()
+if client is None:
+    raise SystemExit("Authentication failed - check [commvault] settings in config.ini")
 
 print("=" * 100)
 print("PRUNING ACTIVITY CHECK - VIA REST API")
@@ -105,7 +93,7 @@ try:
     print(f"Date Range: {start_time.strftime('%Y-%m-%d')} to {end_time.strftime('%Y-%m-%d')}")
     print()
 
-    response = requests.get(jobs_url, headers=headers, params=params, verify=False, timeout=30)
+    response = client.get('/Job', params=params)
 
     print(f"Response Status: {response.status_code}")
 
@@ -193,7 +181,7 @@ try:
     print(f"URL: {events_url}")
     print()
 
-    response = requests.get(events_url, headers=headers, params=params, verify=False, timeout=30)
+    response = client.get('/Events', params=params)
 
     print(f"Response Status: {response.status_code}")
 
@@ -0,0 +1,441 @@
+"""
+Commvault API Client
+Shared keep-alive HTTP session, default headers and per-endpoint timeouts for all Commvault API callers
+"""
+
+import base64
+import configparser
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from api_metrics import call_recorder, metric_row
+from fan_out import DEFAULT_FAN_OUT_WORKERS
+from host_limiter import (get_host_limiter, DEFAULT_BURST, DEFAULT_MAX_CONCURRENCY, DEFAULT_MIN_CONCURRENCY,
+                          DEFAULT_REQUESTS_PER_SECOND)
+
+CONFIG_FILE = 'config.ini'
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_POOL_SIZE = 20
+
+# Login tokens are reused for this many seconds before logging in again
+DEFAULT_TOKEN_TTL = 1800
+
+# Seconds a successful GET is shared with identical requests made right after it
+DEFAULT_COALESCE_WINDOW = 5
+
+# Heavy endpoints that regularly need longer than the default timeout
+DEFAULT_ENDPOINT_TIMEOUTS = {
+    '/job': 60,
+}
+
+# One pooled session per (base_url, verify) so every caller reuses the same connections
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def load_api_settings(config_file=CONFIG_FILE):
+    """
+    Load Commvault API connection settings from config.ini
+
+    Accepts either `webservice_url` or `base_url` in the [commvault] section.
+    Per-endpoint timeouts are read from an optional [timeouts] section, e.g. `/Job = 60`.
+    """
+    config = configparser.ConfigParser()
+    if os.path.exists(config_file):
+        config.read(config_file)
+
+    base_url = config.get('commvault', 'webservice_url',
+                          fallback=config.get('commvault', 'base_url', fallback=''))
+
+    endpoint_timeouts = dict(DEFAULT_ENDPOINT_TIMEOUTS)
+    if config.has_section('timeouts'):
+        for path, seconds in config.items('timeouts'):
+            endpoint_timeouts[path.lower()] = int(seconds)
+
+    return {
+        'base_url': base_url.rstrip('/'),
+        'username': config.get('commvault', 'username', fallback=''),
+        'password': config.get('commvault', 'password', fallback=''),
+        'verify_ssl': config.get('api', 'verify_ssl', fallback='false').lower() == 'true',
+        'timeout': config.getint('api', 'timeout', fallback=DEFAULT_TIMEOUT),
+        'pool_size': config.getint('api', 'pool_size', fallback=DEFAULT_POOL_SIZE),
+        'token_ttl': config.getint('api', 'token_ttl', fallback=DEFAULT_TOKEN_TTL),
+        'coalesce_window': config.getfloat('api', 'coalesce_window', fallback=DEFAULT_COALESCE_WINDOW),
+        'fan_out_workers': config.getint('api', 'fan_out_workers', fallback=DEFAULT_FAN_OUT_WORKERS),
+        'requests_per_second': config.getfloat('api', 'requests_per_second', fallback=DEFAULT_REQUESTS_PER_SECOND),
+        'request_burst': config.getint('api', 'request_burst', fallback=DEFAULT_BURST),
+        'min_concurrency': config.getint('api', 'min_concurrency', fallback=DEFAULT_MIN_CONCURRENCY),
+        'max_concurrency': config.getint('api', 'max_concurrency', fallback=DEFAULT_MAX_CONCURRENCY),
+        'endpoint_timeouts': endpoint_timeouts
+    }
+
+
+def encode_password(password):
+    """Return the password Base64-encoded, leaving already-encoded passwords unchanged"""
+    try:
+        # Try to decode to check if it's valid base64
+        decoded = base64.b64decode(password).decode('utf-8')
+        # Check if decoded value is reasonable (not binary gibberish)
+        if len(decoded) > 0 and all(c.isprintable() or c.isspace() for c in decoded):
+            return password
+    except Exception:
+        pass
+    return base64.b64encode(password.encode('utf-8')).decode('utf-8')
+
+
+def get_session(base_url, verify=False, pool_size=DEFAULT_POOL_SIZE):
+    """Get the process-wide keep-alive session for a CommServe"""
+    key = (base_url.rstrip('/'), verify)
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.verify = verify
+            session.headers.update({'Accept': 'application/json'})
+
+            if not verify:
+                # Self-signed CommServe certificates are the norm
+                urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+            _sessions[key] = session
+
+    return session
+
+
+class TokenCache:
+    """
+    Process-wide login tokens keyed by (base_url, username)
+
+    Tokens expire after `ttl` seconds. Concurrent callers for the same key wait on a
+    single in-flight login instead of each posting to /Login. A digest of the password
+    is kept with each token so a different password never reuses a cached login.
+    """
+
+    def __init__(self, ttl=DEFAULT_TOKEN_TTL):
+        self.ttl = ttl
+        self._tokens = {}
+        self._login_locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(password):
+        return hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+    def get(self, key, password):
+        """Return the cached token for key, or None if missing, expired or for another password"""
+        with self._lock:
+            entry = self._tokens.get(key)
+        if entry is None:
+            return None
+        token, digest, expires_at = entry
+        if digest != self._digest(password) or time.time() >= expires_at:
+            return None
+        return token
+
+    def put(self, key, password, token):
+        """Cache a token for key"""
+        with self._lock:
+            self._tokens[key] = (token, self._digest(password), time.time() + self.ttl)
+
+    def invalidate(self, key, token=None):
+        """Drop the cached token for key (only if it is still `token`, when given)"""
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry and (token is None or entry[0] == token):
+                del self._tokens[key]
+
+    def login_lock(self, key):
+        """Lock serialising logins for key"""
+        with self._lock:
+            return self._login_locks.setdefault(key, threading.Lock())
+
+
+token_cache = TokenCache()
+
+
+class RequestCoalescer:
+    """
+    Single-flight sharing of identical GETs across threads
+
+    Callers asking for the same key while a request is in flight wait for it and get
+    the same response instead of sending their own. Successful responses are also
+    reused for `window` seconds, so back-to-back refreshes do not hit the CommServe twice.
+    """
+
+    def __init__(self, window=DEFAULT_COALESCE_WINDOW):
+        self.window = window
+        self._inflight = {}
+        self._recent = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, send):
+        """Return the shared response for key, calling send() only if no one else is"""
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent and time.time() - recent[1] < self.window:
+                return recent[0]
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            response = send()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            now = time.time()
+            # Drop expired entries so large payloads are not held longer than the window
+            self._recent = {k: v for k, v in self._recent.items() if now - v[1] < self.window}
+            if self.window > 0 and response.status_code == 200:
+                self._recent[key] = (response, now)
+        future.set_result(response)
+        return response
+
+    def clear(self):
+        """Forget recently fetched responses"""
+        with self._lock:
+            self._recent.clear()
+
+
+request_coalescer = RequestCoalescer()
+
+
+class CommvaultClient:
+    """
+    Authenticated Commvault REST API client on top of a shared pooled session
+
+    Every request it sends (including /Login, timeouts and connection errors) is recorded
+    in api_call_metrics under run_id, through api_metrics.call_recorder.
+    """
+
+    def __init__(self, base_url, token=None, verify=False, timeout=DEFAULT_TIMEOUT,
+                 endpoint_timeouts=None, pool_size=DEFAULT_POOL_SIZE, run_id=None):
+        self.base_url = base_url.rstrip('/')
+        self.verify = verify
+        self.timeout = timeout
+        self.endpoint_timeouts = endpoint_timeouts if endpoint_timeouts is not None else dict(DEFAULT_ENDPOINT_TIMEOUTS)
+        self.session = get_session(self.base_url, verify=verify, pool_size=pool_size)
+        self.token = None
+        self.credentials = None
+        # Response and duration (ms) of the last real /Login (None when served from the token cache)
+        self.login_response = None
+        self.login_duration = None
+        # Refresh the calls are recorded under (see api_metrics.new_run_id)
+        self.run_id = run_id
+        if token:
+            self.set_token(token)
+
+    @classmethod
+    def from_config(cls, base_url=None, token=None, config_file=CONFIG_FILE, run_id=None):
+        """Create a client using the connection settings in config.ini (base_url may be overridden)"""
+        settings = load_api_settings(config_file)
+        token_cache.ttl = settings['token_ttl']
+        request_coalescer.window = settings['coalesce_window']
+        base_url = base_url or settings['base_url']
+        get_host_limiter(base_url, rate_per_second=settings['requests_per_second'], burst=settings['request_burst'],
+                         min_concurrency=settings['min_concurrency'], max_concurrency=settings['max_concurrency'])
+        return cls(base_url, token=token, verify=settings['verify_ssl'],
+                   timeout=settings['timeout'], endpoint_timeouts=settings['endpoint_timeouts'],
+                   pool_size=settings['pool_size'], run_id=run_id)
+
+    def set_token(self, token):
+        """Use a login token (with or without the "QSDK " prefix) for subsequent requests"""
+        if token.startswith('QSDK '):
+            token = token[5:]
+        self.token = token
+
+    @property
+    def headers(self):
+        """Default headers sent with every request"""
+        headers = {'Accept': 'application/json'}
+        if self.token:
+            headers['Authtoken'] = f'QSDK {self.token}'
+        return headers
+
+    def timeout_for(self, path):
+        """Timeout for an endpoint, using the longest matching configured path prefix"""
+        path = path.split('?')[0].lower()
+        best = None
+        for prefix in self.endpoint_timeouts:
+            if path == prefix or path.startswith(prefix.rstrip('/') + '/'):
+                if best is None or len(prefix) > len(best):
+                    best = prefix
+        return self.endpoint_timeouts[best] if best else self.timeout
+
+    def _record_call(self, method, path, start_time, response=None):
+        """Buffer an api_call_metrics row for one request (response None for failures)"""
+        call_recorder.add(metric_row(
+            self.run_id, method, path,
+            response.status_code if response is not None else None,
+            int((time.time() - start_time) * 1000),
+            len(response.content) if response is not None else None,
+            call_epoch=start_time
+        ))
+
+    def _send(self, method, path, headers, **kwargs):
+        """Send one request through the CommServe's shared limiter, reporting how it went"""
+        limiter = get_host_limiter(self.base_url)
+        limiter.acquire()
+        start_time = time.time()
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', headers=headers, **kwargs)
+        except requests.exceptions.RequestException:
+            limiter.release(latency=time.time() - start_time, failed=True)
+            self._record_call(method, path, start_time)
+            raise
+        except BaseException:
+            limiter.release()
+            raise
+        limiter.release(response.status_code, time.time() - start_time, kwargs.get('timeout'))
+        self._record_call(method, path, start_time, response)
+        return response
+
+    def request(self, method, path, **kwargs):
+        """
+        Send a request to `path` (relative to base_url) over the pooled session
+
+        Requests wait for a slot in the CommServe's shared limiter (host_limiter), which
+        caps the request rate and adapts concurrency to how the CommServe is coping.
+        If the token has expired (HTTP 401) and this client holds credentials, it logs in
+        again once and retries the request.
+        """
+        extra_headers = kwargs.pop('headers', None) or {}
+        kwargs.setdefault('timeout', self.timeout_for(path))
+
+        headers = self.headers
+        headers.update(extra_headers)
+        response = self._send(method, path, headers, **kwargs)
+
+        if response.status_code == 401 and self.credentials:
+            username, password = self.credentials
+            token_cache.invalidate((self.base_url, username), self.token)
+            if self.authenticate(username, password):
+                headers = self.headers
+                headers.update(extra_headers)
+                response = self._send(method, path, headers, **kwargs)
+
+        return response
+
+    def get(self, path, coalesce=True, **kwargs):
+        """
+        GET an endpoint
+
+        Identical GETs (same CommServe, user, path and params) made at the same time or
+        within the coalescing window share one request. Pass coalesce=False to always
+        send a fresh request.
+        """
+        if not coalesce or set(kwargs) - {'params', 'timeout'}:
+            return self.request('GET', path, **kwargs)
+
+        identity = self.credentials[0] if self.credentials else self.token
+        params = tuple(sorted((kwargs.get('params') or {}).items()))
+        key = (self.base_url, identity, path, params)
+        return request_coalescer.run(key, lambda: self.request('GET', path, **kwargs))
+
+    def post(self, path, **kwargs):
+        """POST to an endpoint"""
+        return self.request('POST', path, **kwargs)
+
+    def login(self, username, password):
+        """
+        Authenticate with /Login and keep the token on this client
+
+        Returns:
+            Tuple of (token, response). token is None if authentication failed.
+        """
+        start_time = time.time()
+        try:
+            response = self.session.post(
+                f'{self.base_url}/Login',
+                json={'username': username, 'password': encode_password(password)},
+                headers={'Accept': 'application/json', 'Content-Type': 'application/json'},
+                timeout=self.timeout_for('/Login')
+            )
+        except requests.exceptions.RequestException:
+            self._record_call('POST', '/Login', start_time)
+            raise
+        self._record_call('POST', '/Login', start_time, response)
+        self.login_response = response
+        self.login_duration = int((time.time() - start_time) * 1000)
+
+        token = None
+        if response.status_code == 200:
+            token = response.json().get('token') or None
+            if token:
+                self.set_token(token)
+                token = self.token
+
+        return token, response
+
+    def authenticate(self, username, password):
+        """
+        Attach a token for username, logging in only when the shared cache has none
+
+        Returns:
+            Token string, or None if authentication failed. login_response is set only
+            when a /Login request was actually made.
+        """
+        key = (self.base_url, username)
+        self.credentials = (username, password)
+        self.login_response = None
+        self.login_duration = None
+
+        token = token_cache.get(key, password)
+        if token is None:
+            # Only one caller per key logs in; the rest pick up its token
+            with token_cache.login_lock(key):
+                token = token_cache.get(key, password)
+                if token is None:
+                    token, _ = self.login(username, password)
+                    if token:
+                        token_cache.put(key, password, token)
+
+        if token:
+            self.set_token(token)
+        return token
+
+
+def connect_from_config(config_file=CONFIG_FILE):
+    """
+    Log in with the credentials in config.ini
+
+    Returns:
+        Authenticated CommvaultClient, or None if login failed
+    """
+    settings = load_api_settings(config_file)
+    client = CommvaultClient.from_config(config_file=config_file)
+
+    try:
+        token = client.authenticate(settings['username'], settings['password'])
+    except requests.exceptions.RequestException as e:
+        print(f"Authentication error: {e}")
+        return None
+
+    if not token:
+        response = client.login_response
+        print(f"Login failed with status {response.status_code}: {response.text[:200]}")
+        return None
+
+    return client
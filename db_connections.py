@@ -0,0 +1,192 @@
+"""
+SQLite Connection Manager
+WAL-mode connections with tuned pragmas: a pool of read-only connections for request handlers and a single writer
+"""
+
+import configparser
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+from commvault_client import CONFIG_FILE
+
+# Applied to every connection. NORMAL is durable across application crashes in WAL mode
+# (only a power loss can drop the last commits); negative cache_size is in KiB.
+DEFAULT_SYNCHRONOUS = 'NORMAL'
+DEFAULT_CACHE_SIZE_MB = 64
+DEFAULT_MMAP_SIZE_MB = 256
+DEFAULT_TEMP_STORE = 'MEMORY'
+DEFAULT_BUSY_TIMEOUT_MS = 30000
+
+# Read-only connections kept for request handlers
+DEFAULT_READ_POOL_SIZE = 4
+
+DEFAULT_DB_PATH = 'Database/commvault.db'
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def load_db_settings(config_file=CONFIG_FILE):
+    """Connection settings from the [database] section of config.ini"""
+    config = configparser.ConfigParser()
+    if os.path.exists(config_file):
+        config.read(config_file)
+    return {
+        'synchronous': config.get('database', 'synchronous', fallback=DEFAULT_SYNCHRONOUS).upper(),
+        'cache_size_mb': config.getint('database', 'cache_size_mb', fallback=DEFAULT_CACHE_SIZE_MB),
+        'mmap_size_mb': config.getint('database', 'mmap_size_mb', fallback=DEFAULT_MMAP_SIZE_MB),
+        'busy_timeout_ms': config.getint('database', 'busy_timeout_ms', fallback=DEFAULT_BUSY_TIMEOUT_MS),
+        'read_pool_size': config.getint('database', 'read_pool_size', fallback=DEFAULT_READ_POOL_SIZE),
+        'db_path': config.get('database', 'db_path', fallback=DEFAULT_DB_PATH),
+    }
+
+
+def connect(db_path, readonly=False, settings=None, check_same_thread=True):
+    """
+    Open a connection with WAL journaling and the tuned pragmas
+
+    Args:
+        db_path: SQLite database file
+        readonly: Open with mode=ro, so the connection can never take the write lock
+        settings: Dictionary from load_db_settings() (default: read config.ini)
+        check_same_thread: False for connections handed between threads (one thread at a time)
+
+    Returns:
+        sqlite3 connection
+    """
+    settings = settings or load_db_settings()
+    timeout = settings['busy_timeout_ms'] / 1000
+
+    if readonly:
+        uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+        db = sqlite3.connect(uri, uri=True, timeout=timeout, check_same_thread=check_same_thread)
+    else:
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        db = sqlite3.connect(db_path, timeout=timeout, check_same_thread=check_same_thread)
+        # Stored in the database file, so every later connection (and the standalone scripts) uses WAL
+        db.execute("PRAGMA journal_mode = WAL")
+
+    db.execute(f"PRAGMA busy_timeout = {int(settings['busy_timeout_ms'])}")
+    db.execute(f"PRAGMA synchronous = {settings['synchronous']}")
+    db.execute(f"PRAGMA cache_size = {-int(settings['cache_size_mb']) * 1024}")
+    db.execute(f"PRAGMA mmap_size = {int(settings['mmap_size_mb']) * 1024 * 1024}")
+    db.execute(f"PRAGMA temp_store = {DEFAULT_TEMP_STORE}")
+    return db
+
+
+class ConnectionManager:
+    """
+    Read pool plus single writer for one database file
+
+    In WAL mode readers see the last committed data and are never blocked by the writer,
+    so dashboards stay responsive while a long fetch commits page by page. Writes from
+    this process share one connection, taken in turn.
+
+    Args:
+        db_path: SQLite database file
+        read_pool_size: Read-only connections kept open; further readers wait for one
+        settings: Dictionary from load_db_settings()
+    """
+
+    def __init__(self, db_path, read_pool_size=DEFAULT_READ_POOL_SIZE, settings=None):
+        self.db_path = db_path
+        self.read_pool_size = max(1, read_pool_size)
+        self.settings = settings or load_db_settings()
+        self._idle = []
+        self._opened = 0
+        self._pool_cond = threading.Condition()
+        self._writer = None
+        self._write_lock = threading.RLock()
+
+    def acquire_reader(self):
+        """Take a read-only connection from the pool, opening one if the pool is not full"""
+        with self._pool_cond:
+            while not self._idle and self._opened >= self.read_pool_size:
+                self._pool_cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._opened += 1
+
+        try:
+            db = connect(self.db_path, readonly=True, settings=self.settings, check_same_thread=False)
+        except Exception:
+            with self._pool_cond:
+                self._opened -= 1
+                self._pool_cond.notify()
+            raise
+        db.row_factory = sqlite3.Row
+        return db
+
+    def release_reader(self, db):
+        """Return a reader to the pool"""
+        if db.in_transaction:
+            db.rollback()
+        db.row_factory = sqlite3.Row
+        with self._pool_cond:
+            self._idle.append(db)
+            self._pool_cond.notify()
+
+    def acquire_writer(self):
+        """Take the single writer connection (blocks while another caller holds it)"""
+        self._write_lock.acquire()
+        try:
+            if self._writer is None:
+                self._writer = connect(self.db_path, settings=self.settings, check_same_thread=False)
+                self._writer.row_factory = sqlite3.Row
+        except Exception:
+            self._write_lock.release()
+            raise
+        return self._writer
+
+    def release_writer(self, db):
+        """Give the writer back, rolling back anything left uncommitted"""
+        try:
+            if db.in_transaction:
+                db.rollback()
+        finally:
+            self._write_lock.release()
+
+    @contextmanager
+    def reader(self):
+        db = self.acquire_reader()
+        try:
+            yield db
+        finally:
+            self.release_reader(db)
+
+    @contextmanager
+    def writer(self):
+        """The writer for the duration of the block; the block commits its own work"""
+        db = self.acquire_writer()
+        try:
+            yield db
+        finally:
+            self.release_writer(db)
+
+    def close(self):
+        """Close idle readers and the writer"""
+        with self._pool_cond:
+            for db in self._idle:
+                db.close()
+            self._opened -= len(self._idle)
+            self._idle = []
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+def get_connection_manager(db_path):
+    """Process-wide ConnectionManager for a database file"""
+    key = os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            settings = load_db_settings()
+            manager = _managers[key] = ConnectionManager(db_path, settings['read_pool_size'], settings)
+    return manager
@@ -0,0 +1,86 @@
+"""
+Managed Index Set
+Secondary indexes behind the dashboard and analysis queries, applied by a schema migration (db_migrations.py)
+"""
+
+# Managed indexes are named ix_*; any ix_* index not listed here is dropped, and one whose
+# definition changed is rebuilt. Statements are compared with sqlite_master.sql verbatim.
+# After changing this list, append a migration that calls ensure_indexes again.
+MANAGED_PREFIX = 'ix_'
+
+MANAGED_INDEXES = [
+    # Infrastructure dashboard: COUNT(*) ... status LIKE '%Completed%' / '%Failed%' scans this covering index, not the table
+    ('jobs', "CREATE INDEX ix_jobs_status ON jobs (status)"),
+    # /view/jobs and /view/jobs_enhanced: latest 100 by start time
+    ('jobs', "CREATE INDEX ix_jobs_start ON jobs (startTime)"),
+    ('jobs_enhanced', "CREATE INDEX ix_jobs_enhanced_start ON jobs_enhanced (startTime)"),
+    # Dashboard averages over jobs with savings / throughput recorded
+    ('jobs_enhanced', "CREATE INDEX ix_jobs_enhanced_savings ON jobs_enhanced (percentSavings)"),
+    ('jobs_enhanced', "CREATE INDEX ix_jobs_enhanced_throughput ON jobs_enhanced (throughputMBps)"),
+
+    ('clients', "CREATE INDEX ix_clients_name ON clients (clientName)"),
+
+    # Capacity bands, critical pools and pool totals filter on the stored percent free
+    ('storage_pools', "CREATE INDEX ix_storage_pools_pct_free ON storage_pools (pctFree)"),
+
+    # Severity counts, newest events, and the Critical/Error feed (partial: only those rows)
+    ('events', "CREATE INDEX ix_events_severity_time ON events (severity, timeSource)"),
+    ('events', "CREATE INDEX ix_events_time ON events (timeSource)"),
+    ('events', "CREATE INDEX ix_events_critical_time ON events (timeSource) "
+               "WHERE severity IN ('Critical', 'Error')"),
+
+    # Plan details (rules of one plan), policy listings, and the retention summary counts
+    ('retention_rules', "CREATE INDEX ix_retention_parent ON retention_rules (parentId, entityType, entityName)"),
+    ('retention_rules', "CREATE INDEX ix_retention_parent_name ON retention_rules (parentName, entityName)"),
+    ('retention_rules', "CREATE INDEX ix_retention_days ON retention_rules (retainBackupDataForDays)"),
+    ('retention_rules', "CREATE INDEX ix_retention_cycles ON retention_rules (retainBackupDataForCycles)"),
+    ('retention_rules', "CREATE INDEX ix_retention_aging ON retention_rules (enableDataAging)"),
+
+    # Logs dashboard: daily totals (covering), the error list (partial), per-DDB pruning (covering)
+    ('aging_pruning_logs', "CREATE INDEX ix_aging_logs_date ON aging_pruning_logs "
+                           "(logDate, operation, status, recordsProcessed, bytesReclaimed)"),
+    ('aging_pruning_logs', "CREATE INDEX ix_aging_logs_errors ON aging_pruning_logs (logDate, logTime) "
+                           "WHERE status = 'Error'"),
+    ('aging_pruning_logs', "CREATE INDEX ix_aging_logs_ddb ON aging_pruning_logs "
+                           "(operation, ddbStoreId, recordsProcessed, logDate, logTime)"),
+    ('log_collection_history', "CREATE INDEX ix_log_collection_time ON log_collection_history (collectionTime)"),
+]
+
+
+def index_name(statement):
+    return statement.split()[2]
+
+
+def ensure_indexes(db):
+    """
+    Bring the database's ix_* indexes in line with MANAGED_INDEXES
+
+    Runs only from schema migrations. Indexes on tables that do not exist yet are skipped; a
+    later migration that creates the table must call ensure_indexes again to add them.
+    Statistics are refreshed with ANALYZE when anything changed, otherwise PRAGMA optimize.
+
+    Returns:
+        Tuple of (created, dropped) index names
+    """
+    tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    existing = {
+        name: sql for name, sql in db.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND name LIKE ?", (MANAGED_PREFIX + '%',)
+        )
+    }
+    wanted = {index_name(statement): (table, statement) for table, statement in MANAGED_INDEXES}
+
+    created = []
+    dropped = []
+    for name, sql in existing.items():
+        if name not in wanted or wanted[name][1] != sql:
+            db.execute(f"DROP INDEX IF EXISTS {name}")
+            dropped.append(name)
+
+    for name, (table, statement) in wanted.items():
+        if table in tables and (name not in existing or name in dropped):
+            db.execute(statement)
+            created.append(name)
+
+    db.execute("ANALYZE" if created or dropped else "PRAGMA optimize")
+    return created, dropped
@@ -0,0 +1,669 @@
+"""
+Schema Migrations
+Numbered schema migrations recorded in a schema_version table and applied by init_db at startup
+"""
+
+import sqlite3
+import time
+from datetime import datetime
+
+from capacity import capacity_percentages, capacity_value
+from db_indexes import ensure_indexes
+
+SCHEMA_VERSION_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version     INTEGER PRIMARY KEY,
+        name        TEXT,
+        appliedAt   TEXT,
+        durationMs  REAL
+    )
+"""
+
+# plans as save_plans_to_db writes it
+PLANS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        planId            INTEGER PRIMARY KEY,
+        planName          TEXT,
+        description       TEXT,
+        type              INTEGER,
+        subtype           INTEGER,
+        numCopies         INTEGER,
+        numAssocEntities  INTEGER,
+        rpoInMinutes      INTEGER,
+        storageTarget     TEXT,
+        storagePolicyId   INTEGER,
+        isElastic         INTEGER,
+        statusFlag        INTEGER,
+        lastFetchTime     TEXT
+    )
+"""
+
+# The DDL below is part of the migrations that apply it: later schema changes get a new
+# migration, never an edit here, so every database passes through the same steps.
+
+# Sizes are stored as INTEGER in the unit the CommServe reports them in (NULL when unknown:
+# missing, "N/A", or -1 for pools whose capacity the CommServe could not read). pctFree and
+# pctUsed are computed once at ingest so dashboards classify pools in SQL.
+STORAGE_POOLS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        storagePoolId     INTEGER PRIMARY KEY,
+        storagePoolName   TEXT,
+        storagePoolType   TEXT,
+        mediaAgentName    TEXT,
+        totalCapacity     INTEGER,
+        freeSpace         INTEGER,
+        pctFree           REAL,
+        pctUsed           REAL,
+        dedupeEnabled     TEXT,
+        lastFetchTime     TEXT
+    )
+"""
+
+MEDIAAGENTS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        mediaAgentId      INTEGER PRIMARY KEY,
+        mediaAgentName    TEXT,
+        hostName          TEXT,
+        osType            TEXT,
+        status            TEXT,
+        availableSpace    INTEGER,
+        totalSpace        INTEGER,
+        pctFree           REAL,
+        pctUsed           REAL,
+        lastFetchTime     TEXT
+    )
+"""
+
+# table -> (schema, total column, free column)
+CAPACITY_TABLES = {
+    'storage_pools': (STORAGE_POOLS_SCHEMA, 'totalCapacity', 'freeSpace'),
+    'mediaagents': (MEDIAAGENTS_SCHEMA, 'totalSpace', 'availableSpace'),
+}
+
+
+def create_base_schema(db):
+    """Every table init_db created before versioned migrations (IF NOT EXISTS, so existing databases keep theirs)"""
+    # Create table for Clients
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS clients (
+            clientId       INTEGER PRIMARY KEY,
+            clientName     TEXT,
+            hostName       TEXT,
+            clientGUID     TEXT,
+            lastFetchTime  TEXT
+        )
+    """)
+
+    # Create table for Jobs
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            jobId          INTEGER PRIMARY KEY,
+            clientId       INTEGER,
+            clientName     TEXT,
+            jobType        TEXT,
+            status         TEXT,
+            startTime      TEXT,
+            endTime        TEXT,
+            backupSetName  TEXT,
+            lastFetchTime  TEXT
+        )
+    """)
+
+    # Create table for Storage Policies
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS storage_policies (
+            storagePolicyId   INTEGER PRIMARY KEY,
+            storagePolicyName TEXT,
+            lastFetchTime     TEXT
+        )
+    """)
+
+    # Create table for MediaAgents (Infrastructure); sizes are INTEGER (NULL when unknown)
+    db.execute(MEDIAAGENTS_SCHEMA.format(table='mediaagents'))
+
+    # Create table for Libraries (Tape/Disk Libraries)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS libraries (
+            libraryId         INTEGER PRIMARY KEY,
+            libraryName       TEXT,
+            libraryType       TEXT,
+            mediaAgentName    TEXT,
+            status            TEXT,
+            lastFetchTime     TEXT
+        )
+    """)
+
+    # Create table for Storage Pools, with percent free/used computed at ingest
+    db.execute(STORAGE_POOLS_SCHEMA.format(table='storage_pools'))
+
+    # Create table for Hypervisors/VM Infrastructure
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS hypervisors (
+            instanceId        INTEGER PRIMARY KEY,
+            instanceName      TEXT,
+            hypervisorType    TEXT,
+            hostName          TEXT,
+            vendor            TEXT,
+            status            TEXT,
+            lastFetchTime     TEXT
+        )
+    """)
+
+    # Create table for Disk Storage Arrays
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS storage_arrays (
+            arrayId           INTEGER PRIMARY KEY,
+            arrayName         TEXT,
+            arrayType         TEXT,
+            vendor            TEXT,
+            model             TEXT,
+            totalCapacity     TEXT,
+            usedCapacity      TEXT,
+            lastFetchTime     TEXT
+        )
+    """)
+
+    # Create table for Plans (Modern Commvault backup configuration)
+    db.execute(PLANS_SCHEMA.format(table='plans'))
+
+    # Create table for Retention Rules (Aging Policy data)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS retention_rules (
+            ruleId                          INTEGER PRIMARY KEY AUTOINCREMENT,
+            entityType                      TEXT NOT NULL,
+            entityId                        INTEGER NOT NULL,
+            entityName                      TEXT,
+            parentId                        INTEGER,
+            parentName                      TEXT,
+            retainBackupDataForDays         INTEGER,
+            retainBackupDataForCycles       INTEGER,
+            retainArchiverDataForDays       INTEGER,
+            enableDataAging                 INTEGER,
+            jobBasedRetention               INTEGER,
+            firstExtendedRetentionDays      INTEGER,
+            firstExtendedRetentionCycles    INTEGER,
+            secondExtendedRetentionDays     INTEGER,
+            secondExtendedRetentionCycles   INTEGER,
+            lastFetchTime                   TEXT,
+            UNIQUE(entityType, entityId)
+        )
+    """)
+
+    # Create table for Events (Alerts and Critical Events)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            eventId           INTEGER PRIMARY KEY,
+            eventCode         TEXT,
+            severity          TEXT,
+            eventType         TEXT,
+            message           TEXT,
+            timeSource        TEXT,
+            subsystem         TEXT,
+            clientName        TEXT,
+            jobId             INTEGER,
+            lastFetchTime     TEXT
+        )
+    """)
+
+    # Create table for Alerts
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS alerts (
+            alertId           INTEGER PRIMARY KEY,
+            alertName         TEXT,
+            alertType         TEXT,
+            severity          TEXT,
+            status            TEXT,
+            alertMessage      TEXT,
+            triggerTime       TEXT,
+            lastFetchTime     TEXT
+        )
+    """)
+
+    # Create table for CommCell Info (Health Check)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS commcell_info (
+            id                INTEGER PRIMARY KEY,
+            commcellName      TEXT,
+            commserveVersion  TEXT,
+            timeZone          TEXT,
+            commserveHost     TEXT,
+            status            TEXT,
+            lastCheckTime     TEXT
+        )
+    """)
+
+    # Create table for Selected MediaAgents (for environment filtering)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS selected_mediaagents (
+            mediaAgentId      INTEGER PRIMARY KEY,
+            mediaAgentName    TEXT NOT NULL,
+            selectedDate      TEXT,
+            notes             TEXT,
+            FOREIGN KEY (mediaAgentId) REFERENCES mediaagents(mediaAgentId)
+        )
+    """)
+
+    # Enhance jobs table with performance metrics (if not exists, SQLite will ignore)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS jobs_enhanced (
+            jobId                INTEGER PRIMARY KEY,
+            clientId             INTEGER,
+            clientName           TEXT,
+            jobType              TEXT,
+            status               TEXT,
+            startTime            TEXT,
+            endTime              TEXT,
+            backupSetName        TEXT,
+            sizeOfApplication    TEXT,
+            sizeOfMediaOnDisk    TEXT,
+            percentSavings       REAL,
+            throughputMBps       REAL,
+            jobElapsedTime       TEXT,
+            filesCount           INTEGER,
+            lastFetchTime        TEXT
+        )
+    """)
+
+    # Per-endpoint sync high-water marks for delta pulls
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            endpoint          TEXT PRIMARY KEY,
+            lastSuccessTime   TEXT,
+            lastSuccessEpoch  INTEGER,
+            highWaterMark     INTEGER,
+            lastRecordCount   INTEGER
+        )
+    """)
+
+    # Hash of the last payload saved per endpoint path (unchanged refreshes skip the save)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS payload_hashes (
+            endpoint      TEXT NOT NULL,
+            path          TEXT NOT NULL,
+            hash          TEXT NOT NULL,
+            recordCount   INTEGER,
+            savedTime     TEXT,
+            PRIMARY KEY (endpoint, path)
+        )
+    """)
+
+    # Background scheduler run history
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_runs (
+            runId          INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity         TEXT NOT NULL,
+            status         TEXT NOT NULL,
+            startTime      TEXT,
+            endTime        TEXT,
+            durationMs     INTEGER,
+            recordCount    INTEGER,
+            errorMessage   TEXT
+        )
+    """)
+
+    # Endpoint variants known to work per CommServe version
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS endpoint_variants (
+            capability        TEXT NOT NULL,
+            commserveVersion  TEXT NOT NULL,
+            path              TEXT NOT NULL,
+            listKey           TEXT,
+            lastVerified      TEXT,
+            PRIMARY KEY (capability, commserveVersion)
+        )
+    """)
+
+    # Cached /api/config endpoint probes and their latency history
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS endpoint_probe_runs (
+            runId          INTEGER PRIMARY KEY AUTOINCREMENT,
+            startTime      TEXT,
+            startEpoch     INTEGER,
+            durationMs     INTEGER,
+            authSuccess    INTEGER,
+            authError      TEXT,
+            timedOut       INTEGER
+        )
+    """)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS endpoint_probe_results (
+            path           TEXT PRIMARY KEY,
+            runId          INTEGER,
+            status         TEXT,
+            message        TEXT,
+            hasData        INTEGER,
+            count          INTEGER,
+            sampleData     TEXT,
+            latencyMs      INTEGER,
+            probedTime     TEXT
+        )
+    """)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS endpoint_latency_history (
+            id             INTEGER PRIMARY KEY AUTOINCREMENT,
+            path           TEXT NOT NULL,
+            runId          INTEGER,
+            status         TEXT,
+            latencyMs      INTEGER,
+            probedTime     TEXT,
+            probedEpoch    INTEGER
+        )
+    """)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_endpoint_latency_path ON endpoint_latency_history (path, probedEpoch)")
+
+    # Durable per-call latency, size and record counts (session logs only keep the last few)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS api_call_metrics (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            runId         TEXT,
+            method        TEXT NOT NULL,
+            endpoint      TEXT NOT NULL,
+            path          TEXT,
+            statusCode    INTEGER,
+            durationMs    INTEGER,
+            bytes         INTEGER,
+            recordCount   INTEGER,
+            callTime      TEXT NOT NULL,
+            callEpoch     INTEGER NOT NULL
+        )
+    """)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_api_call_metrics_endpoint ON api_call_metrics (endpoint, callEpoch)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_api_call_metrics_epoch ON api_call_metrics (callEpoch)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_api_call_metrics_run ON api_call_metrics (runId)")
+
+
+def rebuild_table(db, table, schema):
+    """
+    Replace a table with one created from schema, copying the columns both have
+
+    Args:
+        db: Database connection
+        table: Table to rebuild
+        schema: CREATE TABLE IF NOT EXISTS statement with a {table} placeholder
+    """
+    old_columns = [row[1] for row in db.execute(f"PRAGMA table_info({table})")]
+    new_table = f"{table}_migrating"
+    db.execute(f"DROP TABLE IF EXISTS {new_table}")
+    db.execute(schema.format(table=new_table))
+    columns = [row[1] for row in db.execute(f"PRAGMA table_info({new_table})") if row[1] in old_columns]
+
+    db.execute(f"INSERT INTO {new_table} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM {table}")
+    # Drop, then rename the copy (renaming the old table instead would repoint foreign keys at it)
+    db.execute(f"DROP TABLE {table}")
+    db.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+
+
+def migrate_plans_table(db):
+    """
+    Rebuild a plans table created with the early (planId, planName, planType) columns
+
+    init_db used to create plans twice; the first statement won, so save_plans_to_db
+    failed on the missing plan detail columns.
+    """
+    columns = {row[1] for row in db.execute("PRAGMA table_info(plans)")}
+    if 'description' not in columns:
+        rebuild_table(db, 'plans', PLANS_SCHEMA)
+
+
+def migrate_capacity_columns(db):
+    """
+    Rebuild storage_pools and mediaagents created with TEXT capacity columns
+
+    SQLite cannot change a column's type, so the table is copied into a new one with the
+    current schema (sizes converted, percentages computed) which then replaces it.
+
+    Returns:
+        List of tables rebuilt
+    """
+    migrated = []
+    for table, (schema, total_column, free_column) in CAPACITY_TABLES.items():
+        columns = {row[1]: row[2].upper() for row in db.execute(f"PRAGMA table_info({table})")}
+        if not columns or ('pctFree' in columns and columns[total_column] == 'INTEGER'):
+            continue
+
+        new_table = f"{table}_migrating"
+        db.execute(f"DROP TABLE IF EXISTS {new_table}")
+        db.execute(schema.format(table=new_table))
+        new_columns = [row[1] for row in db.execute(f"PRAGMA table_info({new_table})")]
+        copied = [column for column in new_columns if column in columns]
+
+        rows = []
+        for row in db.execute(f"SELECT {', '.join(copied)} FROM {table}"):
+            record = dict(zip(copied, row))
+            record[total_column] = capacity_value(record.get(total_column))
+            record[free_column] = capacity_value(record.get(free_column))
+            record['pctFree'], record['pctUsed'] = capacity_percentages(record[total_column], record[free_column])
+            rows.append(tuple(record.get(column) for column in new_columns))
+
+        db.executemany(
+            f"INSERT INTO {new_table} ({', '.join(new_columns)}) VALUES ({', '.join('?' for _ in new_columns)})",
+            rows
+        )
+        # Drop, then rename the copy (renaming the old table instead would repoint foreign keys at it)
+        db.execute(f"DROP TABLE {table}")
+        db.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+        migrated.append(table)
+
+    return migrated
+
+
+def create_log_tables(db):
+    """Tables behind the aging/pruning logs dashboard"""
+    # One row per log collection run from a MediaAgent
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS log_collection_history (
+            collectionId      INTEGER PRIMARY KEY AUTOINCREMENT,
+            mediaAgentName    TEXT,
+            collectionTime    TEXT,
+            logsCollected     INTEGER,
+            totalSize         INTEGER,
+            status            TEXT,
+            errorCount        INTEGER,
+            errorDetails      TEXT
+        )
+    """)
+
+    # Parsed aging, pruning and physical delete log lines
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS aging_pruning_logs (
+            logId             INTEGER PRIMARY KEY AUTOINCREMENT,
+            logDate           TEXT,
+            logTime           TEXT,
+            mediaAgentName    TEXT,
+            logType           TEXT,
+            operation         TEXT,
+            status            TEXT,
+            ddbStoreId        INTEGER,
+            recordsProcessed  INTEGER,
+            bytesReclaimed    INTEGER,
+            errorMessage      TEXT
+        )
+    """)
+
+
+def create_storage_estate_tables(db):
+    """Tables filled by fetch_storage_estate.py / populate_storage_estate_from_db.py"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS storage_libraries (
+            libraryId        INTEGER PRIMARY KEY,
+            libraryName      TEXT NOT NULL,
+            libraryType      TEXT,
+            libraryTypeDesc  TEXT,
+            mediaAgentId     INTEGER,
+            mediaAgentName   TEXT,
+            status           TEXT,
+            capacity         INTEGER,
+            freeSpace        INTEGER,
+            usedSpace        INTEGER,
+            usedPercent      REAL,
+            vendorType       INTEGER,
+            storageClass     TEXT,
+            mountPath        TEXT,
+            isCloudStorage   INTEGER,
+            isDedupe         INTEGER,
+            lastFetchTime    TEXT
+        )
+    """)
+
+    # Storage pool to library mapping
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS pool_library_mapping (
+            storagePoolId    INTEGER,
+            libraryId        INTEGER,
+            mappingDate      TEXT,
+            PRIMARY KEY (storagePoolId, libraryId),
+            FOREIGN KEY (storagePoolId) REFERENCES storage_pools(storagePoolId),
+            FOREIGN KEY (libraryId) REFERENCES storage_libraries(libraryId)
+        )
+    """)
+
+    # What writes to what (plan -> pool -> library)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS storage_write_patterns (
+            planId           INTEGER,
+            planName         TEXT,
+            storagePoolId    INTEGER,
+            storagePoolName  TEXT,
+            libraryId        INTEGER,
+            libraryName      TEXT,
+            copyType         TEXT,
+            retentionDays    INTEGER,
+            lastFetchTime    TEXT
+        )
+    """)
+
+
+def create_capacity_history_tables(db):
+    """Capacity samples per refresh and their hourly/daily rollups (see capacity_history.py)"""
+    # Time-first keys: writes append, rollups and pruning read epoch ranges
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS capacity_samples (
+            epoch         INTEGER NOT NULL,
+            entityKind    INTEGER NOT NULL,
+            entityId      INTEGER NOT NULL,
+            totalSize     INTEGER,
+            freeSize      INTEGER,
+            PRIMARY KEY (epoch, entityKind, entityId)
+        ) WITHOUT ROWID
+    """)
+
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS capacity_rollups (
+            resolution    INTEGER NOT NULL,
+            bucketEpoch   INTEGER NOT NULL,
+            entityKind    INTEGER NOT NULL,
+            entityId      INTEGER NOT NULL,
+            samples       INTEGER,
+            totalSize     INTEGER,
+            minFree       INTEGER,
+            avgFree       REAL,
+            maxFree       INTEGER,
+            minUsed       INTEGER,
+            avgUsed       REAL,
+            maxUsed       INTEGER,
+            PRIMARY KEY (resolution, bucketEpoch, entityKind, entityId)
+        ) WITHOUT ROWID
+    """)
+
+
+def invalidate_client_payload_hashes(db):
+    """
+    Forget the stored /Client payload hashes so the next refresh re-saves clients
+
+    save_clients_to_db used to read clientId from the client dict instead of clientEntity and
+    stored no rows; payloads hashed by that saver would otherwise be skipped as unchanged.
+    """
+    db.execute("DELETE FROM payload_hashes WHERE endpoint = 'clients'")
+
+
+def create_managed_indexes(db):
+    """Bring the ix_* indexes in line with db_indexes.MANAGED_INDEXES"""
+    ensure_indexes(db)
+
+
+def create_backfill_windows_table(db):
+    """Checkpoints of backfill_jobs.py, one row per fetched time window"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_windows (
+            windowStart      INTEGER NOT NULL,
+            windowEnd        INTEGER NOT NULL,
+            status           TEXT NOT NULL,
+            recordCount      INTEGER,
+            attempts         INTEGER DEFAULT 0,
+            lastAttemptTime  TEXT,
+            errorMessage     TEXT,
+            PRIMARY KEY (windowStart, windowEnd)
+        )
+    """)
+
+
+# Applied in order, each in its own transaction. Databases from before schema_version existed
+# start at version 0 and run every migration, so each must be safe on a schema that already
+# has some of its changes. Never edit or renumber an applied migration; append a new one
+# (e.g. another create_managed_indexes step after changing MANAGED_INDEXES).
+MIGRATIONS = [
+    (1, 'base schema', create_base_schema),
+    (2, 'plans table with plan detail columns', migrate_plans_table),
+    (3, 'integer capacity columns with percent free/used', migrate_capacity_columns),
+    (4, 'aging/pruning log tables', create_log_tables),
+    (5, 'storage estate tables', create_storage_estate_tables),
+    (6, 'managed dashboard indexes', create_managed_indexes),
+    (7, 'capacity history samples and rollups', create_capacity_history_tables),
+    (8, 're-save clients hashed before the clientEntity saver fix', invalidate_client_payload_hashes),
+    (9, 'backfill window checkpoints', create_backfill_windows_table),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(db):
+    """Highest migration applied to the database (0 before any)"""
+    try:
+        return db.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+
+
+def apply_migrations(db, migrations=MIGRATIONS):
+    """
+    Apply every migration newer than the database's schema version
+
+    Returns immediately (one query) when the schema is current. Each migration commits
+    together with its schema_version row; in WAL mode readers keep working meanwhile.
+    Concurrent callers (the app and a separate scheduler process) serialize on the write
+    lock, and a migration another process applied first is skipped.
+
+    Args:
+        db: Writable database connection (nothing uncommitted)
+        migrations: List of (version, name, function(db)) in version order
+
+    Returns:
+        List of (version, name, duration in ms) applied
+    """
+    if schema_version(db) >= migrations[-1][0]:
+        return []
+
+    db.execute(SCHEMA_VERSION_SCHEMA)
+    db.commit()
+
+    applied = []
+    for version, name, migrate in migrations:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(db) >= version:
+                db.rollback()
+                continue
+            started = time.perf_counter()
+            migrate(db)
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            db.execute(
+                "INSERT INTO schema_version (version, name, appliedAt, durationMs) VALUES (?, ?, ?, ?)",
+                (version, name, datetime.now().isoformat(), duration_ms)
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        applied.append((version, name, duration_ms))
+
+    return applied
@@ -0,0 +1,75 @@
+"""
+Batched Database Writer
+executemany upserts inside explicit transactions for the save_*_to_db functions
+"""
+
+from contextlib import contextmanager
+
+# Rows sent to SQLite per executemany call
+DEFAULT_BATCH_SIZE = 500
+
+
+def upsert_sql(table, columns, key_columns):
+    """
+    Build an INSERT ... ON CONFLICT DO UPDATE statement
+
+    Unlike REPLACE, an upsert updates the existing row in place instead of deleting and
+    re-inserting it, so rowids (e.g. retention_rules.ruleId) stay stable and indexes
+    are not churned.
+    """
+    placeholders = ", ".join("?" for _ in columns)
+    updates = [f"{col} = excluded.{col}" for col in columns if col not in key_columns]
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) ON CONFLICT({', '.join(key_columns)})"
+    if updates:
+        return f"{sql} DO UPDATE SET {', '.join(updates)}"
+    return f"{sql} DO NOTHING"
+
+
+@contextmanager
+def write_transaction(db):
+    """Run the block in an explicit transaction (or join the one already open on db)"""
+    if db.in_transaction:
+        yield db
+        return
+
+    db.execute("BEGIN")
+    try:
+        yield db
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+
+
+def upsert_rows(db, table, columns, key_columns, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Upsert row tuples into table with executemany, batch_size rows at a time
+
+    Args:
+        db: sqlite3 connection
+        table: Table name
+        columns: Column names, in the order of each row tuple
+        key_columns: Primary key / unique columns used as the conflict target
+        rows: Iterable of tuples
+        batch_size: Rows per executemany call
+
+    Returns:
+        Number of rows written
+    """
+    sql = upsert_sql(table, columns, key_columns)
+    written = 0
+    batch = []
+
+    with write_transaction(db):
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                db.executemany(sql, batch)
+                written += len(batch)
+                batch = []
+
+        if batch:
+            db.executemany(sql, batch)
+            written += len(batch)
+
+    return written
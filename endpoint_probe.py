@@ -0,0 +1,297 @@
+"""
+Endpoint Health Probe
+Tests the Commvault endpoints behind /api/config concurrently and caches the results with latency history
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import requests
+
+from api_metrics import call_recorder, new_run_id
+from commvault_client import CommvaultClient, load_api_settings
+from db_connections import get_connection_manager
+
+# Endpoints tested on the API configuration page
+PROBE_ENDPOINTS = [
+    '/Client',
+    '/StoragePolicy',
+    '/MediaAgent',
+    '/StoragePool',
+    '/Job',
+    '/Subclient',
+    '/Agent',
+    '/BackupSet',
+    '/Instance',
+    '/Schedule',
+    '/Library',
+    '/CommCell',
+    '/AlertRule',
+    '/V2/Client',
+    '/V2/StoragePolicy',
+    '/V2/MediaAgent',
+    '/V2/StoragePool',
+    '/V4/ServerInfo',
+    '/DDB',
+    '/Retention',
+]
+
+# Per-endpoint timeout, and the deadline for the whole sweep (seconds)
+PROBE_TIMEOUT = 10
+DEFAULT_PROBE_DEADLINE = 30
+DEFAULT_PROBE_WORKERS = 8
+
+# Cached results older than this are re-probed in the background when the page loads
+DEFAULT_PROBE_TTL = 900
+
+# Latency history kept per endpoint
+HISTORY_DAYS = 30
+
+_probe_lock = threading.Lock()
+_probe_thread = None
+
+
+def probe_endpoint(client, endpoint_path, timeout=PROBE_TIMEOUT):
+    """
+    GET one endpoint and summarise the response
+
+    Returns:
+        Dictionary with path, status, message, has_data, count, sample_data and latency_ms
+    """
+    endpoint_info = {
+        'path': endpoint_path,
+        'status': None,
+        'message': '',
+        'has_data': False,
+        'count': 0,
+        'sample_data': None,
+        'latency_ms': None
+    }
+
+    start_time = time.time()
+    try:
+        # Probes measure the live endpoint, so never answer them from the coalescer
+        r = client.get(endpoint_path, coalesce=False, timeout=timeout)
+        endpoint_info['latency_ms'] = int((time.time() - start_time) * 1000)
+
+        endpoint_info['status'] = r.status_code
+
+        if r.status_code == 200:
+            try:
+                data = r.json()
+
+                # Check if data is available
+                if isinstance(data, list):
+                    endpoint_info['has_data'] = len(data) > 0
+                    endpoint_info['count'] = len(data)
+                    endpoint_info['message'] = f'List with {len(data)} items'
+                    if len(data) > 0:
+                        endpoint_info['sample_data'] = json.dumps(data[0], indent=2)[:500]
+                elif isinstance(data, dict):
+                    # Check common data keys
+                    data_keys = ['clients', 'policies', 'mediaAgents', 'jobs', 'storagePools']
+                    for key in data_keys:
+                        if key in data:
+                            count = len(data[key]) if isinstance(data[key], list) else 1
+                            endpoint_info['has_data'] = count > 0
+                            endpoint_info['count'] = count
+                            endpoint_info['message'] = f'Dict with {count} {key}'
+                            if count > 0:
+                                sample = data[key][0] if isinstance(data[key], list) else data[key]
+                                endpoint_info['sample_data'] = json.dumps(sample, indent=2)[:500]
+                            break
+
+                    if not endpoint_info['has_data']:
+                        endpoint_info['message'] = f'Dict with keys: {", ".join(list(data.keys())[:5])}'
+                        endpoint_info['sample_data'] = json.dumps(data, indent=2)[:500]
+                else:
+                    endpoint_info['message'] = f'Response type: {type(data).__name__}'
+            except:
+                endpoint_info['message'] = f'Non-JSON response ({len(r.text)} bytes)'
+        elif r.status_code == 401:
+            endpoint_info['message'] = 'Unauthorized - Check permissions'
+        elif r.status_code == 404:
+            endpoint_info['message'] = 'Endpoint not found'
+        else:
+            endpoint_info['message'] = r.text[:100]
+
+    except requests.exceptions.Timeout:
+        endpoint_info['status'] = 'Timeout'
+        endpoint_info['message'] = f'Request timed out ({timeout}s)'
+        endpoint_info['latency_ms'] = int((time.time() - start_time) * 1000)
+    except Exception as e:
+        endpoint_info['status'] = 'Error'
+        endpoint_info['message'] = str(e)[:100]
+
+    return endpoint_info
+
+
+def run_probe(db_path, endpoints=None, deadline=DEFAULT_PROBE_DEADLINE, max_workers=DEFAULT_PROBE_WORKERS,
+              config_file='config.ini'):
+    """
+    Authenticate and probe all endpoints concurrently, then store the results
+
+    Endpoints still running when the deadline passes are recorded as timed out, so
+    one hung endpoint cannot hold up the sweep.
+
+    Returns:
+        runId of the stored probe run
+    """
+    endpoints = endpoints or PROBE_ENDPOINTS
+    settings = load_api_settings(config_file)
+    start_time = time.time()
+
+    auth_success = False
+    auth_error = None
+    client = CommvaultClient.from_config(config_file=config_file, run_id=new_run_id('probe'))
+    try:
+        token = client.authenticate(settings['username'], settings['password'])
+        response = client.login_response
+
+        if token:
+            auth_success = True
+        elif response.status_code == 200:
+            data = response.json()
+            auth_error = 'No token received'
+            if 'errList' in data:
+                auth_error = data['errList'][0].get('errLogMessage', 'Unknown error')
+        else:
+            auth_error = f'HTTP {response.status_code}'
+    except Exception as e:
+        auth_error = str(e)[:100]
+
+    results = []
+    timed_out = False
+    if auth_success:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {executor.submit(probe_endpoint, client, path): path for path in endpoints}
+        done, not_done = wait(futures, timeout=deadline)
+        # Stragglers finish on their own timeout; nobody waits for them
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        for future, path in futures.items():
+            if future in done:
+                results.append(future.result())
+            else:
+                timed_out = True
+                results.append({
+                    'path': path, 'status': 'Timeout', 'has_data': False, 'count': 0, 'sample_data': None,
+                    'message': f'No answer within the {deadline}s probe deadline', 'latency_ms': None
+                })
+    else:
+        for path in endpoints:
+            results.append({'path': path, 'status': 'N/A', 'message': 'No authentication token',
+                            'has_data': False, 'count': 0, 'sample_data': None, 'latency_ms': None})
+
+    probed_time = datetime.now().isoformat()
+    probed_epoch = int(time.time())
+
+    # Written through the process's single writer: waits its turn behind an in-app fetch instead of hitting a lock
+    with get_connection_manager(db_path).writer() as db:
+        cursor = db.execute(
+            """INSERT INTO endpoint_probe_runs (startTime, startEpoch, durationMs, authSuccess, authError, timedOut)
+            VALUES (?, ?, ?, ?, ?, ?)""",
+            (datetime.fromtimestamp(start_time).isoformat(), int(start_time), int((time.time() - start_time) * 1000),
+             1 if auth_success else 0, auth_error, 1 if timed_out else 0)
+        )
+        run_id = cursor.lastrowid
+
+        db.executemany("""
+            INSERT INTO endpoint_probe_results
+            (path, runId, status, message, hasData, count, sampleData, latencyMs, probedTime)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                runId = excluded.runId, status = excluded.status, message = excluded.message,
+                hasData = excluded.hasData, count = excluded.count, sampleData = excluded.sampleData,
+                latencyMs = excluded.latencyMs, probedTime = excluded.probedTime
+        """, [(r['path'], run_id, str(r['status']), r['message'], 1 if r['has_data'] else 0, r['count'],
+               r['sample_data'], r['latency_ms'], probed_time) for r in results])
+
+        if auth_success:
+            db.executemany(
+                """INSERT INTO endpoint_latency_history (path, runId, status, latencyMs, probedTime, probedEpoch)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                [(r['path'], run_id, str(r['status']), r['latency_ms'], probed_time, probed_epoch) for r in results]
+            )
+        db.execute("DELETE FROM endpoint_latency_history WHERE probedEpoch < ?",
+                   (probed_epoch - HISTORY_DAYS * 86400,))
+        # The probe's calls in api_call_metrics (calls still in flight past the deadline are written at exit)
+        call_recorder.flush(db, client.run_id)
+        db.commit()
+
+    return run_id
+
+
+def start_background_probe(db_path, **kwargs):
+    """
+    Start a probe in a background thread unless one is already running
+
+    Returns:
+        True if a new probe was started
+    """
+    global _probe_thread
+
+    with _probe_lock:
+        if _probe_thread and _probe_thread.is_alive():
+            return False
+
+        def target():
+            try:
+                run_probe(db_path, **kwargs)
+            except Exception as e:
+                print(f"[PROBE] Error: {str(e)}")
+
+        _probe_thread = threading.Thread(target=target, name='endpoint-probe', daemon=True)
+        _probe_thread.start()
+        return True
+
+
+def probe_running():
+    """True while a background probe is in progress"""
+    return bool(_probe_thread and _probe_thread.is_alive())
+
+
+def load_probe_results(db, history_points=10):
+    """
+    Last probe run and per-endpoint results, for rendering
+
+    Returns:
+        Tuple of (run dict or None, list of endpoint dicts). Each endpoint carries its most
+        recent latencies (oldest first) under 'latency_history'.
+    """
+    run = db.execute(
+        "SELECT runId, startTime, startEpoch, durationMs, authSuccess, authError, timedOut "
+        "FROM endpoint_probe_runs ORDER BY runId DESC LIMIT 1"
+    ).fetchone()
+    if not run:
+        return None, []
+    run = dict(zip(['runId', 'startTime', 'startEpoch', 'durationMs', 'authSuccess', 'authError', 'timedOut'], run))
+
+    order = {path: idx for idx, path in enumerate(PROBE_ENDPOINTS)}
+    endpoints = []
+    for row in db.execute(
+        "SELECT path, status, message, hasData, count, sampleData, latencyMs, probedTime FROM endpoint_probe_results"
+    ).fetchall():
+        status = row[1]
+        endpoints.append({
+            'path': row[0],
+            'status': int(status) if status and status.isdigit() else status,
+            'message': row[2],
+            'has_data': bool(row[3]),
+            'count': row[4],
+            'sample_data': row[5],
+            'latency_ms': row[6],
+            'probed_time': row[7],
+            'latency_history': [
+                latency for (latency,) in reversed(db.execute(
+                    """SELECT latencyMs FROM endpoint_latency_history
+                    WHERE path = ? AND latencyMs IS NOT NULL ORDER BY probedEpoch DESC, id DESC LIMIT ?""",
+                    (row[0], history_points)
+                ).fetchall())
+            ]
+        })
+    endpoints.sort(key=lambda e: order.get(e['path'], len(order)))
+    return run, endpoints
@@ -0,0 +1,86 @@
+"""
+Endpoint Variant Discovery
+Remembers which URL variant and response shape each CommServe version answers, so callers stop probing dead URLs
+"""
+
+from datetime import datetime
+
+# Response keys that hold the record list, per capability, in the order they are checked when the
+# key recorded for the CommServe's working variant is unknown or empty
+LIST_KEYS = {
+    'events': ['commCellEvents', 'events', 'eventList'],
+    'alerts': ['alertList', 'alerts', 'definitions'],
+    'libraries': ['response', 'libraryList', 'libraries'],
+}
+
+
+def commserve_version(db):
+    """CommServe version from commcell_info ('' until it has been fetched)"""
+    try:
+        row = db.execute("SELECT commserveVersion FROM commcell_info WHERE id = 1").fetchone()
+    except Exception:
+        return ''
+    return str(row[0] or '') if row else ''
+
+
+def find_list(payload, capability, list_key=None):
+    """
+    Locate the record list in a payload
+
+    Args:
+        payload: Parsed response
+        capability: Key of LIST_KEYS
+        list_key: Key recorded for the working variant (get_variant()['listKey']), read first
+
+    Returns:
+        Tuple of (list_key, records). list_key is None for bare-list payloads.
+    """
+    if isinstance(payload, list):
+        return None, payload
+    if list_key and payload.get(list_key):
+        return list_key, payload[list_key]
+    for key in LIST_KEYS.get(capability, []):
+        records = payload.get(key)
+        if records:
+            return key, records
+    return None, []
+
+
+def get_variant(db, capability, version=None):
+    """Known-good variant for capability on this CommServe version, as a dict, or None"""
+    version = commserve_version(db) if version is None else version
+    row = db.execute(
+        "SELECT path, listKey, lastVerified FROM endpoint_variants WHERE capability = ? AND commserveVersion = ?",
+        (capability, version)
+    ).fetchone()
+    if not row:
+        return None
+    return {'path': row[0], 'listKey': row[1], 'lastVerified': row[2]}
+
+
+def ordered_variants(db, capability, candidates, version=None):
+    """
+    Candidate paths with the known-good variant first
+
+    Candidates sharing the known path (ignoring query parameters) move to the front;
+    the rest keep their order so a failing variant still falls through to a re-probe.
+    """
+    known = get_variant(db, capability, version)
+    if not known:
+        return list(candidates)
+    first = [path for path in candidates if path.split('?')[0] == known['path']]
+    return first + [path for path in candidates if path not in first]
+
+
+def record_variant(db, capability, path, payload=None, version=None):
+    """Remember that path (and the list key found in payload) works for this CommServe version"""
+    version = commserve_version(db) if version is None else version
+    list_key = find_list(payload, capability)[0] if payload is not None else None
+    db.execute("""
+        INSERT INTO endpoint_variants (capability, commserveVersion, path, listKey, lastVerified)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(capability, commserveVersion) DO UPDATE SET
+            path = excluded.path,
+            listKey = excluded.listKey,
+            lastVerified = excluded.lastVerified
+    """, (capability, version, path.split('?')[0], list_key, datetime.now().isoformat()))
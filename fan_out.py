@@ -0,0 +1,76 @@
+"""
+Bounded Fan-Out
+Runs one API call per item on a capped worker pool with per-item retry
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+# Threads per fan-out; the CommServe's shared limiter (host_limiter) decides how many requests are sent at once
+DEFAULT_FAN_OUT_WORKERS = 8
+
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 1.0
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def should_retry(result):
+    """Default retry test: HTTP responses with a retryable status"""
+    return getattr(result, 'status_code', None) in RETRY_STATUSES
+
+
+def _call_with_retry(item, fetch, retries, backoff, retry_if):
+    attempt = 0
+    while True:
+        try:
+            result = fetch(item)
+        except requests.exceptions.RequestException:
+            if attempt >= retries:
+                raise
+        else:
+            if attempt >= retries or not retry_if(result):
+                return result
+        attempt += 1
+        time.sleep(backoff * (2 ** (attempt - 1)))
+
+
+def fan_out(items, fetch, max_workers=DEFAULT_FAN_OUT_WORKERS, retries=DEFAULT_RETRIES,
+            backoff=DEFAULT_BACKOFF, retry_if=should_retry):
+    """
+    Call fetch(item) for every item concurrently
+
+    Connection errors and results matching retry_if are retried up to `retries` times
+    with exponential backoff. Results are yielded as they complete, so the caller can
+    save each one on its own thread while the rest are still in flight. Requests made
+    through CommvaultClient are paced by the CommServe's shared host limiter.
+
+    Args:
+        items: Items to fetch (e.g. library records)
+        fetch: Function taking an item and returning its result (e.g. a Response)
+        max_workers: Maximum calls in flight at once
+        retries: Retries per item
+        backoff: Seconds before the first retry (doubled each time)
+        retry_if: Function taking a result and returning True to retry it
+
+    Yields:
+        Tuples of (item, result, error). error is None on success; result is None on error.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(_call_with_retry, item, fetch, retries, backoff, retry_if): item
+            for item in items
+        }
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
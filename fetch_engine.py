@@ -0,0 +1,326 @@
+"""
+Concurrent Fetch Engine
+Pulls independent Commvault endpoints in parallel while a single writer saves them to SQLite
+"""
+
+import copy
+import hashlib
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+import requests
+
+from api_metrics import call_recorder, new_run_id
+from db_connections import ConnectionManager
+from endpoint_variants import commserve_version, ordered_variants, record_variant
+from sync_state import get_payload_hashes, get_sync_state, record_payload_hash, record_sync, touch_unchanged
+
+# Default number of endpoints fetched at the same time
+DEFAULT_MAX_WORKERS = 6
+
+# Default number of records requested per page from paged endpoints such as /Job
+DEFAULT_PAGE_SIZE = 1000
+
+# Records of a paged endpoint kept for the results preview
+PREVIEW_SIZE = 10
+
+# Stands in for the payload when the response body matches the last one saved
+UNCHANGED = object()
+
+
+class FetchTask:
+    """One data type to pull: candidate endpoint paths plus the saver that stores the payload"""
+
+    # Full payloads are kept for the results page; paged tasks keep a preview instead
+    list_key = None
+
+    # Successful runs are recorded in sync_state (one-off tasks such as backfill windows opt out)
+    track_sync = True
+
+    def __init__(self, name, paths, saver, label=None, delta=None, capability=None, tables=None, snapshot=None):
+        self.name = name
+        # Paths are tried in order until one returns HTTP 200 (e.g. /CommServ/Event then /Event)
+        self.paths = paths if isinstance(paths, list) else [paths]
+        self.saver = saver
+        self.label = label or name
+        # Optional DeltaSync: narrows the request to records newer than the sync_state mark
+        self.delta = delta
+        self.sync_state = None
+        # Optional endpoint_variants capability: the variant known to work on this CommServe is tried first
+        self.capability = capability
+        # Optional tables the saver writes (each with lastFetchTime): a response identical to the
+        # last one saved is then neither parsed nor saved, and only lastFetchTime is touched
+        self.tables = tables
+        self.payload_hashes = {}
+        # Optional snapshot(db, epoch) run after each error-free run, whether or not the response
+        # changed (e.g. appending capacity history from the tables the saver keeps)
+        self.snapshot = snapshot
+
+    def for_run(self, db):
+        """Copy of this task for one run, with paths narrowed from its sync_state mark"""
+        if not self.delta and not self.capability and not self.tables:
+            return self
+        task = copy.copy(self)
+        if self.delta:
+            task.sync_state = get_sync_state(db, self.name)
+            paths = self.delta.paths_for(task.sync_state)
+            task.paths = paths if isinstance(paths, list) else [paths]
+        if self.capability:
+            task.paths = ordered_variants(db, self.capability, task.paths)
+        if self.tables:
+            task.payload_hashes = get_payload_hashes(db, self.name)
+        return task
+
+    @property
+    def high_water_mark(self):
+        """Highest record id stored by the last successful sync"""
+        return self.sync_state.get('highWaterMark') if self.sync_state else None
+
+    def iter_payloads(self, client):
+        """
+        Fetch this task's data, yielding one item per HTTP request
+
+        Yields:
+            Tuples of (path, status_code, duration_ms, payload, body, digest). body is the raw
+            response bytes and digest their SHA-256; all three are None for failures. payload is
+            UNCHANGED when the body matches the last one saved for the path.
+        """
+        for path in self.paths:
+            start_time = time.time()
+            response = client.get(path)
+            duration = int((time.time() - start_time) * 1000)
+
+            if response.status_code == 200:
+                body = response.content
+                digest = hashlib.sha256(body).hexdigest()
+                previous = self.payload_hashes.get(path)
+                if previous and previous['hash'] == digest:
+                    yield path, response.status_code, duration, UNCHANGED, body, digest
+                else:
+                    yield path, response.status_code, duration, response.json(), body, digest
+                return
+
+            yield path, response.status_code, duration, None, None, None
+
+
+class PagedFetchTask(FetchTask):
+    """
+    Task for endpoints that support limit/offset paging (e.g. /Job)
+
+    Pages are handed to the writer one at a time, so memory stays bounded by the page
+    size no matter how many records the CommServe returns.
+    """
+
+    def __init__(self, name, path, saver, list_key, label=None, page_size=DEFAULT_PAGE_SIZE, delta=None):
+        super().__init__(name, path, saver, label=label, delta=delta)
+        self.list_key = list_key
+        self.page_size = page_size
+
+    def page_path(self, offset):
+        """Path for the page starting at offset"""
+        path = self.paths[0]
+        separator = '&' if '?' in path else '?'
+        return f"{path}{separator}limit={self.page_size}&offset={offset}"
+
+    def iter_payloads(self, client):
+        offset = 0
+        previous_first = None
+
+        while True:
+            path = self.page_path(offset)
+            start_time = time.time()
+            response = client.get(path)
+            duration = int((time.time() - start_time) * 1000)
+
+            if response.status_code != 200:
+                yield path, response.status_code, duration, None, None, None
+                return
+
+            page = response.json()
+            records = page.get(self.list_key, [])
+            total = page.get('totalRecordsWithoutPaging')
+            first = records[0] if records else None
+
+            # Older CommServes ignore limit/offset and return everything (or the same page)
+            if first is not None and first == previous_first:
+                return
+            body = response.content
+            yield path, response.status_code, duration, page, body, hashlib.sha256(body).hexdigest()
+
+            offset += len(records)
+            # A short page is the last one; a long page means paging was ignored
+            if len(records) != self.page_size:
+                return
+            if total is not None and offset >= int(total):
+                return
+            previous_first = first
+
+
+def _fetch_worker(task, client, out_queue, archive=None, commserve_version=''):
+    """Run one task in a worker thread and hand its payloads to the writer queue"""
+    try:
+        last_status = None
+        got_payload = False
+
+        for path, status_code, duration, payload, body, digest in task.iter_payloads(client):
+            last_status = status_code
+            if payload is not None:
+                got_payload = True
+                if archive is not None:
+                    # Compression and disk I/O stay on the worker, off the single writer
+                    archive.store(body, task.name, path, commserve_version, digest=digest)
+            out_queue.put(('response', task, path, status_code, duration, payload, digest))
+
+        # Path variants stop at the first 200, paged pulls at the first failed page: a task whose
+        # last request failed is incomplete even if earlier pages were saved, so its sync mark stays put
+        if last_status != 200:
+            if got_payload:
+                out_queue.put(('error', task, f"Page failed with status {last_status} after earlier pages were saved"))
+            else:
+                out_queue.put(('error', task, f"Failed with status {last_status}"))
+
+    except requests.exceptions.Timeout:
+        out_queue.put(('error', task, "Request timed out"))
+    except requests.exceptions.RequestException as e:
+        out_queue.put(('error', task, f"Request error: {str(e)}"))
+    except Exception as e:
+        out_queue.put(('error', task, f"Error: {str(e)}"))
+    finally:
+        out_queue.put(('done', task))
+
+
+@contextmanager
+def _writing(db):
+    """db itself, or the writer of a ConnectionManager held only for the block"""
+    if isinstance(db, ConnectionManager):
+        with db.writer() as connection:
+            yield connection
+    else:
+        yield db
+
+
+def run_fetch_tasks(client, tasks, db, max_workers=DEFAULT_MAX_WORKERS, on_request=None, archive=None,
+                    run_id=None):
+    """
+    Fetch all tasks concurrently and save each payload on the calling thread
+
+    Worker threads only do HTTP and JSON parsing. Every saver runs on the thread that
+    owns `db`, so SQLite only ever sees a single writer. Paged tasks contribute a short
+    preview to `results` rather than their full payload. Each task that finishes without
+    errors records its fetch time (and highest record id, for delta tasks) in sync_state
+    and then runs its snapshot hook.
+    The client records every request (failures included) in api_call_metrics; this run
+    tags them with run_id, adds the record count saved from each response and writes them.
+
+    Args:
+        client: Authenticated CommvaultClient (its pooled session is shared by all workers)
+        tasks: List of FetchTask
+        db: ConnectionManager whose single writer is taken only around each save and commit (other
+            writers get a turn while requests are in flight), or an open sqlite3 connection
+        max_workers: Maximum number of endpoints in flight at once
+        on_request: Optional callback(method, path, status_code, count, duration)
+        archive: Optional PayloadArchive that keeps a compressed copy of every raw payload
+        run_id: Id the calls are recorded under in api_call_metrics (default: the client's run_id,
+            else a new fetch-... id); the client keeps it for later calls
+
+    Returns:
+        Tuple of (results, counts, errors) dictionaries keyed by task name
+    """
+    results = {}
+    counts = {}
+    errors = {}
+
+    if not tasks:
+        return results, counts, errors
+
+    started_epoch = int(time.time())
+    with _writing(db) as connection:
+        tasks = [task.for_run(connection) for task in tasks]
+        version = commserve_version(connection) if archive is not None else ''
+    client.run_id = run_id or client.run_id or new_run_id('fetch')
+    marks = {}
+
+    # Bounded so fast fetchers cannot pile up unsaved payloads ahead of the writer
+    out_queue = queue.Queue(maxsize=max(2, max_workers * 2))
+    pending = len(tasks)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for task in tasks:
+            executor.submit(_fetch_worker, task, client, out_queue, archive, version)
+
+        while pending:
+            item = out_queue.get()
+            kind, task = item[0], item[1]
+
+            if kind == 'done':
+                pending -= 1
+
+            elif kind == 'error':
+                errors[task.name] = item[2]
+
+            elif kind == 'response':
+                path, status_code, duration, payload, digest = item[2:]
+                count = None
+
+                if payload is UNCHANGED:
+                    # Same body as the last save: nothing to parse or rewrite
+                    try:
+                        previous = task.payload_hashes[path]
+                        with _writing(db) as connection:
+                            touch_unchanged(connection, task.tables, previous['savedTime'])
+                            connection.commit()
+                        count = previous['recordCount'] or 0
+                        counts[task.name] = counts.get(task.name, 0) + count
+                    except Exception as e:
+                        errors[task.name] = f"Error: {str(e)}"
+
+                elif payload is not None:
+                    try:
+                        if task.delta:
+                            payload_mark = task.delta.max_id(payload)
+                            if payload_mark is not None:
+                                marks[task.name] = max(marks.get(task.name, 0), payload_mark)
+                            task.delta.drop_seen(payload, task.high_water_mark)
+
+                        # Commit per payload so a long paged pull never builds one huge transaction
+                        with _writing(db) as connection:
+                            if task.capability:
+                                record_variant(connection, task.capability, path, payload)
+                            saved_time = datetime.now().isoformat()
+                            count = task.saver(connection, payload)
+                            if task.tables:
+                                record_payload_hash(connection, task.name, path, digest, count, saved_time)
+                            connection.commit()
+                        counts[task.name] = counts.get(task.name, 0) + count
+
+                        if task.list_key:
+                            preview = results.setdefault(task.name, {task.list_key: []})[task.list_key]
+                            preview.extend(payload.get(task.list_key, [])[:PREVIEW_SIZE - len(preview)])
+                        else:
+                            results[task.name] = payload
+                    except Exception as e:
+                        errors[task.name] = f"Error: {str(e)}"
+
+                if count is not None:
+                    call_recorder.set_record_count(client.run_id, path, count)
+                if on_request:
+                    on_request('GET', path.split('?')[0], status_code, count, duration)
+
+    with _writing(db) as connection:
+        for task in tasks:
+            if task.name in counts and task.name not in errors:
+                if task.track_sync:
+                    record_sync(connection, task.name, started_epoch, marks.get(task.name), counts[task.name])
+                if task.snapshot:
+                    try:
+                        task.snapshot(connection, started_epoch)
+                    except Exception as e:
+                        errors[task.name] = f"Snapshot error: {str(e)}"
+
+        # Only this run's calls: a concurrent run's rows are still waiting for their record counts
+        call_recorder.flush(connection, client.run_id)
+        connection.commit()
+    return results, counts, errors
@@ -4,30 +4,20 @@ Retrieves event and alert data and saves to database
 """
 
 import requests
-import base64
-import configparser
 import sqlite3
 from datetime import datetime
 
-# Load configuration
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-BASE_URL = config.get('commvault', 'base_url')
-USERNAME = config.get('commvault', 'username')
-PASSWORD = config.get('commvault', 'password')
+from commvault_client import connect_from_config, load_api_settings
+from db_migrations import apply_migrations
+from endpoint_variants import find_list, get_variant, ordered_variants, record_variant
 
-# Create authorization header
-auth_string = f"{USERNAME}:{PASSWORD}"
-auth_bytes = auth_string.encode('ascii')
-base64_bytes = base64.b64encode(auth_bytes)
-base64_auth = base64_bytes.decode('ascii')
+# Load configuration
+BASE_URL = load_api_settings()['base_url']
 
-headers = {
-    'Authorization': f'Basic {base64_auth}',
-    'Accept': 'application/json',
-    'Content-Type': 'application/json'
-}
+# Log in once; every request below reuses the client's pooled session and token
+client = connect_from_config()
+if client is None:
+    raise SystemExit("Authentication failed - check [commvault] settings in config.ini")
 
 print("=" * 100)
 print("FETCHING EVENTS AND ALERTS FROM COMMVAULT API")
@@ -38,21 +28,14 @@ print()
 
 # Connect to database
 conn = sqlite3.connect('Database/commvault.db')
+apply_migrations(conn)
 cur = conn.cursor()
 
 # Function to save events to database
-def save_events_to_db(events_json):
-    """Save Events data to database"""
+def save_events_to_db(events_list):
+    """Save a list of event records to database"""
     count = 0
 
-    # Try different response formats
-    events_list = events_json.get("commCellEvents", [])
-    if not events_list:
-        events_list = events_json.get("events", [])
-
-    if not events_list and isinstance(events_json, list):
-        events_list = events_json
-
     for event_entry in events_list:
         try:
             cur.execute(
@@ -81,17 +64,10 @@ def save_events_to_db(events_json):
     return count
 
 # Function to save alerts to database
-def save_alerts_to_db(alerts_json):
-    """Save Alerts data to database"""
+def save_alerts_to_db(alerts_list):
+    """Save a list of alert records to database"""
     count = 0
 
-    alerts_list = alerts_json.get("alertList", [])
-    if not alerts_list:
-        alerts_list = alerts_json.get("alerts", [])
-
-    if not alerts_list and isinstance(alerts_json, list):
-        alerts_list = alerts_json
-
     for alert_entry in alerts_list:
         try:
             cur.execute(
@@ -136,12 +112,17 @@ event_endpoints = [
     ("/Events", "Events endpoint")
 ]
 
-for endpoint, description in event_endpoints:
+# The variant that worked last time on this CommServe version is tried first, and the
+# list key recorded with it is read directly
+known_events = get_variant(conn, "events")
+event_descriptions = dict(event_endpoints)
+for endpoint in ordered_variants(conn, "events", [path for path, _ in event_endpoints]):
+    description = event_descriptions[endpoint]
     print(f"Trying: {BASE_URL}{endpoint}")
     print(f"  Description: {description}")
 
     try:
-        response = requests.get(f"{BASE_URL}{endpoint}", headers=headers, verify=False, timeout=30)
+        response = client.get(endpoint)
 
         print(f"  Response Status: {response.status_code}")
 
@@ -157,31 +138,21 @@ for endpoint, description in event_endpoints:
                     keys = list(data.keys())
                     print(f"  Response keys: {keys[:10]}")
 
-                    # Look for event data
-                    events_list = data.get("commCellEvents", [])
-                    if not events_list:
-                        events_list = data.get("events", [])
-                    if not events_list:
-                        events_list = data.get("eventList", [])
-
-                    if events_list:
-                        print(f"  Found {len(events_list)} events")
-                        count = save_events_to_db(data)
-                        events_count += count
-                        print(f"  Saved {count} events to database")
-                        events_fetched = True
-                        print()
-                        break
-                    else:
-                        print(f"  No event list found in response")
-                elif isinstance(data, list):
-                    print(f"  Found {len(data)} events (list format)")
-                    count = save_events_to_db(data)
+                # Look for event data
+                list_key, events_list = find_list(data, "events", known_events['listKey'] if known_events else None)
+
+                if events_list:
+                    print(f"  Found {len(events_list)} events" + (" (list format)" if list_key is None else ""))
+                    count = save_events_to_db(events_list)
                     events_count += count
                     print(f"  Saved {count} events to database")
                     events_fetched = True
+                    record_variant(conn, "events", endpoint, data)
+                    conn.commit()
                     print()
                     break
+                else:
+                    print(f"  No event list found in response")
             else:
                 print(f"  Empty response")
         else:
@@ -222,12 +193,15 @@ alert_endpoints = [
     ("/AlertDefinition", "Alert definition endpoint")
 ]
 
-for endpoint, description in alert_endpoints:
+known_alerts = get_variant(conn, "alerts")
+alert_descriptions = dict(alert_endpoints)
+for endpoint in ordered_variants(conn, "alerts", [path for path, _ in alert_endpoints]):
+    description = alert_descriptions[endpoint]
     print(f"Trying: {BASE_URL}{endpoint}")
     print(f"  Description: {description}")
 
     try:
-        response = requests.get(f"{BASE_URL}{endpoint}", headers=headers, verify=False, timeout=30)
+        response = client.get(endpoint)
 
         print(f"  Response Status: {response.status_code}")
 
@@ -241,31 +215,21 @@ for endpoint, description in alert_endpoints:
                     keys = list(data.keys())
                     print(f"  Response keys: {keys[:10]}")
 
-                    # Look for alert data
-                    alerts_list = data.get("alertList", [])
-                    if not alerts_list:
-                        alerts_list = data.get("alerts", [])
-                    if not alerts_list:
-                        alerts_list = data.get("definitions", [])
-
-                    if alerts_list:
-                        print(f"  Found {len(alerts_list)} alerts")
-                        count = save_alerts_to_db(data)
-                        alerts_count += count
-                        print(f"  Saved {count} alerts to database")
-                        alerts_fetched = True
-                        print()
-                        break
-                    else:
-                        print(f"  No alert list found in response")
-                elif isinstance(data, list):
-                    print(f"  Found {len(data)} alerts (list format)")
-                    count = save_alerts_to_db(data)
+                # Look for alert data
+                list_key, alerts_list = find_list(data, "alerts", known_alerts['listKey'] if known_alerts else None)
+
+                if alerts_list:
+                    print(f"  Found {len(alerts_list)} alerts" + (" (list format)" if list_key is None else ""))
+                    count = save_alerts_to_db(alerts_list)
                     alerts_count += count
                     print(f"  Saved {count} alerts to database")
                     alerts_fetched = True
+                    record_variant(conn, "alerts", endpoint, data)
+                    conn.commit()
                     print()
                     break
+                else:
+                    print(f"  No alert list found in response")
             else:
                 print(f"  Empty response")
         else:
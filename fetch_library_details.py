@@ -4,31 +4,19 @@ Retrieves comprehensive information about storage libraries including Quantum Ac
 """
 
 import requests
-import base64
-import configparser
 import sqlite3
 from datetime import datetime
 import json
 
+from commvault_client import connect_from_config, load_api_settings
+
 # Load configuration
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-BASE_URL = config.get('commvault', 'base_url')
-USERNAME = config.get('commvault', 'username')
-PASSWORD = config.get('commvault', 'password')
-
-# Create authorization header
-auth_string = f"{USERNAME}:{PASSWORD}"
-auth_bytes = auth_string.encode('ascii')
-base64_bytes = base64.b64encode(auth_bytes)
-base64_auth = base64_bytes.decode('ascii')
-
-headers = {
-    'Authorization': f'Basic {base64_auth}',
-    'Accept': 'application/json',
-    'Content-Type': 'application/json'
-}
+BASE_URL = load_api_settings()['base_url']
+
+# Log in once; every request below reuses the client's pooled session and token
+client = connect_from_config()
+if client is None:
+    raise SystemExit("Authentication failed - check [commvault] settings in config.ini")
 
 print("=" * 100)
 print("FETCHING LIBRARY DETAILS FROM COMMVAULT API")
@@ -77,7 +65,7 @@ for endpoint, description in library_endpoints:
     print(f"  Description: {description}")
 
     try:
-        response = requests.get(f"{BASE_URL}{endpoint}", headers=headers, verify=False, timeout=30)
+        response = client.get(endpoint)
 
         print(f"  Response Status: {response.status_code}")
 
@@ -137,7 +125,7 @@ if libraries_data:
         detail_endpoint = f"/Library/{lib_id}"
 
         try:
-            detail_response = requests.get(f"{BASE_URL}{detail_endpoint}", headers=headers, verify=False, timeout=30)
+            detail_response = client.get(detail_endpoint)
 
             if detail_response.status_code == 200:
                 detail_data = detail_response.json()
@@ -190,7 +178,7 @@ else:
         detail_endpoint = f"/Library/{lib_id}"
 
         try:
-            detail_response = requests.get(f"{BASE_URL}{detail_endpoint}", headers=headers, verify=False, timeout=30)
+            detail_response = client.get(detail_endpoint)
 
             print(f"  Response Status: {detail_response.status_code}")
 
@@ -3,33 +3,30 @@ Fetch Complete Storage Estate Information from Commvault API
 Collects libraries, storage pools, mount paths, and relationships
 """
 
-import requests
-import base64
-import configparser
 import sqlite3
 from datetime import datetime
 import json
 
+from capacity_history import record_capacity_snapshot
+from commvault_client import connect_from_config, load_api_settings
+from db_migrations import apply_migrations
+from endpoint_variants import find_list, get_variant, ordered_variants, record_variant
+from fan_out import fan_out
+
 # Load configuration
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-BASE_URL = config.get('commvault', 'base_url')
-USERNAME = config.get('commvault', 'username')
-PASSWORD = config.get('commvault', 'password')
-
-# Create authorization header
-auth_string = f"{USERNAME}:{PASSWORD}"
-auth_bytes = auth_string.encode('ascii')
-base64_bytes = base64.b64encode(auth_bytes)
-base64_auth = base64_bytes.decode('ascii')
-
-headers = {
-    'Authorization': f'Basic {base64_auth}',
-    'Accept': 'application/json',
-    'Content-Type': 'application/json'
+SETTINGS = load_api_settings()
+BASE_URL = SETTINGS['base_url']
+
+# Detail calls run in parallel; the client's host limiter paces them per CommServe
+FAN_OUT = {
+    'max_workers': SETTINGS['fan_out_workers']
 }
 
+# Log in once; every request below reuses the client's pooled session and token
+client = connect_from_config()
+if client is None:
+    raise SystemExit("Authentication failed - check [commvault] settings in config.ini")
+
 print("=" * 100)
 print("FETCHING COMPLETE STORAGE ESTATE INFORMATION")
 print("=" * 100)
@@ -41,59 +38,11 @@ print()
 conn = sqlite3.connect('Database/commvault.db')
 cur = conn.cursor()
 
-# Update libraries table schema to include more fields
+# Storage estate tables (storage_libraries, pool_library_mapping, storage_write_patterns)
+# come from the schema migrations
 print("Updating database schema...")
 try:
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS storage_libraries (
-            libraryId        INTEGER PRIMARY KEY,
-            libraryName      TEXT NOT NULL,
-            libraryType      TEXT,
-            libraryTypeDesc  TEXT,
-            mediaAgentId     INTEGER,
-            mediaAgentName   TEXT,
-            status           TEXT,
-            capacity         INTEGER,
-            freeSpace        INTEGER,
-            usedSpace        INTEGER,
-            usedPercent      REAL,
-            vendorType       INTEGER,
-            storageClass     TEXT,
-            mountPath        TEXT,
-            isCloudStorage   INTEGER,
-            isDedupe         INTEGER,
-            lastFetchTime    TEXT
-        )
-    """)
-
-    # Create storage pool to library mapping table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS pool_library_mapping (
-            storagePoolId    INTEGER,
-            libraryId        INTEGER,
-            mappingDate      TEXT,
-            PRIMARY KEY (storagePoolId, libraryId),
-            FOREIGN KEY (storagePoolId) REFERENCES storage_pools(storagePoolId),
-            FOREIGN KEY (libraryId) REFERENCES storage_libraries(libraryId)
-        )
-    """)
-
-    # Create storage write operations table (what writes to what)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS storage_write_patterns (
-            planId           INTEGER,
-            planName         TEXT,
-            storagePoolId    INTEGER,
-            storagePoolName  TEXT,
-            libraryId        INTEGER,
-            libraryName      TEXT,
-            copyType         TEXT,
-            retentionDays    INTEGER,
-            lastFetchTime    TEXT
-        )
-    """)
-
-    conn.commit()
+    apply_migrations(conn)
     print("Database schema updated successfully")
     print()
 except Exception as e:
@@ -124,18 +73,26 @@ library_endpoints = [
     "/V4/Library"
 ]
 
-for endpoint in library_endpoints:
+# Go straight to the variant that worked last time on this CommServe version
+known_variant = get_variant(conn, "libraries")
+if known_variant:
+    print(f"Known working endpoint for this CommServe version: {known_variant['path']}")
+
+for endpoint in ordered_variants(conn, "libraries", library_endpoints):
     try:
         print(f"Trying endpoint: {endpoint}")
-        response = requests.get(f"{BASE_URL}{endpoint}", headers=headers, verify=False, timeout=30)
+        response = client.get(endpoint)
 
         if response.status_code == 200:
             data = response.json()
-            lib_list = data.get("libraryList", data.get("libraries", data if isinstance(data, list) else []))
+            # Newer CommServes return "response" entries with entityInfo; older ones libraryList/libraries
+            list_key, lib_list = find_list(data, "libraries", known_variant['listKey'] if known_variant else None)
 
             if lib_list:
                 print(f"✓ Found {len(lib_list)} libraries")
                 libraries_data = lib_list
+                record_variant(conn, "libraries", endpoint, data)
+                conn.commit()
                 break
         else:
             print(f"  Status: {response.status_code}")
@@ -158,15 +115,28 @@ print("STEP 2: FETCHING DETAILED LIBRARY INFORMATION")
 print("=" * 100)
 print()
 
-for idx, lib in enumerate(libraries_data, 1):
-    lib_id = lib.get("libraryId") or lib.get("id")
-    lib_name = lib.get("libraryName") or lib.get("name")
+def library_id_and_name(lib):
+    """Library id and name from either the entityInfo or the older flat structure"""
+    lib_info = lib.get("entityInfo", lib)
+    return lib_info.get("libraryId") or lib_info.get("id"), lib_info.get("libraryName") or lib_info.get("name")
+
+
+def fetch_library_detail(lib):
+    return client.get(f"/Library/{library_id_and_name(lib)[0]}")
+
+
+# Details for every library are fetched in parallel; each one is saved here as it arrives
+for idx, (lib, response, error) in enumerate(fan_out(libraries_data, fetch_library_detail, **FAN_OUT), 1):
+    lib_id, lib_name = library_id_and_name(lib)
 
     print(f"[{idx}/{len(libraries_data)}] {lib_name} (ID: {lib_id})")
 
-    try:
-        response = requests.get(f"{BASE_URL}/Library/{lib_id}", headers=headers, verify=False, timeout=30)
+    if error:
+        print(f"  Error: {error}")
+        print()
+        continue
 
+    try:
         if response.status_code == 200:
             detail_data = response.json()
 
@@ -219,6 +189,11 @@ for idx, lib in enumerate(libraries_data, 1):
 
     print()
 
+# Library capacity history (hourly/daily rollups feed the aging trend report)
+samples = record_capacity_snapshot(conn, ['library'])
+print(f"Recorded {samples} library capacity samples")
+print()
+
 conn.commit()
 
 # Step 3: Map storage pools to libraries
@@ -237,12 +212,19 @@ print()
 # Try to get pool details via API to find library associations
 pool_library_map = {}
 
-for pool_id, pool_name in pools[:10]:  # Sample first 10 to avoid timeout
+def fetch_pool_detail(pool):
+    return client.get(f"/StoragePool/{pool[0]}")
+
+
+# Every pool is checked (no longer sampled) - the fan-out keeps the run short
+for (pool_id, pool_name), response, error in fan_out(pools, fetch_pool_detail, **FAN_OUT):
     print(f"Checking pool: {pool_name} (ID: {pool_id})")
 
-    try:
-        response = requests.get(f"{BASE_URL}/StoragePool/{pool_id}", headers=headers, verify=False, timeout=30)
+    if error:
+        print(f"  Error: {error}")
+        continue
 
+    try:
         if response.status_code == 200:
             pool_data = response.json()
 
@@ -0,0 +1,189 @@
+"""
+Per-Host Request Limiter
+Token-bucket rate limit plus AIMD adaptive concurrency shared by every caller of one CommServe
+"""
+
+import threading
+import time
+from urllib.parse import urlparse
+
+# Requests per second sent to one CommServe host (0 = unlimited), and how many may go out back to back
+DEFAULT_REQUESTS_PER_SECOND = 10
+DEFAULT_BURST = 5
+
+# Requests in flight to one host: starts at the initial limit and adapts between min and max
+DEFAULT_INITIAL_CONCURRENCY = 4
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 16
+
+# A request taking longer than this fraction of its timeout counts as a sign of overload
+DEFAULT_SLOW_FRACTION = 0.5
+
+# Throttling and overload responses that halve the concurrency limit
+BACKOFF_STATUSES = {429, 500, 502, 503, 504}
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """Token bucket: `rate_per_second` tokens a second, holding at most `burst`, shared across threads"""
+
+    def __init__(self, rate_per_second=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._bucket_lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def acquire_token(self):
+        """Block until a token is available and take it"""
+        while True:
+            if not self.rate_per_second:
+                return
+            with self._bucket_lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate_per_second
+            time.sleep(wait)
+
+    def acquire(self):
+        """Block until this caller may send its request"""
+        self.acquire_token()
+
+
+class AdaptiveLimiter(RateLimiter):
+    """
+    Token bucket plus a concurrency limit tuned by AIMD
+
+    Every fast, successful response raises the concurrency limit by 1/limit (about +1 per
+    round of requests). A throttling or 5xx response, a connection error or timeout, or a
+    response slower than `slow_fraction` of its timeout halves it - at most once per
+    average response time, so one burst of failures counts once.
+
+    Callers pair acquire() with release(); release() reports how the request went.
+    """
+
+    def __init__(self, rate_per_second=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST,
+                 initial_concurrency=DEFAULT_INITIAL_CONCURRENCY, min_concurrency=DEFAULT_MIN_CONCURRENCY,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, slow_fraction=DEFAULT_SLOW_FRACTION):
+        super().__init__(rate_per_second, burst)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.slow_fraction = slow_fraction
+        self.limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.in_flight = 0
+        self.avg_latency = None
+        self.slowdowns = 0
+        self.last_slowdown = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def configure(self, rate_per_second=None, burst=None, min_concurrency=None, max_concurrency=None,
+                  slow_fraction=None):
+        """Change settings in place (None keeps the current value)"""
+        with self._cond:
+            if rate_per_second is not None:
+                self.rate_per_second = rate_per_second
+            if burst is not None:
+                self.burst = burst
+            if min_concurrency is not None:
+                self.min_concurrency = min_concurrency
+            if max_concurrency is not None:
+                self.max_concurrency = max_concurrency
+            if slow_fraction is not None:
+                self.slow_fraction = slow_fraction
+            self.limit = min(max(self.limit, self.min_concurrency), self.max_concurrency)
+            self._cond.notify_all()
+
+    def acquire(self):
+        """Block until a concurrency slot and a token are free"""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        try:
+            self.acquire_token()
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self, status_code=None, latency=None, timeout=None, failed=False):
+        """
+        Free the caller's slot and adjust the limit
+
+        Args:
+            status_code: HTTP status of the response (None if unknown)
+            latency: Seconds the request took
+            timeout: Timeout the request was sent with, to judge slowness
+            failed: True for connection errors and timeouts
+        """
+        with self._cond:
+            self.in_flight -= 1
+
+            if latency is not None:
+                self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+
+            slow = bool(latency is not None and timeout and latency > timeout * self.slow_fraction)
+            if failed or slow or status_code in BACKOFF_STATUSES:
+                now = time.monotonic()
+                if now - self._last_decrease >= max(1.0, self.avg_latency or 0):
+                    self.limit = max(float(self.min_concurrency), self.limit / 2)
+                    self._last_decrease = now
+                    self.slowdowns += 1
+                    self.last_slowdown = time.time()
+            elif status_code is not None and status_code < 400:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+
+            self._cond.notify_all()
+
+    def limits(self):
+        """Current limits and state, for display"""
+        with self._cond:
+            return {
+                'concurrency_limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'min_concurrency': self.min_concurrency,
+                'max_concurrency': self.max_concurrency,
+                'requests_per_second': self.rate_per_second,
+                'burst': self.burst,
+                'avg_latency_ms': int(self.avg_latency * 1000) if self.avg_latency is not None else None,
+                'slowdowns': self.slowdowns,
+                'last_slowdown': self.last_slowdown
+            }
+
+
+def host_key(host):
+    """Limiter key for a URL or host name"""
+    return urlparse(host).netloc or host
+
+
+def get_host_limiter(host, **settings):
+    """
+    Process-wide limiter for a host (a URL or host name)
+
+    Keyword settings (rate_per_second, burst, min_concurrency, max_concurrency,
+    slow_fraction) are applied to the limiter, creating it if needed.
+    """
+    key = host_key(host)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = AdaptiveLimiter()
+    if settings:
+        limiter.configure(**settings)
+    return limiter
+
+
+def all_host_limits():
+    """Current limits for every host seen so far, as {host: limits dict}"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {host: limiter.limits() for host, limiter in limiters.items()}
@@ -0,0 +1,258 @@
+"""
+Background Ingestion Scheduler
+Refreshes each Commvault entity type on its own interval so dashboards never wait on a /fetch
+
+Runs inside app.py when [scheduler] enabled = true, or as a sidecar process:
+    python ingest_scheduler.py
+"""
+
+import configparser
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from commvault_client import CONFIG_FILE, connect_from_config
+from db_connections import get_connection_manager
+from fetch_engine import run_fetch_tasks
+from sync_state import get_sync_state
+
+# Default refresh interval (seconds) per FETCH_TASKS entity; 0 disables an entity
+DEFAULT_INTERVALS = {
+    'events': 60,
+    'alerts': 60,
+    'active_jobs': 60,        # Running/pending/waiting jobs only
+    'jobs_enhanced': 300,     # Newly finished jobs (delta /Job pull into jobs and jobs_enhanced)
+    'storage_pools': 900,
+    'mediaagents': 900,
+    'commcell_info': 900,
+    'plans': 3600,
+    'libraries': 3600,
+    'hypervisors': 3600,
+    'clients': 3600,
+    'storage': 3600,
+    'storage_arrays': 3600,
+}
+
+# Entities refreshed at the same time
+DEFAULT_MAX_PARALLEL = 4
+
+# How often the scheduler checks for due entities
+TICK_SECONDS = 5
+
+def load_schedule(config_file=CONFIG_FILE):
+    """
+    Load scheduler settings from config.ini
+
+    [scheduler] holds enabled / max_parallel; [schedule] overrides per-entity intervals,
+    e.g. `events = 120`.
+
+    Returns:
+        Dictionary with enabled, max_parallel and intervals
+    """
+    config = configparser.ConfigParser()
+    if os.path.exists(config_file):
+        config.read(config_file)
+
+    intervals = dict(DEFAULT_INTERVALS)
+    if config.has_section('schedule'):
+        for entity, seconds in config.items('schedule'):
+            intervals[entity] = int(seconds)
+
+    return {
+        'enabled': config.get('scheduler', 'enabled', fallback='false').lower() == 'true',
+        'max_parallel': config.getint('scheduler', 'max_parallel', fallback=DEFAULT_MAX_PARALLEL),
+        'intervals': intervals
+    }
+
+
+class IngestScheduler:
+    """
+    Runs fetch tasks on per-entity intervals in background threads
+
+    Each entity is refreshed with its own client; all runs write through the process's
+    single writer, taken per save so one entity's HTTP time never holds up another's. An
+    entity whose previous
+    run is still going when it falls due again is skipped (recorded in ingest_runs)
+    instead of being started twice.
+
+    Args:
+        tasks: Dictionary of entity name -> FetchTask (app.FETCH_TASKS)
+        db_path: SQLite database path
+        intervals: Dictionary of entity name -> seconds (entities missing or 0 are not scheduled)
+        max_parallel: Maximum number of entities refreshed at once
+        client_factory: Callable returning an authenticated CommvaultClient, or None
+        archive: Optional PayloadArchive that keeps every fetched payload
+    """
+
+    def __init__(self, tasks, db_path, intervals=None, max_parallel=DEFAULT_MAX_PARALLEL,
+                 client_factory=connect_from_config, archive=None):
+        intervals = intervals if intervals is not None else DEFAULT_INTERVALS
+        self.tasks = tasks
+        self.db_path = db_path
+        self.connections = get_connection_manager(db_path)
+        self.intervals = {entity: seconds for entity, seconds in intervals.items()
+                          if seconds and entity in tasks}
+        self.client_factory = client_factory
+        self.archive = archive
+        self.next_due = {}
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_parallel))
+
+    def _initial_due_times(self):
+        """First due time per entity: one interval after its last successful sync"""
+        with self.connections.reader() as db:
+            now = time.time()
+            for entity, interval in self.intervals.items():
+                try:
+                    state = get_sync_state(db, entity)
+                except sqlite3.OperationalError:
+                    state = None
+                last = state['lastSuccessEpoch'] if state and state.get('lastSuccessEpoch') else 0
+                self.next_due[entity] = max(now, last + interval)
+
+    def _record_skip(self, entity):
+        with self.connections.writer() as db:
+            db.execute(
+                "INSERT INTO ingest_runs (entity, status, startTime, errorMessage) VALUES (?, ?, ?, ?)",
+                (entity, 'skipped', datetime.now().isoformat(), 'Previous run still in progress')
+            )
+            db.commit()
+
+    def run_pending(self, now=None):
+        """
+        Start every entity that is due
+
+        Returns:
+            List of entity names started
+        """
+        now = now if now is not None else time.time()
+        started = []
+
+        for entity, interval in self.intervals.items():
+            if now < self.next_due.get(entity, 0):
+                continue
+            self.next_due[entity] = now + interval
+
+            with self._lock:
+                busy = entity in self._running
+                if not busy:
+                    self._running.add(entity)
+
+            if busy:
+                print(f"[SCHEDULER] {entity}: previous run still going, skipping")
+                self._record_skip(entity)
+                continue
+
+            self._executor.submit(self.run_entity, entity)
+            started.append(entity)
+
+        return started
+
+    def run_entity(self, entity):
+        """Refresh one entity now and record the run in ingest_runs"""
+        with self._lock:
+            self._running.add(entity)
+
+        start_time = time.time()
+        status = 'failed'
+        record_count = None
+        error_message = None
+
+        try:
+            with self.connections.writer() as db:
+                cursor = db.execute(
+                    "INSERT INTO ingest_runs (entity, status, startTime) VALUES (?, ?, ?)",
+                    (entity, 'running', datetime.fromtimestamp(start_time).isoformat())
+                )
+                run_id = cursor.lastrowid
+                db.commit()
+
+            try:
+                client = self.client_factory()
+                if client is None:
+                    error_message = 'Authentication failed'
+                else:
+                    # Calls are recorded in api_call_metrics under the ingest_runs id
+                    _, counts, errors = run_fetch_tasks(client, [self.tasks[entity]], self.connections,
+                                                      max_workers=1, archive=self.archive,
+                                                      run_id=f"scheduler-{run_id}")
+                    record_count = counts.get(entity, 0)
+                    if entity in errors:
+                        error_message = errors[entity]
+                    else:
+                        status = 'success'
+            except Exception as e:
+                error_message = f"Error: {str(e)}"
+
+            duration = int((time.time() - start_time) * 1000)
+            with self.connections.writer() as db:
+                db.execute(
+                    """UPDATE ingest_runs SET status = ?, endTime = ?, durationMs = ?, recordCount = ?, errorMessage = ?
+                    WHERE runId = ?""",
+                    (status, datetime.now().isoformat(), duration, record_count, error_message, run_id)
+                )
+                db.commit()
+
+            if status == 'success':
+                print(f"[SCHEDULER] {entity}: {record_count} records in {duration}ms")
+            else:
+                print(f"[SCHEDULER] {entity}: {error_message}")
+        finally:
+            with self._lock:
+                self._running.discard(entity)
+
+        return status
+
+    def _loop(self):
+        self._initial_due_times()
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"[SCHEDULER] Error: {str(e)}")
+            self._stop.wait(TICK_SECONDS)
+
+    def start(self):
+        """Start the scheduler thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='ingest-scheduler', daemon=True)
+        self._thread.start()
+        print(f"[SCHEDULER] Started: {', '.join(f'{e}={s}s' for e, s in self.intervals.items())}")
+
+    def stop(self, wait=True):
+        """Stop scheduling new runs (waits for running ones when wait is True)"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._executor.shutdown(wait=wait)
+
+
+def main():
+    """Run the scheduler as a sidecar process next to the web app"""
+    from app import FETCH_TASKS, DB_PATH, PAYLOAD_ARCHIVE, init_db
+
+    settings = load_schedule()
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    init_db()
+
+    scheduler = IngestScheduler(FETCH_TASKS, DB_PATH, intervals=settings['intervals'],
+                                max_parallel=settings['max_parallel'], archive=PAYLOAD_ARCHIVE)
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n[SCHEDULER] Stopping...")
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+"""
+Mock CommServe
+Local stand-in for the Commvault web service that serves synthetic estates in the test_output_*.json shapes
+
+Point base_url at it for offline fetch, ingest and dashboard runs:
+    python mock_commserve.py --clients 50000 --jobs 500000 --port 8081
+    python mock_commserve.py --latency-ms 200 --jitter-ms 100 --failure-rate 0.05 --timeout-rate 0.01
+    python mock_commserve.py --slow /Job=2000 --slow /Plan=500
+
+then set `base_url = http://127.0.0.1:8081` in config.ini (any username and password log in).
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from flask import Flask, Response, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+# Estate size served when nothing is overridden
+DEFAULT_ESTATE = {
+    'clients': 500,
+    'jobs': 5000,
+    'plans': 50,
+    'storage_policies': 50,
+    'storage_pools': 20,
+    'libraries': 20,
+    'mediaagents': 10,
+    'events': 1000,
+    'alerts': 20,
+}
+
+# Jobs and events are spread evenly over this many days before the mock starts
+HISTORY_DAYS = 30
+
+# Share of jobs still running (the newest ones)
+ACTIVE_JOB_FRACTION = 0.01
+
+COMMSERVE_VERSION = '11.32.0'
+
+# Recorded responses whose first record is used as the template for synthetic records
+TEMPLATE_FILES = {
+    'clients': ('test_output_Clients.json', 'clientProperties'),
+    'plans': ('test_output_Plans.json', 'plans'),
+    'storage_policies': ('test_output_Storage_Policies.json', 'policies'),
+    'storage_pools': ('test_output_Storage_Pools_(Alt).json', 'storagePoolList'),
+    'libraries': ('test_output_Libraries.json', 'response'),
+    'mediaagents': ('test_output_MediaAgents.json', 'response'),
+}
+
+# Minimal shapes used when a test_output file is not available
+FALLBACK_TEMPLATES = {
+    'clients': {"client": {"clientEntity": {"clientId": 0, "clientName": "", "hostName": "", "displayName": "",
+                                            "clientGUID": ""}}},
+    'plans': {"plan": {"planId": 0, "planName": ""}, "numCopies": 1, "type": 2, "subtype": 33554437,
+              "storage": {"storagePolicy": {"storagePolicyId": 0},
+                          "copy": [{"StoragePolicyCopy": {"copyId": 0, "copyName": "Primary"},
+                                    "retentionRules": {"retainBackupDataForDays": 30, "retainBackupDataForCycles": 1,
+                                                       "retainArchiverDataForDays": -1}}]}},
+    'storage_policies': {"numberOfStreams": 1, "storagePolicy": {"storagePolicyName": "", "storagePolicyId": 0}},
+    'storage_pools': {"storagePoolEntity": {"storagePoolName": "", "storagePoolId": 0}, "storagePoolType": 4,
+                      "storageType": 3, "totalCapacity": 0, "totalFreeSpace": 0, "status": "Online"},
+    'libraries': {"entityInfo": {"name": "", "id": 0}},
+    'mediaagents': {"entityInfo": {"name": "", "id": 0}},
+}
+
+JOB_STATUSES = ['Completed'] * 16 + ['Completed w/ one or more errors', 'Failed', 'Killed', 'Committed']
+EVENT_SEVERITIES = ['Information', 'Minor', 'Major', 'Critical']
+
+
+def load_template(name, directory='.'):
+    """First record of a recorded response, or the built-in fallback shape"""
+    filename, list_key = TEMPLATE_FILES[name]
+    path = os.path.join(directory, filename)
+    try:
+        with open(path, encoding='utf-8') as f:
+            records = json.load(f).get(list_key) or []
+        if records:
+            return records[0]
+    except (OSError, ValueError):
+        pass
+    return copy.deepcopy(FALLBACK_TEMPLATES[name])
+
+
+class MockEstate:
+    """
+    Synthetic CommCell of a given size
+
+    List endpoints are built once and served from cached JSON. Jobs and events are
+    computed from their index, so half a million jobs cost nothing until a page of
+    them is requested.
+
+    Args:
+        sizes: Dictionary overriding DEFAULT_ESTATE counts
+        seed: Random seed, so the same arguments always produce the same estate
+        template_dir: Directory holding the test_output_*.json files
+    """
+
+    def __init__(self, sizes=None, seed=0, template_dir='.'):
+        self.sizes = dict(DEFAULT_ESTATE)
+        self.sizes.update(sizes or {})
+        self.seed = seed
+        self.template_dir = template_dir
+        self.anchor = int(time.time())
+        self.span = HISTORY_DAYS * 86400
+        self.active_jobs = int(self.sizes['jobs'] * ACTIVE_JOB_FRACTION)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def cached(self, name, build):
+        """JSON bytes for a list endpoint, built on first use"""
+        with self._lock:
+            if name not in self._cache:
+                self._cache[name] = json.dumps(build()).encode('utf-8')
+            return self._cache[name]
+
+    def _records(self, name, fill):
+        template = load_template(name, self.template_dir)
+        rng = random.Random(f"{self.seed}-{name}")
+        records = []
+        for i in range(1, self.sizes[name] + 1):
+            record = copy.deepcopy(template)
+            fill(record, i, rng)
+            records.append(record)
+        return records
+
+    def clients(self):
+        def fill(record, i, rng):
+            entity = record.setdefault('client', {}).setdefault('clientEntity', {})
+            entity.update({'clientId': i, 'clientName': f'client{i:06d}', 'displayName': f'client{i:06d}',
+                           'hostName': f'client{i:06d}.mock.local',
+                           'clientGUID': str(uuid.UUID(int=rng.getrandbits(128)))})
+        return {'clientProperties': self._records('clients', fill)}
+
+    def plans(self):
+        def fill(record, i, rng):
+            record.setdefault('plan', {}).update({'planId': i, 'planName': f'Plan {i:04d}'})
+            record['description'] = f'Mock server plan {i}'
+            record['rpoInMinutes'] = rng.choice([60, 240, 720, 1380])
+            storage = record.setdefault('storage', {})
+            storage.setdefault('storagePolicy', {})['storagePolicyId'] = i
+            for n, plan_copy in enumerate(storage.get('copy', []), 1):
+                plan_copy.setdefault('StoragePolicyCopy', {})['copyId'] = i * 10 + n
+                plan_copy.setdefault('retentionRules', {})['retainBackupDataForDays'] = rng.choice([7, 14, 30, 90, 365])
+        return {'plans': self._records('plans', fill)}
+
+    def storage_policies(self):
+        def fill(record, i, rng):
+            record.setdefault('storagePolicy', {}).update({'storagePolicyId': i, 'storagePolicyName': f'SP_{i:04d}'})
+        return {'policies': self._records('storage_policies', fill)}
+
+    def storage_pools(self):
+        def fill(record, i, rng):
+            record.setdefault('storagePoolEntity', {}).update({'storagePoolId': i, 'storagePoolName': f'POOL_{i:03d}'})
+            if 'storagePolicyEntity' in record:
+                record['storagePolicyEntity'].update({'storagePolicyId': i, 'storagePolicyName': f'POOL_{i:03d}'})
+            if 'storagePool' in record:
+                record['storagePool'].update({'clientGroupId': i, 'clientGroupName': f'POOL_{i:03d}'})
+            if 'libraryList' in record:
+                record['libraryList'] = [{'_type_': 9, 'libraryId': (i - 1) % max(1, self.sizes['libraries']) + 1}]
+            if i % 5 == 0:
+                # Cloud pools report no capacity
+                record['totalCapacity'] = -1
+                record['totalFreeSpace'] = -1
+            else:
+                total = rng.randint(50, 2000) * 1024 * 1024
+                record['totalCapacity'] = total
+                record['totalFreeSpace'] = int(total * rng.uniform(0.02, 0.6))
+        return {'storagePoolList': self._records('storage_pools', fill)}
+
+    def libraries(self):
+        def fill(record, i, rng):
+            record.setdefault('entityInfo', {}).update({'id': i, 'name': f'DiskLib_{i:03d}'})
+        return {'response': self._records('libraries', fill)}
+
+    def mediaagents(self):
+        def fill(record, i, rng):
+            record.setdefault('entityInfo', {}).update({'id': i, 'name': f'ma{i:03d}'})
+        return {'response': self._records('mediaagents', fill)}
+
+    def alerts(self):
+        rng = random.Random(f"{self.seed}-alerts")
+        return {'alertList': [
+            {'alert': {'alertId': i, 'alertName': f'Alert {i}', 'alertType': rng.choice(['Job', 'Storage', 'DDB']),
+                       'severity': rng.choice(['Warning', 'Critical']), 'status': 'Active',
+                       'description': f'Mock alert {i}',
+                       'triggerTime': self.anchor - rng.randint(0, self.span)}}
+            for i in range(1, self.sizes['alerts'] + 1)
+        ]}
+
+    def commcell(self):
+        return {'commCellName': 'MOCKCELL', 'commServeVersion': COMMSERVE_VERSION, 'version': COMMSERVE_VERSION,
+                'timeZone': 'UTC', 'commServeHostName': 'mockcs.mock.local'}
+
+    # Jobs: index 0 is the newest; ids grow with time
+
+    def job_start(self, index):
+        return self.anchor - int(index * self.span / max(1, self.sizes['jobs'])) - 3600
+
+    def job(self, index):
+        jobs = self.sizes['jobs']
+        job_id = 1000000 + jobs - index
+        rng = random.Random(job_id * 7919 + self.seed)
+        client_id = job_id % max(1, self.sizes['clients']) + 1
+        start = self.job_start(index)
+        active = index < self.active_jobs
+        elapsed = rng.randint(60, 3600)
+        size = rng.randint(1, 500) * 1024 * 1024 * 1024
+        return {'jobSummary': {
+            'jobId': job_id,
+            'jobType': rng.choice(['Backup'] * 9 + ['Restore']),
+            'status': 'Running' if active else rng.choice(JOB_STATUSES),
+            'percentComplete': rng.randint(1, 99) if active else 100,
+            'jobStartTime': start,
+            'jobEndTime': 0 if active else start + elapsed,
+            'jobElapsedTime': elapsed,
+            'sizeOfApplication': size,
+            'sizeOfMediaOnDisk': int(size * rng.uniform(0.05, 0.6)),
+            'percentSavings': round(rng.uniform(40, 95), 2),
+            'totalNumOfFiles': rng.randint(100, 2000000),
+            'subclient': {'clientId': client_id, 'clientName': f'client{client_id:06d}',
+                          'subclientName': 'default', 'backupsetName': 'defaultBackupSet'},
+            'backupSet': {'backupSetName': 'defaultBackupSet'},
+            'storagePolicy': {'storagePolicyId': job_id % max(1, self.sizes['storage_policies']) + 1},
+        }}
+
+    def _first_index_before(self, epoch):
+        """Smallest job index whose start time is below epoch (job start times fall with the index)"""
+        low, high = 0, self.sizes['jobs']
+        while low < high:
+            mid = (low + high) // 2
+            if self.job_start(mid) < epoch:
+                high = mid
+            else:
+                low = mid + 1
+        return low
+
+    def job_indexes(self, args):
+        """Index range (start, stop) matching the /Job query parameters"""
+        jobs = self.sizes['jobs']
+        if args.get('jobCategory', '').lower() == 'active':
+            return 0, self.active_jobs
+
+        start, stop = 0, jobs
+        if args.get('completedJobLookupTime'):
+            # Jobs that started within the lookup window (plus the running ones, which come first)
+            since = int(time.time()) - int(args['completedJobLookupTime'])
+            stop = self._first_index_before(since)
+        if args.get('toTime'):
+            start = max(start, self._first_index_before(int(args['toTime'])))
+        if args.get('fromTime'):
+            stop = min(stop, self._first_index_before(int(args['fromTime'])))
+        return start, max(start, stop)
+
+    def jobs_page(self, args):
+        start, stop = self.job_indexes(args)
+        total = stop - start
+        offset = int(args.get('offset', 0))
+        limit = int(args.get('limit', total))
+        first = start + offset
+        last = min(stop, first + limit)
+        return {'totalRecordsWithoutPaging': total, 'jobs': [self.job(i) for i in range(first, last)]}
+
+    def event(self, index):
+        events = self.sizes['events']
+        event_id = 5000000 + events - index
+        rng = random.Random(event_id * 104729 + self.seed)
+        client_id = event_id % max(1, self.sizes['clients']) + 1
+        return {
+            'eventId': event_id,
+            'eventCode': f"{rng.randint(1, 99)}:{rng.randint(1, 999)}",
+            'severity': rng.choice(EVENT_SEVERITIES),
+            'eventType': rng.choice(['Job', 'Storage', 'System']),
+            'description': f'Mock event {event_id}',
+            'timeSource': self.anchor - int(index * self.span / max(1, events)),
+            'subsystem': rng.choice(['JobManager', 'MediaManager', 'SIDBEngine']),
+            'clientName': f'client{client_id:06d}',
+            'jobId': 1000000 + rng.randint(1, max(1, self.sizes['jobs'])),
+        }
+
+    def events(self, args):
+        events = [self.event(i) for i in range(self.sizes['events'])]
+        if args.get('fromTime'):
+            events = [e for e in events if e['timeSource'] >= int(args['fromTime'])]
+        level = args.get('level')
+        if level:
+            events = [e for e in events if e['severity'].lower() == level.lower()]
+        return {'commCellEvents': events}
+
+
+class FaultInjector:
+    """
+    Latency and failure injection applied to every API request
+
+    Args:
+        latency_ms: Added to every response
+        jitter_ms: Random extra latency, up to this much
+        failure_rate: Share of requests answered with one of failure_statuses
+        failure_statuses: HTTP statuses used for injected failures
+        timeout_rate: Share of requests that hang for timeout_ms before answering
+        timeout_ms: How long a hanging request takes
+        slow_paths: Dictionary of path prefix -> extra latency (ms), e.g. {'/Job': 2000}
+        failing_pages: Dictionary of path prefix -> first paging offset answered with a 500, e.g.
+            {'/Job': 1000} fails every /Job page after the first 1000 records
+        seed: Random seed
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, failure_rate=0.0, failure_statuses=(500, 503),
+                 timeout_rate=0.0, timeout_ms=60000, slow_paths=None, failing_pages=None, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.failure_statuses = list(failure_statuses)
+        self.timeout_rate = timeout_rate
+        self.timeout_ms = timeout_ms
+        self.slow_paths = slow_paths or {}
+        self.failing_pages = failing_pages or {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def apply(self, path, offset=0):
+        """Sleep as configured; return an HTTP status to fail with, or None"""
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_ms)
+            hang = self._random.random() < self.timeout_rate
+            fail = self._random.random() < self.failure_rate
+            status = self._random.choice(self.failure_statuses) if fail and self.failure_statuses else None
+
+        delay = self.latency_ms + jitter
+        for prefix, extra in self.slow_paths.items():
+            if path.lower().startswith(prefix.lower()):
+                delay += extra
+        if hang:
+            delay += self.timeout_ms
+        if delay:
+            time.sleep(delay / 1000)
+        for prefix, first_failing in self.failing_pages.items():
+            if path.lower().startswith(prefix.lower()) and offset >= first_failing:
+                return 500
+        return status
+
+
+def create_mock_app(estate=None, faults=None):
+    """Flask app serving the mock CommServe API"""
+    estate = estate or MockEstate()
+    faults = faults or FaultInjector()
+    mock = Flask(__name__)
+    tokens = set()
+    stats = {}
+    stats_lock = threading.Lock()
+
+    def json_response(body, status=200):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        return Response(body, status=status, mimetype='application/json')
+
+    @mock.before_request
+    def before():
+        if request.path.startswith('/mock/'):
+            return None
+        with stats_lock:
+            stats[request.path] = stats.get(request.path, 0) + 1
+
+        status = faults.apply(request.path, request.args.get('offset', 0, type=int))
+        if status:
+            return json_response({'errorCode': status, 'errorMessage': 'Injected failure'}, status)
+
+        if request.path != '/Login':
+            token = request.headers.get('Authtoken', '')
+            if token.replace('QSDK ', '', 1) not in tokens:
+                return json_response({'errorCode': 401, 'errorMessage': 'Access denied'}, 401)
+        return None
+
+    @mock.route('/Login', methods=['POST'])
+    def login():
+        credentials = request.get_json(silent=True) or {}
+        if not credentials.get('username') or not credentials.get('password'):
+            return json_response({'errList': [{'errLogMessage': 'Invalid username or password'}]})
+        token = uuid.uuid4().hex
+        tokens.add(token)
+        return json_response({'token': f'QSDK {token}', 'userName': credentials['username']})
+
+    @mock.route('/Client')
+    def clients():
+        return json_response(estate.cached('clients', estate.clients))
+
+    @mock.route('/Plan')
+    def plans():
+        return json_response(estate.cached('plans', estate.plans))
+
+    @mock.route('/StoragePolicy')
+    @mock.route('/V2/StoragePolicy')
+    def storage_policies():
+        return json_response(estate.cached('storage_policies', estate.storage_policies))
+
+    @mock.route('/StoragePolicy/<int:policy_id>')
+    def storage_policy_detail(policy_id):
+        return json_response({'storagePolicy': {'storagePolicyId': policy_id, 'storagePolicyName': f'SP_{policy_id:04d}'},
+                              'copy': [{'StoragePolicyCopy': {'copyName': 'Primary'},
+                                        'dedupeFlags': {'enableDeduplication': 1}}]})
+
+    @mock.route('/StoragePool')
+    def storage_pools():
+        return json_response(estate.cached('storage_pools', estate.storage_pools))
+
+    @mock.route('/StoragePool/<int:pool_id>')
+    def storage_pool_detail(pool_id):
+        library_id = (pool_id - 1) % max(1, estate.sizes['libraries']) + 1
+        return json_response({'storagePoolEntity': {'storagePoolId': pool_id, 'storagePoolName': f'POOL_{pool_id:03d}'},
+                              'libraryId': library_id, 'libraryName': f'DiskLib_{library_id:03d}'})
+
+    @mock.route('/Library')
+    def libraries():
+        return json_response(estate.cached('libraries', estate.libraries))
+
+    @mock.route('/Library/<int:library_id>')
+    def library_detail(library_id):
+        return json_response({'libraryId': library_id, 'libraryName': f'DiskLib_{library_id:03d}', 'libraryType': 3,
+                              'status': 'Online', 'capacity': 1024 * 1024 * 1024, 'freeSpace': 256 * 1024 * 1024})
+
+    @mock.route('/MediaAgent')
+    def mediaagents():
+        return json_response(estate.cached('mediaagents', estate.mediaagents))
+
+    @mock.route('/Job')
+    def jobs():
+        return json_response(estate.jobs_page(request.args))
+
+    @mock.route('/Event')
+    def events():
+        return json_response(estate.events(request.args))
+
+    @mock.route('/Alert')
+    def alerts():
+        return json_response(estate.cached('alerts', estate.alerts))
+
+    @mock.route('/Commcell')
+    def commcell():
+        return json_response(estate.commcell())
+
+    @mock.route('/mock/stats')
+    def mock_stats():
+        """Requests served per path since start"""
+        with stats_lock:
+            return json_response({'estate': estate.sizes, 'requests': dict(stats)})
+
+    return mock
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler without per-request access logging"""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def start_mock_server(estate=None, faults=None, host='127.0.0.1', port=0):
+    """
+    Serve the mock in a background thread (for benchmarks and scripts), without access logs
+
+    Returns:
+        Tuple of (server, base_url). Call server.shutdown() to stop it.
+    """
+    server = make_server(host, port, create_mock_app(estate, faults), threaded=True,
+                         request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, name='mock-commserve', daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def parse_slow(values):
+    """--slow /Job=2000 values as {path: ms}"""
+    slow_paths = {}
+    for value in values or []:
+        path, _, ms = value.partition('=')
+        slow_paths[path] = int(ms)
+    return slow_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic Commvault CommServe API for offline runs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    for name, count in DEFAULT_ESTATE.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=count, help=f'Number of {name}')
+    parser.add_argument('--latency-ms', type=int, default=0, help='Latency added to every response')
+    parser.add_argument('--jitter-ms', type=int, default=0, help='Random extra latency up to this much')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of requests that fail')
+    parser.add_argument('--failure-status', type=int, nargs='*', default=[500, 503], help='Statuses for failures')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='Share of requests that hang')
+    parser.add_argument('--timeout-ms', type=int, default=60000, help='How long a hanging request takes')
+    parser.add_argument('--slow', action='append', help='Extra latency for a path prefix, e.g. /Job=2000')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    sizes = {name: getattr(args, name) for name in DEFAULT_ESTATE}
+    estate = MockEstate(sizes, seed=args.seed, template_dir=os.path.dirname(os.path.abspath(__file__)))
+    faults = FaultInjector(args.latency_ms, args.jitter_ms, args.failure_rate, args.failure_status,
+                           args.timeout_rate, args.timeout_ms, parse_slow(args.slow), seed=args.seed)
+
+    print("=" * 100)
+    print("MOCK COMMSERVE")
+    print("=" * 100)
+    print("Estate: " + ", ".join(f"{count} {name}" for name, count in sizes.items()))
+    print(f"Faults: {args.latency_ms}ms latency (+{args.jitter_ms}ms jitter), {args.failure_rate:.0%} failures, "
+          f"{args.timeout_rate:.0%} hangs")
+    print(f"base_url = http://{args.host}:{args.port}")
+    print()
+
+    server = make_server(args.host, args.port, create_mock_app(estate, faults), threaded=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping mock CommServe")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Raw Payload Archive
+Keeps a gzip-compressed, content-addressed copy of every fetched payload and replays an archive into a fresh database
+
+Usage:
+    python payload_archive.py list --archive Archive
+    python payload_archive.py replay --archive Archive --db Database/replay.db
+    python payload_archive.py replay --archive Archive --db Database/replay.db --only jobs_enhanced events
+"""
+
+import argparse
+import configparser
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from commvault_client import CONFIG_FILE
+from db_connections import get_connection_manager
+
+DEFAULT_ARCHIVE_PATH = 'Archive'
+
+MANIFEST_FILE = 'manifest.jsonl'
+
+
+class PayloadArchive:
+    """
+    Content-addressed store of raw API response bodies
+
+    Each distinct body is written once to objects/<aa>/<sha256>.json.gz. Every fetch
+    appends a line to manifest.jsonl with the hash, task, endpoint path, fetch time and
+    CommServe version, so identical responses fetched many times cost one object.
+
+    Args:
+        root: Archive directory (created if missing)
+    """
+
+    def __init__(self, root=DEFAULT_ARCHIVE_PATH):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+
+    def object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], f"{digest}.json.gz")
+
+    def store(self, body, task_name, path, commserve_version='', fetched_epoch=None, digest=None):
+        """
+        Archive one response body
+
+        Safe to call from fetch worker threads. digest may be passed when the caller has
+        already hashed the body.
+
+        Returns:
+            SHA-256 hex digest of the body
+        """
+        digest = digest or hashlib.sha256(body).hexdigest()
+        object_path = self.object_path(digest)
+
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            # Write to a private temp file and rename, so readers never see half an object
+            tmp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, object_path)
+
+        fetched_epoch = fetched_epoch if fetched_epoch is not None else time.time()
+        entry = {
+            'hash': digest,
+            'task': task_name,
+            'path': path,
+            'fetchedAt': datetime.fromtimestamp(fetched_epoch).isoformat(),
+            'fetchedEpoch': int(fetched_epoch),
+            'commserveVersion': commserve_version or '',
+            'bytes': len(body)
+        }
+        with self._lock:
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+
+        return digest
+
+    def entries(self, only=None):
+        """Manifest entries in fetch order, optionally limited to some task names"""
+        if not os.path.exists(self.manifest_path):
+            return []
+        entries = []
+        with open(self.manifest_path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if only and entry['task'] not in only:
+                    continue
+                entries.append(entry)
+        entries.sort(key=lambda e: e['fetchedEpoch'])
+        return entries
+
+    def load(self, digest):
+        """Parsed payload for a hash"""
+        with gzip.open(self.object_path(digest), 'rb') as f:
+            return json.loads(f.read())
+
+
+def open_archive(config_file=CONFIG_FILE):
+    """
+    Archive configured in [archive] of config.ini
+
+    Returns:
+        PayloadArchive, or None when archiving is disabled
+    """
+    config = configparser.ConfigParser()
+    if os.path.exists(config_file):
+        config.read(config_file)
+    if config.get('archive', 'enabled', fallback='false').lower() != 'true':
+        return None
+    return PayloadArchive(config.get('archive', 'path', fallback=DEFAULT_ARCHIVE_PATH))
+
+
+def replay(archive, connections, savers, only=None):
+    """
+    Re-ingest archived payloads through the normal savers, oldest first
+
+    Args:
+        archive: PayloadArchive to read
+        connections: ConnectionManager of the database to write into (its writer is taken per payload)
+        savers: Dictionary of task name -> saver(db, payload)
+        only: Optional collection of task names to replay
+
+    Returns:
+        Tuple of (counts per task, list of (entry, error) for payloads that failed)
+    """
+    counts = {}
+    failures = []
+
+    for entry in archive.entries(only):
+        saver = savers.get(entry['task'])
+        if saver is None:
+            failures.append((entry, 'No saver for this task'))
+            continue
+        try:
+            payload = archive.load(entry['hash'])
+            # The writer rolls back a failed save when it is released
+            with connections.writer() as db:
+                count = saver(db, payload)
+                db.commit()
+            counts[entry['task']] = counts.get(entry['task'], 0) + (count or 0)
+        except Exception as e:
+            failures.append((entry, f"Error: {str(e)}"))
+
+    return counts, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or replay the raw Commvault payload archive")
+    parser.add_argument('command', choices=['list', 'replay'])
+    parser.add_argument('--archive', default=None, help='Archive directory (default: [archive] path)')
+    parser.add_argument('--db', default=None, help='Database to replay into (default: [database] db_path)')
+    parser.add_argument('--only', nargs='*', help='Task names to include, e.g. jobs_enhanced events')
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    if os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE)
+    archive = PayloadArchive(args.archive or config.get('archive', 'path', fallback=DEFAULT_ARCHIVE_PATH))
+
+    if args.command == 'list':
+        entries = archive.entries(args.only)
+        print(f"{'Fetched':<20} {'Task':<20} {'Version':<12} {'Bytes':>10}  Path")
+        for entry in entries:
+            print(f"{entry['fetchedAt'][:19]:<20} {entry['task']:<20} {entry['commserveVersion']:<12} "
+                  f"{entry['bytes']:>10}  {entry['path']}")
+        print(f"\n{len(entries)} payloads, {len({e['hash'] for e in entries})} distinct objects")
+        return
+
+    # Reuse the web app's schema and savers; nothing here talks to the CommServe
+    import app
+
+    if args.db:
+        app.DB_PATH = args.db
+    db_dir = os.path.dirname(app.DB_PATH)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    app.init_db()
+
+    savers = {name: task.saver for name, task in app.FETCH_TASKS.items()}
+
+    print("=" * 100)
+    print("REPLAYING PAYLOAD ARCHIVE")
+    print("=" * 100)
+    print(f"Archive: {archive.root}")
+    print(f"Database: {app.DB_PATH}")
+    print()
+
+    connections = get_connection_manager(app.DB_PATH)
+    start_time = time.time()
+    try:
+        # Backfill windows are archived under their window name; they hold /Job pages
+        for entry in archive.entries(args.only):
+            if entry['task'].startswith('backfill ') and entry['task'] not in savers:
+                savers[entry['task']] = app.save_jobs_and_enhanced_to_db
+        counts, failures = replay(archive, connections, savers, args.only)
+    finally:
+        connections.close()
+
+    for task_name, count in sorted(counts.items()):
+        print(f"  ✓ {task_name}: {count} records")
+    for entry, error in failures:
+        print(f"  ✗ {entry['task']} {entry['path']} ({entry['fetchedAt'][:19]}): {error}")
+
+    print()
+    print(f"Replay finished in {time.time() - start_time:.1f}s: {sum(counts.values())} records, "
+          f"{len(failures)} payloads failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ Uses current database data to build storage estate overview
 import sqlite3
 from datetime import datetime
 
+from db_migrations import apply_migrations
+
 print("=" * 100)
 print("POPULATING STORAGE ESTATE FROM EXISTING DATABASE")
 print("=" * 100)
@@ -16,57 +18,11 @@ print()
 conn = sqlite3.connect('Database/commvault.db')
 cur = conn.cursor()
 
-# Create storage estate tables if they don't exist
+# Create storage estate tables if they don't exist (schema migrations)
 print("Creating storage estate tables...")
 
-cur.execute("""
-    CREATE TABLE IF NOT EXISTS storage_libraries (
-        libraryId        INTEGER PRIMARY KEY,
-        libraryName      TEXT NOT NULL,
-        libraryType      TEXT,
-        libraryTypeDesc  TEXT,
-        mediaAgentId     INTEGER,
-        mediaAgentName   TEXT,
-        status           TEXT,
-        capacity         INTEGER,
-        freeSpace        INTEGER,
-        usedSpace        INTEGER,
-        usedPercent      REAL,
-        vendorType       INTEGER,
-        storageClass     TEXT,
-        mountPath        TEXT,
-        isCloudStorage   INTEGER,
-        isDedupe         INTEGER,
-        lastFetchTime    TEXT
-    )
-""")
-
-cur.execute("""
-    CREATE TABLE IF NOT EXISTS pool_library_mapping (
-        storagePoolId    INTEGER,
-        libraryId        INTEGER,
-        mappingDate      TEXT,
-        PRIMARY KEY (storagePoolId, libraryId),
-        FOREIGN KEY (storagePoolId) REFERENCES storage_pools(storagePoolId),
-        FOREIGN KEY (libraryId) REFERENCES storage_libraries(libraryId)
-    )
-""")
-
-cur.execute("""
-    CREATE TABLE IF NOT EXISTS storage_write_patterns (
-        planId           INTEGER,
-        planName         TEXT,
-        storagePoolId    INTEGER,
-        storagePoolName  TEXT,
-        libraryId        INTEGER,
-        libraryName      TEXT,
-        copyType         TEXT,
-        retentionDays    INTEGER,
-        lastFetchTime    TEXT
-    )
-""")
+apply_migrations(conn)
 
-conn.commit()
 print("Tables created successfully")
 print()
 
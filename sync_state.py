@@ -0,0 +1,123 @@
+"""
+Incremental Sync State
+Per-endpoint high-water marks so job and event pulls only move records newer than the last refresh
+"""
+
+import time
+from datetime import datetime
+
+# First-run job window and the overlap re-read on every delta pull (clock skew, late completions)
+DEFAULT_JOB_LOOKUP_SECONDS = 86400
+OVERLAP_SECONDS = 300
+
+class DeltaSync:
+    """
+    How a fetch task narrows its request to records newer than its high-water mark
+
+    Args:
+        list_key: Key of the record list in each payload ('jobs', 'commCellEvents', ...)
+        id_of: Function returning a record's id (jobId / eventId)
+        paths_for: Function taking the endpoint's sync_state row (or None) and returning paths
+        skip_seen: Drop records at or below the mark before saving (for immutable records)
+    """
+
+    def __init__(self, list_key, id_of, paths_for, skip_seen=False):
+        self.list_key = list_key
+        self.id_of = id_of
+        self.paths_for = paths_for
+        self.skip_seen = skip_seen
+
+    def records(self, payload):
+        """Record list of a payload (tries the alternative 'events' key for event payloads)"""
+        records = payload.get(self.list_key)
+        if records is None and self.list_key == 'commCellEvents':
+            records = payload.get('events')
+        return records or []
+
+    def max_id(self, payload):
+        """Highest record id in a payload, or None"""
+        ids = [self.id_of(record) for record in self.records(payload)]
+        ids = [int(i) for i in ids if i]
+        return max(ids) if ids else None
+
+    def drop_seen(self, payload, mark):
+        """Remove records at or below mark from payload in place"""
+        if not self.skip_seen or mark is None:
+            return
+        key = self.list_key if self.list_key in payload else 'events'
+        if key in payload:
+            payload[key] = [r for r in payload[key] if int(self.id_of(r) or 0) > mark]
+
+
+def get_sync_state(db, endpoint):
+    """Return the sync_state row for endpoint as a dict, or None if it has never synced"""
+    row = db.execute(
+        "SELECT endpoint, lastSuccessTime, lastSuccessEpoch, highWaterMark, lastRecordCount "
+        "FROM sync_state WHERE endpoint = ?", (endpoint,)
+    ).fetchone()
+    if not row:
+        return None
+    return dict(zip(['endpoint', 'lastSuccessTime', 'lastSuccessEpoch', 'highWaterMark', 'lastRecordCount'], row))
+
+
+def record_sync(db, endpoint, started_epoch, high_water_mark=None, record_count=0):
+    """Record a successful fetch; the high-water mark never moves backwards"""
+    db.execute("""
+        INSERT INTO sync_state (endpoint, lastSuccessTime, lastSuccessEpoch, highWaterMark, lastRecordCount)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(endpoint) DO UPDATE SET
+            lastSuccessTime = excluded.lastSuccessTime,
+            lastSuccessEpoch = excluded.lastSuccessEpoch,
+            highWaterMark = CASE
+                WHEN excluded.highWaterMark IS NULL THEN sync_state.highWaterMark
+                ELSE MAX(COALESCE(sync_state.highWaterMark, 0), excluded.highWaterMark)
+            END,
+            lastRecordCount = excluded.lastRecordCount
+    """, (endpoint, datetime.fromtimestamp(started_epoch).isoformat(), started_epoch,
+          high_water_mark, record_count))
+
+
+def seconds_since_sync(state, default=DEFAULT_JOB_LOOKUP_SECONDS):
+    """Lookup window covering everything since the last successful sync (plus overlap)"""
+    if not state or not state.get('lastSuccessEpoch'):
+        return default
+    return max(OVERLAP_SECONDS, int(time.time()) - int(state['lastSuccessEpoch']) + OVERLAP_SECONDS)
+
+
+def sync_from_epoch(state):
+    """Epoch seconds to request records from, or None on the first sync"""
+    if not state or not state.get('lastSuccessEpoch'):
+        return None
+    return int(state['lastSuccessEpoch']) - OVERLAP_SECONDS
+
+
+def get_payload_hashes(db, endpoint):
+    """Last saved payload hash per path for endpoint, as {path: {hash, recordCount, savedTime}}"""
+    rows = db.execute(
+        "SELECT path, hash, recordCount, savedTime FROM payload_hashes WHERE endpoint = ?", (endpoint,)
+    ).fetchall()
+    return {row[0]: {'hash': row[1], 'recordCount': row[2], 'savedTime': row[3]} for row in rows}
+
+
+def record_payload_hash(db, endpoint, path, digest, record_count, saved_time):
+    """Remember the payload just saved for endpoint/path (saved_time is taken before the save)"""
+    db.execute("""
+        INSERT INTO payload_hashes (endpoint, path, hash, recordCount, savedTime)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(endpoint, path) DO UPDATE SET
+            hash = excluded.hash,
+            recordCount = excluded.recordCount,
+            savedTime = excluded.savedTime
+    """, (endpoint, path, digest, record_count, saved_time))
+
+
+def touch_unchanged(db, tables, saved_time, fetch_time=None):
+    """
+    Bump lastFetchTime on the rows written by the last save of an unchanged payload
+
+    Rows that save wrote carry a lastFetchTime at or after saved_time; older rows (records
+    the CommServe no longer returns) keep their old time.
+    """
+    fetch_time = fetch_time or datetime.now().isoformat()
+    for table in tables:
+        db.execute(f"UPDATE {table} SET lastFetchTime = ? WHERE lastFetchTime >= ?", (fetch_time, saved_time))
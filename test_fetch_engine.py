@@ -0,0 +1,71 @@
+"""
+Fetch engine check against the mock CommServe
+A paged pull whose later page fails must report an error and leave sync_state where it was
+
+Usage:
+    python test_fetch_engine.py
+    python -m pytest test_fetch_engine.py
+"""
+
+import os
+import tempfile
+
+import app
+from commvault_client import CommvaultClient
+from db_connections import connect
+from db_migrations import apply_migrations
+from fetch_engine import PagedFetchTask, run_fetch_tasks
+from mock_commserve import FaultInjector, MockEstate, start_mock_server
+from sync_state import get_sync_state
+
+PAGE_SIZE = 50
+
+# 3000 jobs over 30 days: about 100 in the last 24 hours, so the pull takes more than one page
+ESTATE_SIZES = {'jobs': 3000}
+
+
+def fetch_jobs(failing_pages=None):
+    """
+    Pull /Job in PAGE_SIZE pages into a fresh database
+
+    Returns:
+        Tuple of (counts, errors, jobs sync_state row, rows in jobs)
+    """
+    server, url = start_mock_server(MockEstate(ESTATE_SIZES, template_dir=os.path.dirname(os.path.abspath(__file__))),
+                                    FaultInjector(failing_pages=failing_pages))
+    db = connect(os.path.join(tempfile.mkdtemp(prefix='cv_fetch_'), 'commvault.db'))
+    try:
+        apply_migrations(db)
+        client = CommvaultClient(url)
+        client.authenticate('test', 'test')
+        task = PagedFetchTask("jobs", "/Job?completedJobLookupTime=86400", app.save_jobs_to_db, "jobs",
+                              page_size=PAGE_SIZE, delta=app.JOBS_DELTA)
+        _, counts, errors = run_fetch_tasks(client, [task], db, max_workers=1)
+        rows = db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        return counts, errors, get_sync_state(db, 'jobs'), rows
+    finally:
+        db.close()
+        server.shutdown()
+
+
+def test_complete_pull_advances_sync_state():
+    counts, errors, state, rows = fetch_jobs()
+    assert not errors, errors
+    assert counts['jobs'] > PAGE_SIZE, "The pull should span more than one page"
+    assert state and state['highWaterMark'], "A complete pull records its sync mark"
+
+
+def test_failed_later_page_keeps_sync_state():
+    counts, errors, state, rows = fetch_jobs(failing_pages={'/Job': PAGE_SIZE})
+    assert 'jobs' in errors, "A 500 on page 2 must fail the task"
+    assert rows == counts['jobs'] == PAGE_SIZE, "Page 1 is still saved"
+    assert state is None, f"sync_state advanced past unread pages: {state}"
+
+
+if __name__ == "__main__":
+    print("=" * 100)
+    print("FETCH ENGINE")
+    print("=" * 100)
+    for test in (test_complete_pull_advances_sync_state, test_failed_later_page_keeps_sync_state):
+        test()
+        print(f"✓ {test.__name__}")
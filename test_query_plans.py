@@ -0,0 +1,246 @@
+"""
+Query plan check for the dashboard and analysis pages
+Runs every page against a seeded database, captures each SELECT it issues and fails on full table scans of large tables
+
+Usage:
+    python test_query_plans.py
+    python test_query_plans.py --db Database/commvault.db
+    python -m pytest test_query_plans.py
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import app
+from db_connections import connect, get_connection_manager
+from mock_commserve import MockEstate
+
+# A plain table scan is only acceptable on tables with at most this many rows
+ROW_THRESHOLD = 1000
+
+# Pages checked (each issues its dashboard queries through get_db())
+PAGES = [
+    '/dashboard',
+    '/dashboard/retention',
+    '/dashboard/storage',
+    '/dashboard/events-alerts',
+    '/dashboard/storage-estate',
+    '/dashboard/logs',
+    '/retention/policies',
+    '/retention/details/1',
+    '/plan/1',
+    '/mediaagents',
+] + [f'/view/{data_type}' for data_type in ('clients', 'jobs', 'plans', 'storage', 'mediaagents', 'libraries',
+                                            'storage_pools', 'hypervisors', 'storage_arrays', 'events', 'alerts',
+                                            'jobs_enhanced', 'commcell_info')]
+
+# Synthetic estate saved through the normal savers
+SEED_ESTATE = {'clients': 2000, 'jobs': 20000, 'events': 5000, 'alerts': 50, 'storage_pools': 50,
+               'libraries': 50, 'mediaagents': 20, 'storage_policies': 100}
+SEED_TASKS = ['clients', 'jobs', 'jobs_enhanced', 'events', 'alerts', 'storage_pools', 'libraries',
+              'mediaagents', 'storage']
+
+# Tables without a synthetic payload, filled with generated rows when they exist
+GENERATED_ROWS = {'retention_rules': 3000, 'aging_pruning_logs': 20000, 'log_collection_history': 2000}
+
+GENERATED_VALUES = {
+    'status': ['Completed', 'Success', 'Error', 'Running'],
+    'severity': ['Critical', 'Error', 'Warning', 'Information'],
+    'entityType': ['PLAN', 'STORAGE_POLICY_COPY'],
+    'operation': ['Pruning', 'PhysicalDelete', 'MarkAndSweep', 'DataAging'],
+    'enableDataAging': [0, 1],
+}
+
+
+def generated_value(column, column_type, i, rng):
+    if column in GENERATED_VALUES:
+        return rng.choice(GENERATED_VALUES[column])
+    if column in ('logDate', 'collectionTime'):
+        moment = datetime.now() - timedelta(minutes=rng.randint(0, 60 * 24 * 60))
+        return moment.date().isoformat() if column == 'logDate' else moment.isoformat()
+    if column == 'logTime':
+        return f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+    if 'INT' in column_type.upper():
+        return i if column.endswith('Id') else rng.randint(-1, 400)
+    if 'REAL' in column_type.upper():
+        return rng.random() * 100
+    return f"{column}{i % 97}"
+
+
+def seed_database(db_path):
+    """Fresh database at db_path with every table above the row threshold that can be large"""
+    app.DB_PATH = db_path
+    app.init_db()
+
+    db = connect(db_path)
+    estate = MockEstate(SEED_ESTATE, template_dir=os.path.dirname(os.path.abspath(__file__)))
+    payloads = {
+        'clients': [estate.clients()], 'events': [estate.events({})], 'alerts': [estate.alerts()],
+        'storage_pools': [estate.storage_pools()], 'libraries': [estate.libraries()],
+        'mediaagents': [estate.mediaagents()], 'storage': [estate.storage_policies()],
+    }
+    pages = [estate.jobs_page({'limit': 1000, 'offset': offset}) for offset in range(0, SEED_ESTATE['jobs'], 1000)]
+    payloads['jobs'] = payloads['jobs_enhanced'] = pages
+
+    for name in SEED_TASKS:
+        for payload in payloads[name]:
+            app.FETCH_TASKS[name].saver(db, payload)
+        db.commit()
+
+    rng = random.Random(0)
+    tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table, count in GENERATED_ROWS.items():
+        if table not in tables:
+            continue
+        columns = [(row[1], row[2]) for row in db.execute(f"PRAGMA table_info({table})")]
+        rows = [tuple(generated_value(column, column_type, i, rng) for column, column_type in columns)
+                for i in range(1, count + 1)]
+        db.executemany(f"INSERT OR IGNORE INTO {table} VALUES ({', '.join('?' for _ in columns)})", rows)
+    db.commit()
+
+    # Statistics as a long-running install would have them
+    db.execute("ANALYZE")
+    db.commit()
+    db.close()
+
+
+def capture_page_queries(db_path, pages=PAGES):
+    """
+    Request each page and record the SELECT statements it runs
+
+    Returns:
+        Tuple of (list of (page, sql), dictionary of page -> HTTP status)
+    """
+    app.DB_PATH = db_path
+    manager = get_connection_manager(db_path)
+    captured = []
+    current = {'page': None}
+
+    def trace(sql):
+        if sql.lstrip().upper().startswith('SELECT'):
+            captured.append((current['page'], sql))
+
+    # Hook every pooled reader (the pages only read)
+    readers = [manager.acquire_reader() for _ in range(manager.read_pool_size)]
+    for reader in readers:
+        reader.set_trace_callback(trace)
+        manager.release_reader(reader)
+
+    # Pages that fail (e.g. on a table this database lacks) are reported by status, not traceback
+    app.app.logger.disabled = True
+    statuses = {}
+    client = app.app.test_client()
+    try:
+        for page in pages:
+            current['page'] = page
+            statuses[page] = client.get(page).status_code
+    finally:
+        app.app.logger.disabled = False
+
+    for reader in readers:
+        reader.set_trace_callback(None)
+    return captured, statuses
+
+
+def table_of(name, sql, tables):
+    """Table scanned under a name from a query plan (resolving aliases)"""
+    if name in tables:
+        return name
+    match = re.search(rf"\b(\w+)\s+(?:AS\s+)?{re.escape(name)}\b", sql, re.IGNORECASE)
+    return match.group(1) if match and match.group(1) in tables else None
+
+
+def full_scans(db, captured, threshold=ROW_THRESHOLD):
+    """
+    Plain table scans of tables with more than threshold rows
+
+    Returns:
+        List of (page, sql, table, row count, plan detail)
+    """
+    tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    row_counts = {}
+    problems = []
+    seen = set()
+
+    for page, sql in captured:
+        if sql in seen:
+            continue
+        seen.add(sql)
+        for row in db.execute(f"EXPLAIN QUERY PLAN {sql}"):
+            detail = row[3]
+            # "SCAN jobs" reads the table; "SCAN jobs USING [COVERING] INDEX ..." and SEARCH do not
+            match = re.match(r"SCAN (\w+)$", detail)
+            if not match:
+                continue
+            table = table_of(match.group(1), sql, tables)
+            if table is None:
+                continue
+            if table not in row_counts:
+                row_counts[table] = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            if row_counts[table] > threshold:
+                problems.append((page, sql, table, row_counts[table], detail))
+
+    return problems
+
+
+def check_query_plans(db_path=None, threshold=ROW_THRESHOLD):
+    """Seed (unless db_path is given), capture the pages' queries and return (captured, statuses, problems)"""
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='cv_plans_'), 'commvault.db')
+        seed_database(db_path)
+
+    captured, statuses = capture_page_queries(db_path)
+    db = connect(db_path)
+    try:
+        problems = full_scans(db, captured, threshold)
+    finally:
+        db.close()
+    return captured, statuses, problems
+
+
+def test_dashboard_query_plans():
+    captured, statuses, problems = check_query_plans()
+    assert captured, "No dashboard queries were captured"
+    failed = {page: status for page, status in statuses.items() if status >= 400}
+    assert not failed, f"Pages failed: {failed}"
+    assert not problems, "Full table scans:\n" + "\n".join(
+        f"{page}: {table} ({rows} rows) {detail}\n    {' '.join(sql.split())[:200]}"
+        for page, sql, table, rows, detail in problems
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail on dashboard queries that scan large tables")
+    parser.add_argument('--db', help='Check an existing database instead of a seeded one')
+    parser.add_argument('--threshold', type=int, default=ROW_THRESHOLD, help='Rows above which a scan fails')
+    args = parser.parse_args()
+
+    print("=" * 100)
+    print("DASHBOARD QUERY PLANS")
+    print("=" * 100)
+
+    captured, statuses, problems = check_query_plans(args.db, args.threshold)
+
+    for page, status in statuses.items():
+        queries = sum(1 for captured_page, _ in captured if captured_page == page)
+        print(f"  {'✓' if status < 400 else '✗'} {page:<30} HTTP {status}, {queries} queries")
+    print()
+
+    if not problems:
+        print(f"✓ {len({sql for _, sql in captured})} distinct queries, no table scans above {args.threshold} rows")
+        return
+
+    print(f"✗ {len(problems)} full table scans above {args.threshold} rows:")
+    for page, sql, table, rows, detail in problems:
+        print(f"  {page}: {table} ({rows} rows) - {detail}")
+        print(f"    {' '.join(sql.split())[:200]}")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()